@@ -1,9 +1,28 @@
 import json
 import os
 import logging
+import threading
+import time
 from abc import ABC, abstractmethod
+from contextlib import contextmanager
 import re
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from covers import DEFAULT_MAX_SIZE, DEFAULT_QUALITY, get_cover_cache_name, optimize_cover
+from compression import (
+    CODEC_EXTENSIONS,
+    CODEC_NONE,
+    CODEC_ZSTD,
+    ZSTD_RECOMPRESS_LEVEL,
+    check_codec,
+    compress,
+    decompress,
+    get_codec,
+    load_zstd_dictionary,
+    strip_extension,
+    train_zstd_dictionary,
+)
+from profiling import STAGE_READ, STAGE_WRITE, timed
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -64,11 +83,35 @@ class TextReaderWriter:
     """
     COVER_IMAGE_FILENAME = "cover_image.jpg"
     BOOK_INFO_FILENAME = "book_info.json"
-
-    def __init__(self, book_title: str):
+    CHAPTER_INDEX_DIRNAME = ".chapter_index"
+    # Minimum seconds between persisting the chapter index while writing chapters
+    CHAPTER_INDEX_SAVE_INTERVAL = 10
+    ZSTD_DICT_PREFIX = ".zstd_dict."
+    # Upper bound on the chapter bytes used to train a zstd dictionary
+    ZSTD_TRAINING_BYTES = 10 * 1024 * 1024
+
+    def __init__(self, book_title: str, compression: str = CODEC_NONE):
+        """
+        Args:
+            book_title: Title of the book
+            compression: Codec for newly written chapters ("none", "gzip" or "zstd").
+                Chapters are always readable whatever codec they were stored with.
+        """
+        check_codec(compression)
         self.downloaded_dir = "downloaded_books"
         self.translated_dir = "translated_books"
         self.book_title = book_title
+        self.compression = compression
+
+        # Directories already created by this writer
+        self._created_dirs = set()
+
+        # zstd dictionaries by id, keyed by (book_title, is_downloaded)
+        self._zstd_dicts: Dict[Tuple[str, bool], Dict[int, object]] = {}
+
+        # Chapter number -> filename indexes, keyed by (book_title, is_downloaded)
+        self._chapter_indexes: Dict[Tuple[str, bool], Dict] = {}
+        self._chapter_index_lock = threading.RLock()
 
     def write_chapter_to_file(
         self,
@@ -86,19 +129,44 @@ class TextReaderWriter:
             content: Chapter content to write
             is_downloaded: Whether to write to downloaded dir (True) or translated dir (False)
         """
-        parent_dir = self.downloaded_dir if is_downloaded else self.translated_dir
-        chapter_title = self._format_chapter_special_char(chapter_title)
-        filepath = f"{parent_dir}/{book_title}/{chapter_title}.txt"
+        self._write_chapter_atomic(book_title, chapter_title, content, is_downloaded)
+
+    def write_chapters(
+        self,
+        chapters: List[Tuple[str, str, str, bool]],
+        fsync: bool = True,
+    ) -> None:
+        """
+        Write a batch of chapters, each one atomically.
         
-        # Ensure directory exists
-        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+        Every chapter goes to a temporary file that is renamed into place once
+        complete, so a crash never leaves a truncated chapter behind. With fsync
+        the data is flushed before the rename and each directory once per batch.
+        
+        Args:
+            chapters: List of (book_title, chapter_title, content, is_downloaded)
+            fsync: Whether to make the batch durable before returning
 
-        try:
-            with open(filepath, "w", encoding="utf-8") as file:
-                file.write(content)
-            logger.info(f"Saved {chapter_title}")
-        except IOError as e:
-            logger.error(f"Error saving chapter {chapter_title}: {str(e)}")
+        Raises:
+            IOError: If any chapter could not be written, after the others were
+        """
+        dirs = set()
+        failed = []
+        for book_title, chapter_title, content, is_downloaded in chapters:
+            filepath = self._write_chapter_atomic(
+                book_title, chapter_title, content, is_downloaded, fsync=fsync
+            )
+            if filepath:
+                dirs.add(os.path.dirname(filepath))
+            else:
+                failed.append(chapter_title)
+
+        if fsync:
+            for dirpath in dirs:
+                self._fsync_dir(dirpath)
+
+        if failed:
+            raise IOError(f"Unable to write {len(failed)} chapters: {', '.join(failed)}")
 
     def save_book_cover(
         self,
@@ -164,17 +232,22 @@ class TextReaderWriter:
             logger.error(f"Error saving book info: {str(e)}")
             return False
 
-    def get_book_titles(self, order_key: Optional[str] = None) -> List[str]:
+    def get_book_titles(
+        self,
+        order_key: Optional[str] = None,
+        is_downloaded: bool = True,
+    ) -> List[str]:
         """
         Get all chapter titles for a book.
         
         Args:
             order_key: Optional regex pattern to extract chapter numbers for ordering
+            is_downloaded: Whether to list the downloaded dir (True) or translated dir (False)
             
         Returns:
             List of chapter filenames
         """
-        parent_dir = self.downloaded_dir
+        parent_dir = self.downloaded_dir if is_downloaded else self.translated_dir
         folderpath = f"{parent_dir}/{self.book_title}"
         
         try:
@@ -185,19 +258,51 @@ class TextReaderWriter:
 
         # Remove non-chapter files
         chapter_titles = [
-            f for f in chapter_titles
-            if f not in [self.COVER_IMAGE_FILENAME, self.BOOK_INFO_FILENAME]
+            f for f in chapter_titles if self._is_chapter_file(f)
         ]
 
-        # Order titles if order_key is provided
-        if order_key:
-            def extract_chapter_number(title):
-                match = re.search(rf"{order_key}", title)
-                return int(match.group(1)) if match else 0
+        return self._order_chapter_titles(chapter_titles, order_key)
+
+    def iter_chapters(
+        self,
+        is_downloaded: bool = True,
+        order_key: Optional[str] = None,
+        chapter_range: Optional[range] = None,
+    ) -> Iterator[Tuple[str, str]]:
+        """
+        Iterate over all chapters of the book, reading one chapter at a time.
+        
+        Args:
+            is_downloaded: Whether to read from downloaded dir (True) or translated dir (False)
+            order_key: Optional regex pattern to extract chapter numbers for ordering
+            chapter_range: Optional chapter numbers to restrict to, matched with order_key.
+                Chapters outside the range are never read.
+            
+        Returns:
+            Iterator of (chapter_title, content)
+            
+        Raises:
+            FileNotFoundError: If the book directory does not exist
+            ValueError: If chapter_range is given without order_key
+        """
+        parent_dir = self.downloaded_dir if is_downloaded else self.translated_dir
+        folderpath = f"{parent_dir}/{self.book_title}"
+
+        try:
+            chapter_titles = [f for f in os.listdir(folderpath) if self._is_chapter_file(f)]
+        except FileNotFoundError:
+            raise FileNotFoundError(f"Book directory not found: {folderpath}")
 
-            chapter_titles = sorted(chapter_titles, key=extract_chapter_number)
+        for chapter_path in self._order_chapter_titles(chapter_titles, order_key, chapter_range):
+            yield self.get_chapter_content(chapter_path, is_downloaded)
 
-        return chapter_titles
+    @contextmanager
+    def batch(self):
+        """
+        Group a series of writes. Text files are written immediately, so this is a
+        no-op kept for API compatibility with the packed store.
+        """
+        yield
 
     def get_chapter_content(
         self,
@@ -219,14 +324,51 @@ class TextReaderWriter:
         filepath = f"{folderpath}/{chapter_path}"
         
         try:
-            with open(filepath, "r", encoding="utf-8") as f:
-                content = f.read()
-            
-            chapter_title = chapter_path.split(".")[0]
+            content = self._read_chapter_file(filepath, self.book_title, is_downloaded)
+            chapter_title = self._strip_chapter_extension(chapter_path)
             return chapter_title, content
         except IOError as e:
             logger.error(f"Error reading chapter {chapter_path}: {str(e)}")
-            return chapter_path.split(".")[0], ""
+            return self._strip_chapter_extension(chapter_path), ""
+
+    def get_source_manifest(
+        self,
+        is_downloaded: bool = True,
+        order_key: Optional[str] = None,
+        chapter_range: Optional[range] = None,
+    ) -> List[Tuple[str, int, int]]:
+        """
+        List what an export of the book is built from, without reading any chapter.
+        
+        Args:
+            is_downloaded: Whether to list the downloaded dir (True) or translated dir (False)
+            order_key: Optional regex pattern to extract chapter numbers for ordering
+            chapter_range: Optional chapter numbers to restrict to, matched with order_key
+            
+        Returns:
+            List of (name, size, mtime_ns) for the chapters in order, followed by
+            the cover image and book info if present
+            
+        Raises:
+            FileNotFoundError: If the book directory does not exist
+        """
+        parent_dir = self.downloaded_dir if is_downloaded else self.translated_dir
+        folderpath = f"{parent_dir}/{self.book_title}"
+
+        try:
+            chapter_titles = [f for f in os.listdir(folderpath) if self._is_chapter_file(f)]
+        except FileNotFoundError:
+            raise FileNotFoundError(f"Book directory not found: {folderpath}")
+
+        names = self._order_chapter_titles(chapter_titles, order_key, chapter_range)
+        manifest = []
+        for name in names + [self.COVER_IMAGE_FILENAME, self.BOOK_INFO_FILENAME]:
+            try:
+                stat = os.stat(f"{folderpath}/{name}")
+            except FileNotFoundError:
+                continue
+            manifest.append((name, stat.st_size, stat.st_mtime_ns))
+        return manifest
 
     def get_info_and_cover(
         self,
@@ -270,6 +412,58 @@ class TextReaderWriter:
 
         return cover_image_content, book_info
 
+    def get_optimized_cover(
+        self,
+        max_size: Tuple[int, int] = DEFAULT_MAX_SIZE,
+        quality: int = DEFAULT_QUALITY,
+        is_downloaded: bool = True,
+    ) -> Optional[bytes]:
+        """
+        Get the book cover downscaled and re-encoded for embedding in an EPUB.
+        
+        The optimized cover is cached next to the original, keyed by the
+        original's hash and the settings.
+        
+        Args:
+            max_size: Maximum (width, height) of the cover
+            quality: JPEG quality (1-95)
+            is_downloaded: Whether to read from downloaded dir (True) or translated dir (False)
+            
+        Returns:
+            Optimized cover bytes, or None if the book has no cover
+        """
+        cover = self._get_asset(self.COVER_IMAGE_FILENAME, is_downloaded)
+        if cover is None:
+            return None
+
+        cache_name = get_cover_cache_name(cover, max_size, quality)
+        optimized = self._get_asset(cache_name, is_downloaded)
+        if optimized is None:
+            optimized = optimize_cover(cover, max_size, quality)
+            self._save_asset(cache_name, optimized, is_downloaded)
+        return optimized
+
+    def _get_asset(self, name: str, is_downloaded: bool) -> Optional[bytes]:
+        parent_dir = self.downloaded_dir if is_downloaded else self.translated_dir
+        try:
+            with open(f"{parent_dir}/{self.book_title}/{name}", "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def _save_asset(self, name: str, data: bytes, is_downloaded: bool) -> bool:
+        parent_dir = self.downloaded_dir if is_downloaded else self.translated_dir
+        filepath = f"{parent_dir}/{self.book_title}/{name}"
+        tmp_path = f"{os.path.dirname(filepath)}/.{name}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, filepath)
+            return True
+        except IOError as e:
+            logger.error(f"Error saving {name}: {str(e)}")
+            return False
+
     def get_file_content(
         self,
         book_title: str,
@@ -289,44 +483,492 @@ class TextReaderWriter:
         """
         parent_dir = self.downloaded_dir if is_downloaded else self.translated_dir
         folderpath = f"{parent_dir}/{book_title}"
-        
-        try:
-            chapter_titles = os.listdir(folderpath)
-        except FileNotFoundError:
-            raise FileNotFoundError(f"Book directory not found: {folderpath}")
-        
-        chapter_title = self._get_chapter_title(chapter_num, chapter_titles)
+
+        chapter_title = self.find_chapter_file(book_title, chapter_num, is_downloaded)
         if not chapter_title:
             raise ValueError(f"Chapter number {chapter_num} not found in {folderpath}")
 
         chapter_path = f"{folderpath}/{chapter_title}"
         try:
-            with open(chapter_path, "r", encoding="utf-8") as f:
-                content = f.read()
-            
-            chapter_title = chapter_title.split(".")[0]
+            content = self._read_chapter_file(chapter_path, book_title, is_downloaded)
+
+            chapter_title = self._strip_chapter_extension(chapter_title)
             return chapter_title, content
         except IOError as e:
             raise IOError(f"Error reading chapter {chapter_title}: {str(e)}")
 
-    def _get_chapter_title(
-        self, chapter_num: str, chapter_titles: List[str]
+    def find_chapter_file(
+        self,
+        book_title: str,
+        chapter_num: str,
+        is_downloaded: bool = True,
     ) -> Optional[str]:
         """
-        Find the matching chapter title for a chapter number.
+        Look up the chapter filename for a chapter number using the chapter index.
         
         Args:
+            book_title: Title of the book
             chapter_num: Chapter number to find
-            chapter_titles: List of chapter titles to search
+            is_downloaded: Whether to look in downloaded dir (True) or translated dir (False)
+            
+        Returns:
+            Chapter filename or None if not found
+            
+        Raises:
+            FileNotFoundError: If the book directory does not exist
+            ValueError: If several files share the chapter number
+        """
+        with self._chapter_index_lock:
+            index = self._get_chapter_index(book_title, is_downloaded)
+            if chapter_num not in index["chapters"] and self._is_chapter_index_stale(
+                book_title, index, is_downloaded
+            ):
+                # Files were added outside this reader, rescan once
+                index = self._build_chapter_index(book_title, is_downloaded)
+
+            duplicates = index["duplicates"].get(chapter_num)
+            if duplicates:
+                raise ValueError(
+                    f"Chapter number {chapter_num} is used by several files: {', '.join(duplicates)}"
+                )
+            return index["chapters"].get(chapter_num)
+
+    def save_chapter_index(self) -> None:
+        """Persist chapter indexes that changed since they were last saved."""
+        with self._chapter_index_lock:
+            for (book_title, is_downloaded), index in self._chapter_indexes.items():
+                if index["dirty"]:
+                    self._save_chapter_index(book_title, index, is_downloaded)
+
+    def get_chapter_number(self, chapter_title: str, order_key: str) -> Optional[int]:
+        """
+        Extract a chapter number from a chapter title or filename.
+        
+        Args:
+            chapter_title: Chapter title or filename
+            order_key: Regex pattern whose first group is the chapter number
+            
+        Returns:
+            The chapter number, or None if order_key doesn't match
+        """
+        match = re.search(rf"{order_key}", chapter_title)
+        return int(match.group(1)) if match else None
+
+    def _order_chapter_titles(
+        self,
+        chapter_titles: List[str],
+        order_key: Optional[str],
+        chapter_range: Optional[range] = None,
+    ) -> List[str]:
+        """
+        Order chapter titles by the chapter number matched by order_key, if provided,
+        keeping only those within chapter_range, if provided.
+        """
+        if chapter_range is not None:
+            if not order_key:
+                raise ValueError("A chapter range needs an order_key to match chapter numbers")
+            chapter_titles = [
+                title for title in chapter_titles
+                if self.get_chapter_number(title, order_key) in chapter_range
+            ]
+
+        if not order_key:
+            return chapter_titles
+
+        def extract_chapter_number(title):
+            chapter_number = self.get_chapter_number(title, order_key)
+            return chapter_number if chapter_number is not None else 0
+
+        return sorted(chapter_titles, key=extract_chapter_number)
+
+    def _strip_chapter_extension(self, filename: str) -> str:
+        """Return the chapter title for a chapter filename."""
+        chapter_title = strip_extension(filename)
+        if chapter_title is None:
+            return os.path.splitext(filename)[0]
+        return chapter_title
+
+    def recompress_chapters(
+        self,
+        compression: str,
+        is_downloaded: bool = True,
+    ) -> Tuple[int, int]:
+        """
+        Rewrite every chapter of the book with a new codec.
+        
+        For zstd a dictionary is trained on the book's own chapters first.
+        Each chapter is replaced atomically, so an interrupted run leaves every
+        chapter readable.
+        
+        Args:
+            compression: Target codec ("none", "gzip" or "zstd")
+            is_downloaded: Whether to recompress the downloaded dir (True) or translated dir (False)
             
         Returns:
-            Matching chapter title or None if not found
+            Tuple of (bytes before, bytes after)
+        """
+        check_codec(compression)
+        parent_dir = self.downloaded_dir if is_downloaded else self.translated_dir
+        folderpath = f"{parent_dir}/{self.book_title}"
+        filenames = [f for f in os.listdir(folderpath) if self._is_chapter_file(f)]
+
+        zstd_dict = None
+        if compression == CODEC_ZSTD:
+            zstd_dict = self._train_zstd_dict(folderpath, filenames, is_downloaded)
+
+        bytes_before = bytes_after = 0
+        for filename in filenames:
+            filepath = f"{folderpath}/{filename}"
+            bytes_before += os.path.getsize(filepath)
+            content = self._read_chapter_file(filepath, self.book_title, is_downloaded)
+
+            new_filename = f"{self._strip_chapter_extension(filename)}{CODEC_EXTENSIONS[compression]}"
+            new_filepath = f"{folderpath}/{new_filename}"
+            data = compress(
+                content.encode("utf-8"), compression, zstd_dict, zstd_level=ZSTD_RECOMPRESS_LEVEL
+            )
+
+            tmp_path = f"{folderpath}/.{new_filename}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, new_filepath)
+            if new_filename != filename:
+                os.remove(filepath)
+            bytes_after += len(data)
+
+        # Dictionaries that no chapter references any more can go
+        for dict_filename in os.listdir(folderpath):
+            if dict_filename.startswith(self.ZSTD_DICT_PREFIX) and (
+                zstd_dict is None
+                or dict_filename != f"{self.ZSTD_DICT_PREFIX}{zstd_dict.dict_id()}"
+            ):
+                os.remove(f"{folderpath}/{dict_filename}")
+
+        with self._chapter_index_lock:
+            self._chapter_indexes.pop((self.book_title, is_downloaded), None)
+        self._zstd_dicts.pop((self.book_title, is_downloaded), None)
+
+        logger.info(
+            f"Recompressed {len(filenames)} chapters in {folderpath} to {compression}: "
+            f"{bytes_before} -> {bytes_after} bytes"
+        )
+        return bytes_before, bytes_after
+
+    @timed(STAGE_READ)
+    def _read_chapter_file(self, filepath: str, book_title: str, is_downloaded: bool) -> str:
+        """Read a chapter file, decompressing it according to its extension."""
+        with open(filepath, "rb") as f:
+            data = f.read()
+        codec = get_codec(filepath)
+        if codec != CODEC_NONE:
+            data = decompress(data, codec, self._get_zstd_dicts(book_title, is_downloaded))
+        return data.decode("utf-8")
+
+    @timed(STAGE_WRITE)
+    def _write_chapter_atomic(
+        self,
+        book_title: str,
+        chapter_title: str,
+        content: str,
+        is_downloaded: bool,
+        fsync: bool = False,
+    ) -> Optional[str]:
+        """
+        Write a chapter through a temporary file and rename it into place.
+        
+        Returns:
+            Path of the written chapter, or None if writing failed
         """
-        for title in chapter_titles:
-            num = title.split("_")[0]
-            if num == chapter_num:
-                return title
-        return None
+        parent_dir = self.downloaded_dir if is_downloaded else self.translated_dir
+        chapter_title = self._format_chapter_special_char(chapter_title)
+        filename = f"{chapter_title}{CODEC_EXTENSIONS[self.compression]}"
+        folderpath = f"{parent_dir}/{book_title}"
+        filepath = f"{folderpath}/{filename}"
+        # Dot-prefixed so readers never mistake an unfinished write for a chapter
+        tmp_path = f"{folderpath}/.{filename}.tmp"
+
+        # Ensure directory exists, once per directory
+        if folderpath not in self._created_dirs:
+            os.makedirs(folderpath, exist_ok=True)
+            self._created_dirs.add(folderpath)
+
+        try:
+            data = compress(
+                content.encode("utf-8"),
+                self.compression,
+                self._get_current_zstd_dict(book_title, is_downloaded),
+            )
+            with open(tmp_path, "wb") as file:
+                file.write(data)
+                if fsync:
+                    file.flush()
+                    os.fsync(file.fileno())
+            os.replace(tmp_path, filepath)
+            logger.info(f"Saved {chapter_title}")
+        except IOError as e:
+            logger.error(f"Error saving chapter {chapter_title}: {str(e)}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return None
+
+        self._remove_other_codec_copies(book_title, chapter_title, is_downloaded)
+        self._add_to_chapter_index(book_title, filename, is_downloaded)
+        return filepath
+
+    def _fsync_dir(self, dirpath: str) -> None:
+        """Flush a directory entry so renames into it survive a crash."""
+        try:
+            fd = os.open(dirpath, os.O_RDONLY)
+        except OSError:
+            # Directories can't be opened on some platforms (e.g. Windows)
+            return
+        try:
+            os.fsync(fd)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+
+    def _remove_other_codec_copies(
+        self, book_title: str, chapter_title: str, is_downloaded: bool
+    ) -> None:
+        """Remove copies of a chapter stored with another codec, so it isn't duplicated."""
+        parent_dir = self.downloaded_dir if is_downloaded else self.translated_dir
+        for codec, extension in CODEC_EXTENSIONS.items():
+            if codec == self.compression:
+                continue
+            filename = f"{chapter_title}{extension}"
+            try:
+                os.remove(f"{parent_dir}/{book_title}/{filename}")
+            except FileNotFoundError:
+                continue
+            self._remove_from_chapter_index(book_title, filename, is_downloaded)
+
+    def _get_zstd_dicts(self, book_title: str, is_downloaded: bool) -> Dict[int, object]:
+        """Load the zstd dictionaries stored in the book directory, by dictionary id."""
+        key = (book_title, is_downloaded)
+        if key in self._zstd_dicts:
+            return self._zstd_dicts[key]
+
+        parent_dir = self.downloaded_dir if is_downloaded else self.translated_dir
+        folderpath = f"{parent_dir}/{book_title}"
+        zstd_dicts = {}
+        try:
+            dict_filenames = [
+                f for f in os.listdir(folderpath) if f.startswith(self.ZSTD_DICT_PREFIX)
+            ]
+        except FileNotFoundError:
+            dict_filenames = []
+
+        # Oldest first so the newest dictionary is the last one inserted
+        dict_paths = sorted(
+            (f"{folderpath}/{f}" for f in dict_filenames), key=os.path.getmtime
+        )
+        for dict_path in dict_paths:
+            with open(dict_path, "rb") as f:
+                zstd_dict = load_zstd_dictionary(f.read())
+            zstd_dicts[zstd_dict.dict_id()] = zstd_dict
+
+        self._zstd_dicts[key] = zstd_dicts
+        return zstd_dicts
+
+    def _get_current_zstd_dict(self, book_title: str, is_downloaded: bool):
+        """Return the newest zstd dictionary for new chapters, if compressing with zstd."""
+        if self.compression != CODEC_ZSTD:
+            return None
+        zstd_dicts = self._get_zstd_dicts(book_title, is_downloaded)
+        return list(zstd_dicts.values())[-1] if zstd_dicts else None
+
+    def _train_zstd_dict(self, folderpath: str, filenames: List[str], is_downloaded: bool):
+        """Train and save a zstd dictionary on the book's chapters."""
+        samples = []
+        sample_bytes = 0
+        for filename in filenames:
+            content = self._read_chapter_file(
+                f"{folderpath}/{filename}", self.book_title, is_downloaded
+            )
+            data = content.encode("utf-8")
+            samples.append(data)
+            sample_bytes += len(data)
+            if sample_bytes >= self.ZSTD_TRAINING_BYTES:
+                break
+
+        zstd_dict = train_zstd_dictionary(samples)
+        if zstd_dict is None:
+            return None
+
+        dict_path = f"{folderpath}/{self.ZSTD_DICT_PREFIX}{zstd_dict.dict_id()}"
+        with open(dict_path, "wb") as f:
+            f.write(zstd_dict.as_bytes())
+        self._get_zstd_dicts(self.book_title, is_downloaded)[zstd_dict.dict_id()] = zstd_dict
+        logger.info(f"Trained zstd dictionary {zstd_dict.dict_id()} on {len(samples)} chapters")
+        return zstd_dict
+
+    def _is_chapter_file(self, filename: str) -> bool:
+        return filename not in [
+            self.COVER_IMAGE_FILENAME, self.BOOK_INFO_FILENAME
+        ] and not filename.startswith(".")
+
+    def _get_chapter_index_path(self, book_title: str, is_downloaded: bool) -> str:
+        parent_dir = self.downloaded_dir if is_downloaded else self.translated_dir
+        # Kept outside the book directory so saving it doesn't change the directory mtime
+        return f"{parent_dir}/{self.CHAPTER_INDEX_DIRNAME}/{book_title}.json"
+
+    def _get_dir_mtime(self, book_title: str, is_downloaded: bool) -> int:
+        parent_dir = self.downloaded_dir if is_downloaded else self.translated_dir
+        return os.stat(f"{parent_dir}/{book_title}").st_mtime_ns
+
+    def _is_chapter_index_stale(
+        self, book_title: str, index: Dict, is_downloaded: bool
+    ) -> bool:
+        try:
+            return index["dir_mtime_ns"] != self._get_dir_mtime(book_title, is_downloaded)
+        except FileNotFoundError:
+            return True
+
+    def _get_chapter_index(self, book_title: str, is_downloaded: bool) -> Dict:
+        """
+        Get the chapter index, loading the persisted one if it is still valid.
+        
+        Args:
+            book_title: Title of the book
+            is_downloaded: Whether to index the downloaded dir (True) or translated dir (False)
+            
+        Returns:
+            Index dict with "chapters" (number -> filename) and "duplicates" (number -> filenames)
+        """
+        key = (book_title, is_downloaded)
+        index = self._chapter_indexes.get(key)
+        if index is not None:
+            return index
+
+        index_path = self._get_chapter_index_path(book_title, is_downloaded)
+        try:
+            with open(index_path, "r", encoding="utf-8") as f:
+                index = json.load(f)
+            index["dirty"] = False
+            if not self._is_chapter_index_stale(book_title, index, is_downloaded):
+                logger.debug(f"Loaded chapter index from {index_path}")
+                self._chapter_indexes[key] = index
+                return index
+        except FileNotFoundError:
+            pass
+        except (IOError, json.JSONDecodeError, KeyError) as e:
+            logger.warning(f"Ignoring invalid chapter index {index_path}: {str(e)}")
+
+        return self._build_chapter_index(book_title, is_downloaded)
+
+    def _build_chapter_index(self, book_title: str, is_downloaded: bool) -> Dict:
+        """
+        Scan the book directory once and index chapter files by chapter number.
+        
+        Args:
+            book_title: Title of the book
+            is_downloaded: Whether to index the downloaded dir (True) or translated dir (False)
+            
+        Returns:
+            The new chapter index
+        """
+        parent_dir = self.downloaded_dir if is_downloaded else self.translated_dir
+        folderpath = f"{parent_dir}/{book_title}"
+
+        try:
+            dir_mtime_ns = self._get_dir_mtime(book_title, is_downloaded)
+            filenames = os.listdir(folderpath)
+        except FileNotFoundError:
+            raise FileNotFoundError(f"Book directory not found: {folderpath}")
+
+        index = {"dir_mtime_ns": dir_mtime_ns, "chapters": {}, "duplicates": {}, "dirty": True}
+        for filename in sorted(filenames):
+            if self._is_chapter_file(filename):
+                self._index_chapter_file(index, filename)
+
+        for chapter_num, filenames in index["duplicates"].items():
+            logger.warning(
+                f"Duplicate chapter number {chapter_num} in {folderpath}: {', '.join(filenames)}"
+            )
+
+        logger.debug(f"Indexed {len(index['chapters'])} chapters in {folderpath}")
+        self._chapter_indexes[(book_title, is_downloaded)] = index
+        self._save_chapter_index(book_title, index, is_downloaded)
+        return index
+
+    def _index_chapter_file(self, index: Dict, filename: str) -> None:
+        chapter_num = filename.split("_")[0]
+        existing = index["chapters"].get(chapter_num)
+        if existing is None or existing == filename:
+            index["chapters"][chapter_num] = filename
+            return
+
+        duplicates = index["duplicates"].setdefault(chapter_num, [existing])
+        if filename not in duplicates:
+            duplicates.append(filename)
+
+    def _remove_from_chapter_index(
+        self, book_title: str, filename: str, is_downloaded: bool
+    ) -> None:
+        with self._chapter_index_lock:
+            index = self._chapter_indexes.get((book_title, is_downloaded))
+            if index is None:
+                return
+
+            chapter_num = filename.split("_")[0]
+            duplicates = index["duplicates"].get(chapter_num)
+            if duplicates and filename in duplicates:
+                duplicates.remove(filename)
+                if len(duplicates) <= 1:
+                    index["duplicates"].pop(chapter_num)
+                if duplicates:
+                    index["chapters"][chapter_num] = duplicates[0]
+            elif index["chapters"].get(chapter_num) == filename:
+                index["chapters"].pop(chapter_num)
+            index["dirty"] = True
+
+    def _add_to_chapter_index(
+        self, book_title: str, filename: str, is_downloaded: bool
+    ) -> None:
+        with self._chapter_index_lock:
+            key = (book_title, is_downloaded)
+            index = self._chapter_indexes.get(key)
+            if index is None:
+                # Nothing indexed yet, the first lookup will scan the directory
+                return
+
+            self._index_chapter_file(index, filename)
+            duplicates = index["duplicates"].get(filename.split("_")[0])
+            if duplicates:
+                logger.warning(f"Duplicate chapter number for {filename}: {', '.join(duplicates)}")
+
+            index["dir_mtime_ns"] = self._get_dir_mtime(book_title, is_downloaded)
+            index["dirty"] = True
+            if time.monotonic() - index.get("saved_at", 0) >= self.CHAPTER_INDEX_SAVE_INTERVAL:
+                self._save_chapter_index(book_title, index, is_downloaded)
+
+    def _save_chapter_index(
+        self, book_title: str, index: Dict, is_downloaded: bool
+    ) -> None:
+        index_path = self._get_chapter_index_path(book_title, is_downloaded)
+        os.makedirs(os.path.dirname(index_path), exist_ok=True)
+
+        tmp_path = f"{index_path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(
+                    {
+                        "dir_mtime_ns": index["dir_mtime_ns"],
+                        "chapters": index["chapters"],
+                        "duplicates": index["duplicates"],
+                    },
+                    f,
+                    ensure_ascii=False,
+                )
+            os.replace(tmp_path, index_path)
+            index["dirty"] = False
+            index["saved_at"] = time.monotonic()
+        except IOError as e:
+            logger.error(f"Error saving chapter index {index_path}: {str(e)}")
 
     def _format_chapter_special_char(self, chapter_title: str) -> str:
         """
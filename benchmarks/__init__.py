@@ -0,0 +1,3 @@
+"""
+Offline benchmarks whose JSON results can be compared between versions
+"""
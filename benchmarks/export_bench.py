@@ -0,0 +1,350 @@
+"""
+EPUB exporter benchmark on synthetic books.
+
+Synthetic books of a configurable chapter count, chapter size distribution
+and cover size are written to a temporary directory, then exported with each
+export path. Every export runs in a fresh process, so peak RSS belongs to that
+export alone. An optional second, profiled run splits the time into the read,
+render, compress and write phases.
+"""
+import io
+import os
+import math
+import random
+import logging
+import tempfile
+import time
+import cProfile
+import pstats
+import multiprocessing
+from typing import Dict, List, Optional, Tuple
+
+from benchmarks.fixture_server import COVER_JPEG, WORDS
+from benchmarks.results import get_peak_rss_mb
+from packed_store import open_reader_writer
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+BENCHMARK_BOOK_ID = "export-benchmark"
+ORDER_KEY = r"Chapter (\d+)"
+
+PATH_V1 = "v1"
+PATH_V2 = "v2"
+PATH_STREAM = "stream"
+PATH_INCREMENTAL = "incremental"
+EXPORT_PATHS = (PATH_V1, PATH_V2, PATH_STREAM, PATH_INCREMENTAL)
+
+SIZE_FIXED = "fixed"
+SIZE_UNIFORM = "uniform"
+SIZE_LOGNORMAL = "lognormal"
+SIZE_DISTRIBUTIONS = (SIZE_FIXED, SIZE_UNIFORM, SIZE_LOGNORMAL)
+
+PHASES = ("read", "render", "compress", "write")
+
+# Chapters are assembled from a pool of paragraphs, which is much faster than
+# generating every word and still leaves each chapter's text distinct
+PARAGRAPH_POOL_SIZE = 2000
+
+# Profiled functions whose cumulative time makes up a phase, as
+# (file name suffix, function name)
+CUMULATIVE_PHASES = {
+    "read": (
+        ("base.py", "iter_chapters"),
+        ("packed_store.py", "iter_chapters"),
+    ),
+    "render": (
+        ("exporters_v2.py", "_create_html_content"),
+        ("exporters_stream.py", "_render_document"),
+        ("exporters_stream.py", "_build_opf"),
+        ("exporters_stream.py", "_build_toc"),
+        (os.path.join("ebooklib", "epub.py"), "get_content"),
+        (os.path.join("ebooklib", "epub.py"), "_get_nav"),
+        (os.path.join("ebooklib", "epub.py"), "_get_ncx"),
+    ),
+}
+
+# Built-in functions whose own time makes up a phase
+BUILTIN_PHASES = {
+    "compress": (
+        "<method 'compress' of 'zlib.Compress' objects>",
+        "<method 'flush' of 'zlib.Compress' objects>",
+        "<built-in method zlib.crc32>",
+    ),
+    "write": (
+        "<method 'write' of '_io.BufferedWriter' objects>",
+        "<method 'write' of '_io.FileIO' objects>",
+        "<method 'flush' of '_io.BufferedWriter' objects>",
+        "<built-in method posix.fsync>",
+        "<built-in method posix.replace>",
+    ),
+}
+
+
+def get_chapter_sizes(
+    chapters: int, mean_chars: int, distribution: str = SIZE_FIXED, seed: int = 0
+) -> List[int]:
+    """
+    Draw chapter sizes.
+
+    Args:
+        chapters: Number of chapters
+        mean_chars: Mean chapter size in characters
+        distribution: fixed, uniform (0.5x to 1.5x the mean) or lognormal
+            (long tail, same mean)
+        seed: Seed for the sizes
+
+    Returns:
+        Size of each chapter in characters
+    """
+    if distribution not in SIZE_DISTRIBUTIONS:
+        raise ValueError(
+            f"Unknown size distribution: {distribution}, expected one of {', '.join(SIZE_DISTRIBUTIONS)}"
+        )
+    rng = random.Random(seed)
+    if distribution == SIZE_FIXED:
+        return [mean_chars] * chapters
+    if distribution == SIZE_UNIFORM:
+        return [int(rng.uniform(0.5, 1.5) * mean_chars) for _ in range(chapters)]
+    sigma = 0.75
+    mu = math.log(mean_chars) - sigma ** 2 / 2
+    return [max(100, int(rng.lognormvariate(mu, sigma))) for _ in range(chapters)]
+
+
+def make_cover(width: int, height: int, seed: int = 0) -> bytes:
+    """
+    Generate a JPEG cover of the given size.
+
+    The image is noisy so it doesn't compress to nothing, like a real cover.
+    Without Pillow a 1x1 JPEG is returned.
+
+    Args:
+        width: Width in pixels
+        height: Height in pixels
+        seed: Seed for the image
+
+    Returns:
+        JPEG bytes
+    """
+    # Imported here so commands other than the export benchmark don't load Pillow
+    try:
+        from PIL import Image
+    except ImportError:  # pragma: no cover - optional dependency
+        logger.warning("Pillow is not installed, using a 1x1 cover")
+        return COVER_JPEG
+    pixels = random.Random(seed).getrandbits(8 * width * height).to_bytes(width * height, "little")
+    noise = Image.frombytes("L", (width, height), pixels)
+    image = Image.merge("RGB", (noise, noise.rotate(90, expand=False), noise.transpose(Image.FLIP_LEFT_RIGHT)))
+    output = io.BytesIO()
+    image.save(output, format="JPEG", quality=90)
+    return output.getvalue()
+
+
+def write_synthetic_book(
+    work_dir: str,
+    chapter_sizes: List[int],
+    cover_size: Tuple[int, int],
+    seed: int = 0,
+    batch_size: int = 500,
+) -> int:
+    """
+    Write a synthetic book, with cover and book info, into work_dir.
+
+    Args:
+        work_dir: Directory holding the book storage
+        chapter_sizes: Size of each chapter in characters
+        cover_size: Cover (width, height) in pixels
+        seed: Seed for the text and cover
+        batch_size: Chapters written per batch
+
+    Returns:
+        Total characters written
+    """
+    rng = random.Random(seed)
+    pool = [
+        " ".join(rng.choice(WORDS) for _ in range(rng.randint(40, 120))).capitalize() + "."
+        for _ in range(PARAGRAPH_POOL_SIZE)
+    ]
+
+    previous_dir = os.getcwd()
+    os.chdir(work_dir)
+    try:
+        text_rw = open_reader_writer(BENCHMARK_BOOK_ID)
+        text_rw.save_book_cover(book_title=BENCHMARK_BOOK_ID, image_bytes=make_cover(*cover_size, seed=seed))
+        text_rw.save_book_info(
+            book_title=BENCHMARK_BOOK_ID,
+            book_info={"Author": "Benchmark Author", "description": "A synthetic book."},
+        )
+
+        total_chars = 0
+        batch = []
+        for num, size in enumerate(chapter_sizes, start=1):
+            paragraphs = []
+            length = 0
+            while length < size:
+                paragraph = rng.choice(pool)
+                paragraphs.append(paragraph)
+                length += len(paragraph) + 2
+            content = "\n\n".join(paragraphs)
+            total_chars += len(content)
+            batch.append((BENCHMARK_BOOK_ID, f"Chapter {num} - Title {num}", content, True))
+            if len(batch) >= batch_size:
+                text_rw.write_chapters(batch)
+                batch = []
+        if batch:
+            text_rw.write_chapters(batch)
+        text_rw.save_chapter_index()
+    finally:
+        os.chdir(previous_dir)
+    return total_chars
+
+
+def _export(path: str, compresslevel: int, workers: Optional[int]) -> bool:
+    """Export the benchmark book with one export path, as export-epub does."""
+    from exporters import EpubExporter
+    from volumes import export_volume
+
+    if path == PATH_V1:
+        text_reader = open_reader_writer(BENCHMARK_BOOK_ID)
+        cover_image, book_info = text_reader.get_info_and_cover()
+        chapters = dict(text_reader.iter_chapters(order_key=ORDER_KEY))
+        EpubExporter(BENCHMARK_BOOK_ID).export_epub(
+            cover_page=cover_image, book_info=book_info, book_content=chapters
+        )
+        return True
+    return export_volume(
+        BENCHMARK_BOOK_ID,
+        None,
+        ORDER_KEY,
+        stream=path in (PATH_STREAM, PATH_INCREMENTAL),
+        compresslevel=compresslevel,
+        workers=workers,
+        incremental=path == PATH_INCREMENTAL,
+    )
+
+
+def _get_phase_times(profiler: cProfile.Profile) -> Dict[str, float]:
+    """Split profiled time into phases, the rest going to "other"."""
+    stats = pstats.Stats(profiler)
+    phases = {phase: 0.0 for phase in PHASES}
+    for (file_name, _, func_name), (_, _, own_time, cumulative_time, _) in stats.stats.items():
+        for phase, functions in CUMULATIVE_PHASES.items():
+            if any(file_name.endswith(suffix) and func_name == name for suffix, name in functions):
+                phases[phase] += cumulative_time
+        for phase, names in BUILTIN_PHASES.items():
+            if func_name in names:
+                phases[phase] += own_time
+    phases["other"] = max(0.0, stats.total_tt - sum(phases.values()))
+    phases["profiled_total"] = stats.total_tt
+    return phases
+
+
+def _run_export(
+    path: str, work_dir: str, compresslevel: int, workers: Optional[int], profile: bool
+) -> Dict:
+    """Run one export and measure it. Runs in a fresh process."""
+    os.chdir(work_dir)
+    output_file = f"{BENCHMARK_BOOK_ID}.epub"
+    if path == PATH_INCREMENTAL:
+        # Measure a rebuild of an unchanged book, which is what incremental speeds up
+        _export(path, compresslevel, workers)
+    elif os.path.exists(output_file):
+        os.remove(output_file)
+
+    profiler = cProfile.Profile() if profile else None
+    start = time.perf_counter()
+    if profiler:
+        profiler.enable()
+    exported = _export(path, compresslevel, workers)
+    if profiler:
+        profiler.disable()
+    wall_seconds = time.perf_counter() - start
+
+    result = {
+        "exported": exported,
+        "wall_seconds": wall_seconds,
+        "output_bytes": os.path.getsize(output_file) if os.path.exists(output_file) else None,
+        "peak_rss_mb": get_peak_rss_mb(),
+        "peak_worker_rss_mb": get_peak_rss_mb(children=True),
+    }
+    if profiler:
+        result["phases"] = _get_phase_times(profiler)
+    return result
+
+
+def run_export_benchmark(
+    chapters: int,
+    chapter_chars: int = 5000,
+    distribution: str = SIZE_FIXED,
+    cover_size: Tuple[int, int] = (1600, 2400),
+    paths: Tuple[str, ...] = EXPORT_PATHS,
+    compresslevel: int = 6,
+    workers: Optional[int] = None,
+    phases: bool = True,
+    seed: int = 0,
+) -> Dict:
+    """
+    Generate a synthetic book and export it with each export path.
+
+    The phase split comes from a separate run under cProfile, which inflates
+    Python-heavy work, so compare phases as proportions. The profiled run of
+    the v2 path renders on one process, since work on pool workers is not
+    visible to the profiler.
+
+    Args:
+        chapters: Number of chapters
+        chapter_chars: Mean chapter size in characters
+        distribution: Chapter size distribution (fixed, uniform or lognormal)
+        cover_size: Cover (width, height) in pixels
+        paths: Export paths to run (v1, v2, stream, incremental)
+        compresslevel: Deflate level used by the v2 and stream paths
+        workers: Rendering processes for the v2 path, defaults to the CPU count
+        phases: Whether to add a profiled run per path for the phase split
+        seed: Seed for the book
+
+    Returns:
+        Dictionary of book details and measurements per path
+    """
+    context = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory(prefix="export-benchmark-") as work_dir:
+        start = time.perf_counter()
+        chapter_sizes = get_chapter_sizes(chapters, chapter_chars, distribution, seed)
+        total_chars = write_synthetic_book(work_dir, chapter_sizes, cover_size, seed)
+        generate_seconds = time.perf_counter() - start
+        logger.info(
+            f"Generated {chapters} chapters ({total_chars / 1024 / 1024:.1f}M chars) "
+            f"in {generate_seconds:.1f}s"
+        )
+
+        # Optimize the cover once, so no path pays for it
+        previous_dir = os.getcwd()
+        os.chdir(work_dir)
+        try:
+            open_reader_writer(BENCHMARK_BOOK_ID).get_optimized_cover()
+        finally:
+            os.chdir(previous_dir)
+
+        results = {}
+        for path in paths:
+            with context.Pool(1) as pool:
+                result = pool.apply(_run_export, (path, work_dir, compresslevel, workers, False))
+            if phases:
+                profile_workers = 1 if path == PATH_V2 else workers
+                with context.Pool(1) as pool:
+                    profiled = pool.apply(
+                        _run_export, (path, work_dir, compresslevel, profile_workers, True)
+                    )
+                result["phases"] = profiled["phases"]
+            results[path] = result
+            logger.info(
+                f"{path}: {chapters} chapters in {result['wall_seconds']:.2f}s, "
+                f"peak RSS {result['peak_rss_mb'] or 0:.0f} MB, "
+                f"output {(result['output_bytes'] or 0) / 1024 / 1024:.1f} MB"
+            )
+
+    return {
+        "chapters": chapters,
+        "total_chars": total_chars,
+        "generate_seconds": generate_seconds,
+        "paths": results,
+    }
@@ -0,0 +1,286 @@
+"""
+Local HTTP server serving Uukanshu and NovelFull pages for offline benchmarks.
+
+Pages are synthetic by default, shaped like the markup the trawlers parse, or
+recorded pages read from a fixtures directory. The server runs in its own
+process, so its CPU time and memory don't count against the trawler being
+measured, and can add latency, jitter and errors to every response.
+
+Recorded pages are looked up by URL path, with the query string appended and
+percent-encoded: /1234.html?page=2 is served from <fixtures_dir>/1234.html%3Fpage%3D2.
+"""
+import os
+import random
+import logging
+import threading
+import multiprocessing
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import NamedTuple, Optional
+from urllib.parse import parse_qs, quote, urlsplit
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+SITE_UUKANSHU = "uukanshu"
+SITE_NOVELFULL = "novelfull"
+SITES = (SITE_UUKANSHU, SITE_NOVELFULL)
+
+# Chapters per NovelFull chapter list page, as on the real site
+NOVELFULL_PAGE_SIZE = 50
+
+CHINESE_DIGITS = "零一二三四五六七八九"
+CHINESE_UNITS = ["", "十", "百", "千"]
+
+WORDS = (
+    "the sect elder raised his sword and the sky split open while disciples watched "
+    "from the mountain gate as spiritual qi gathered into a storm of golden light"
+).split()
+HANZI = "天地玄黄宇宙洪荒日月盈昃辰宿列张寒来暑往秋收冬藏剑气纵横三万里一剑光寒十九州"
+
+# A 1x1 JPEG, served as the NovelFull cover
+COVER_JPEG = bytes.fromhex(
+    "ffd8ffe000104a46494600010100000100010000ffdb004300080606070605080707070909080a0c"
+    "140d0c0b0b0c1912130f141d1a1f1e1d1a1c1c20242e2720222c231c1c2837292c30313434341f27"
+    "393d38323c2e333432ffc0000b080001000101011100ffc4001f00000105010101010101000000000"
+    "00000000102030405060708090a0bffc400b5100002010303020403050504040000017d0102030004"
+    "1105122131410613516107227114328191a1082342b1c11552d1f02433627282090a161718191a25"
+    "262728292a3435363738393a434445464748494a535455565758595a636465666768696a73747576"
+    "7778797a838485868788898a92939495969798999aa2a3a4a5a6a7a8a9aab2b3b4b5b6b7b8b9bac2"
+    "c3c4c5c6c7c8c9cad2d3d4d5d6d7d8d9dae1e2e3e4e5e6e7e8e9eaf1f2f3f4f5f6f7f8f9faffda00"
+    "08010100003f00fbd3ffd9"
+)
+
+
+class FixtureConfig(NamedTuple):
+    """What the fixture server serves and how badly it behaves."""
+    site: str
+    book_id: str = "1000"
+    chapters: int = 200
+    paragraphs: int = 40
+    latency_ms: float = 0.0
+    jitter_ms: float = 0.0
+    error_rate: float = 0.0
+    seed: int = 0
+    fixtures_dir: Optional[str] = None
+
+
+def to_chinese_number(num: int) -> str:
+    """
+    Write a positive integer in Chinese numerals, as in chapter headings.
+
+    Args:
+        num: Number below 100,000,000
+
+    Returns:
+        Chinese numerals, e.g. 一百零一 for 101
+    """
+    if num >= 10000:
+        high, low = divmod(num, 10000)
+        if not low:
+            return f"{to_chinese_number(high)}万"
+        zero = "零" if low < 1000 else ""
+        return f"{to_chinese_number(high)}万{zero}{to_chinese_number(low)}"
+
+    result = ""
+    digits = str(num)
+    pending_zero = False
+    for i, char in enumerate(digits):
+        digit = int(char)
+        if digit == 0:
+            pending_zero = True
+            continue
+        if pending_zero and result:
+            result += CHINESE_DIGITS[0]
+        pending_zero = False
+        result += CHINESE_DIGITS[digit] + CHINESE_UNITS[len(digits) - 1 - i]
+    return result
+
+
+@lru_cache(maxsize=256)
+def _paragraphs(site: str, chapter_num: int, count: int, seed: int) -> tuple:
+    """Deterministic filler paragraphs for a chapter."""
+    rng = random.Random(seed * 1_000_003 + chapter_num)
+    if site == SITE_UUKANSHU:
+        return tuple(
+            "".join(rng.choice(HANZI) for _ in range(rng.randint(40, 120)))
+            for _ in range(count)
+        )
+    return tuple(
+        " ".join(rng.choice(WORDS) for _ in range(rng.randint(30, 90))).capitalize() + "."
+        for _ in range(count)
+    )
+
+
+def render_uukanshu_page(config: FixtureConfig, path: str) -> Optional[str]:
+    """Render the Uukanshu chapter list or a chapter page, None for unknown paths."""
+    book_path = f"/book/{config.book_id}"
+    if path == book_path:
+        entries = "\n".join(
+            f'<dd><a href="{book_path}/{num}.html">第{to_chinese_number(num)}章 标题{num}</a></dd>'
+            for num in range(1, config.chapters + 1)
+        )
+        return f"<html><body><dl>\n{entries}\n</dl></body></html>"
+
+    if path.startswith(f"{book_path}/") and path.endswith(".html"):
+        try:
+            num = int(path[len(book_path) + 1:-len(".html")])
+        except ValueError:
+            return None
+        if not 1 <= num <= config.chapters:
+            return None
+        text = "<br/>\n".join(_paragraphs(config.site, num, config.paragraphs, config.seed))
+        return (
+            f"<html><body><h1>第{to_chinese_number(num)}章 标题{num}</h1>"
+            f'<p class="readcotent bbb font-normal">{text}</p></body></html>'
+        )
+    return None
+
+
+def render_novelfull_page(config: FixtureConfig, path: str, query: str) -> Optional[str]:
+    """Render a NovelFull book page or a chapter page, None for unknown paths."""
+    book_path = f"/{config.book_id}.html"
+    if path == book_path:
+        pages = max(1, -(-config.chapters // NOVELFULL_PAGE_SIZE))
+        page = int(parse_qs(query).get("page", ["1"])[0])
+        first = (page - 1) * NOVELFULL_PAGE_SIZE + 1
+        last = min(page * NOVELFULL_PAGE_SIZE, config.chapters)
+        entries = "\n".join(
+            f'<li><a href="/{config.book_id}/chapter-{num}.html" '
+            f'title="Chapter {num} - Title {num}">Chapter {num}</a></li>'
+            for num in range(first, last + 1)
+        )
+        next_page = (
+            f'<li class="next"><a href="{book_path}?page={page + 1}">Next</a></li>'
+            if page < pages else ""
+        )
+        return (
+            '<html><body><div class="book"><img src="/cover.jpg"/></div>'
+            '<div class="info"><div><h3>Author:</h3><a>Benchmark Author</a></div>'
+            '<div><h3>Status:</h3>Completed</div></div>'
+            '<div class="desc-text"><p>A synthetic book.</p></div>'
+            f'<ul class="list-chapter">\n{entries}\n</ul>'
+            f'<ul class="pagination">{next_page}</ul></body></html>'
+        )
+
+    prefix = f"/{config.book_id}/chapter-"
+    if path.startswith(prefix) and path.endswith(".html"):
+        try:
+            num = int(path[len(prefix):-len(".html")])
+        except ValueError:
+            return None
+        if not 1 <= num <= config.chapters:
+            return None
+        paragraphs = "\n".join(
+            f"<p>{text}</p>" for text in _paragraphs(config.site, num, config.paragraphs, config.seed)
+        )
+        return (
+            '<html><body><div class="chapter container">'
+            f"<h3>Chapter {num} - Title {num}</h3>\n{paragraphs}</div></body></html>"
+        )
+    return None
+
+
+def _make_handler(config: FixtureConfig):
+    rng = random.Random(config.seed)
+    rng_lock = threading.Lock()
+
+    class FixtureHandler(BaseHTTPRequestHandler):
+        # Allow keep-alive for clients that reuse connections
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self) -> None:
+            with rng_lock:
+                delay = config.latency_ms + rng.uniform(-config.jitter_ms, config.jitter_ms)
+                fail = rng.random() < config.error_rate
+            if delay > 0:
+                threading.Event().wait(delay / 1000)
+            if fail:
+                self._send(503, b"Service Unavailable", "text/plain")
+                return
+
+            url = urlsplit(self.path)
+            body = self._load_recorded(url.path, url.query)
+            if body is None and url.path == "/cover.jpg":
+                self._send(200, COVER_JPEG, "image/jpeg")
+                return
+            if body is None:
+                if config.site == SITE_UUKANSHU:
+                    page = render_uukanshu_page(config, url.path)
+                else:
+                    page = render_novelfull_page(config, url.path, url.query)
+                body = page.encode("utf-8") if page is not None else None
+            if body is None:
+                self._send(404, b"Not Found", "text/plain")
+            else:
+                self._send(200, body, "text/html; charset=utf-8")
+
+        def _load_recorded(self, path: str, query: str) -> Optional[bytes]:
+            if not config.fixtures_dir:
+                return None
+            name = quote(f"{path}?{query}" if query else path, safe="/").lstrip("/")
+            file_path = os.path.join(config.fixtures_dir, name)
+            if not os.path.isfile(file_path):
+                return None
+            with open(file_path, "rb") as f:
+                return f.read()
+
+        def _send(self, status: int, body: bytes, content_type: str) -> None:
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format: str, *args) -> None:
+            pass
+
+    return FixtureHandler
+
+
+def _serve(config: FixtureConfig, port_queue) -> None:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _make_handler(config))
+    server.daemon_threads = True
+    port_queue.put(server.server_address[1])
+    server.serve_forever()
+
+
+class FixtureServer:
+    """
+    Fixture server running in a child process.
+
+    Use as a context manager; url is the base URL to point a trawler's
+    NOVEL_URL at.
+    """
+
+    def __init__(self, config: FixtureConfig) -> None:
+        if config.site not in SITES:
+            raise ValueError(f"Unknown site: {config.site}, expected one of {', '.join(SITES)}")
+        self.config = config
+        self.url: Optional[str] = None
+        self._process: Optional[multiprocessing.Process] = None
+
+    def start(self) -> None:
+        """Start the server and wait until it is listening."""
+        port_queue = multiprocessing.Queue()
+        self._process = multiprocessing.Process(
+            target=_serve, args=(self.config, port_queue), daemon=True
+        )
+        self._process.start()
+        port = port_queue.get(timeout=30)
+        self.url = f"http://127.0.0.1:{port}"
+        logger.info(f"Fixture server for {self.config.site} listening on {self.url}")
+
+    def stop(self) -> None:
+        """Stop the server process."""
+        if self._process is not None:
+            self._process.terminate()
+            self._process.join()
+            self._process = None
+
+    def __enter__(self) -> "FixtureServer":
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.stop()
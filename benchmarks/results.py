@@ -0,0 +1,124 @@
+"""
+Shared measurement and reporting helpers for the benchmarks.
+
+Every benchmark writes a JSON document with the same envelope (benchmark name,
+git commit, Python and platform, configuration and results), so runs of
+different versions can be diffed or loaded side by side.
+"""
+import os
+import sys
+import json
+import time
+import logging
+import platform
+import subprocess
+from typing import Dict, List, Optional
+
+from profiling import percentile
+
+try:
+    import resource
+except ImportError:  # pragma: no cover - not available on Windows
+    resource = None
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+def summarize_latencies(latencies: List[float]) -> Dict[str, float]:
+    """
+    Summarize latencies given in seconds.
+
+    Args:
+        latencies: Latency samples in seconds
+
+    Returns:
+        Dictionary of count, mean, p50, p95, p99 and max, in milliseconds
+    """
+    return {
+        "count": len(latencies),
+        "mean_ms": sum(latencies) / len(latencies) * 1000 if latencies else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "max_ms": max(latencies, default=0.0) * 1000,
+    }
+
+
+def get_peak_rss_mb(children: bool = False) -> Optional[float]:
+    """
+    Peak resident memory of this process so far.
+
+    Args:
+        children: Whether to report the largest peak of the finished child
+            processes (e.g. pool workers) instead
+
+    Returns:
+        Peak RSS in MB, or None where the resource module is unavailable
+    """
+    if resource is None:
+        return None
+    who = resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF
+    peak = resource.getrusage(who).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    if sys.platform == "darwin":
+        return peak / 1024 / 1024
+    return peak / 1024
+
+
+def get_git_commit() -> Optional[str]:
+    """Return the commit of the working tree, or None outside a git checkout."""
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return result.stdout.strip()
+
+
+def build_report(benchmark: str, config: Dict, results: Dict, label: Optional[str] = None) -> Dict:
+    """
+    Wrap benchmark results with the details needed to compare runs.
+
+    Args:
+        benchmark: Benchmark name
+        config: Parameters the benchmark ran with
+        results: Measurements
+        label: Optional free-form label for the run
+
+    Returns:
+        Report dictionary
+    """
+    return {
+        "benchmark": benchmark,
+        "label": label,
+        "commit": get_git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "config": config,
+        "results": results,
+    }
+
+
+def write_report(report: Dict, output_file: str) -> None:
+    """
+    Write a benchmark report as JSON.
+
+    Args:
+        report: Report from build_report()
+        output_file: Path of the JSON file
+    """
+    output_dir = os.path.dirname(output_file)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    with open(output_file, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+        f.write("\n")
+    logger.info(f"Benchmark results written to {output_file}")
@@ -0,0 +1,97 @@
+"""
+CLI startup benchmark and regression check.
+
+Cron jobs run many small commands, so the time to import main and to print
+--help adds up. Every measurement runs in a fresh interpreter. The check also
+lists the heavy dependencies that importing main loaded; those should only be
+imported by the commands that use them.
+"""
+import os
+import sys
+import json
+import time
+import logging
+import subprocess
+from typing import Dict, List
+
+from benchmarks.results import summarize_latencies
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Dependencies that only some commands need
+HEAVY_MODULES = (
+    "selenium",
+    "undetected_chromedriver",
+    "html2text",
+    "ebooklib",
+    "PyPDF2",
+    "bs4",
+    "requests",
+    "PIL",
+)
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_IMPORT_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import main
+seconds = time.perf_counter() - start
+print(json.dumps({"seconds": seconds, "loaded": sorted(m for m in %r if m in sys.modules)}))
+""" % (HEAVY_MODULES,)
+
+
+def _run(args: List[str]) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable] + args, cwd=PROJECT_DIR, capture_output=True, text=True, check=True
+    )
+
+
+def _time_process(args: List[str]) -> float:
+    start = time.perf_counter()
+    _run(args)
+    return time.perf_counter() - start
+
+
+def run_startup_benchmark(runs: int = 10) -> Dict:
+    """
+    Measure the CLI startup time over several fresh interpreters.
+
+    Args:
+        runs: Measurements of each kind
+
+    Returns:
+        Dictionary of measurements: the bare interpreter startup, the time
+        spent in "import main" alone and as a whole process, the --help
+        process, and the heavy modules that "import main" loaded
+    """
+    interpreter, import_only, import_process, help_process = [], [], [], []
+    loaded = set()
+    for _ in range(runs):
+        interpreter.append(_time_process(["-c", "pass"]))
+
+        start = time.perf_counter()
+        result = json.loads(_run(["-c", _IMPORT_SCRIPT]).stdout.strip().splitlines()[-1])
+        import_process.append(time.perf_counter() - start)
+        import_only.append(result["seconds"])
+        loaded.update(result["loaded"])
+
+        help_process.append(_time_process(["main.py", "--help"]))
+
+    results = {
+        "interpreter": summarize_latencies(interpreter),
+        "import_main": summarize_latencies(import_only),
+        "import_main_process": summarize_latencies(import_process),
+        "help_process": summarize_latencies(help_process),
+        "heavy_modules_loaded": sorted(loaded),
+    }
+    logger.info(
+        f"import main: p50 {results['import_main']['p50_ms']:.0f} ms "
+        f"({results['import_main_process']['p50_ms']:.0f} ms as a process), "
+        f"--help: p50 {results['help_process']['p50_ms']:.0f} ms, "
+        f"bare interpreter: p50 {results['interpreter']['p50_ms']:.0f} ms"
+    )
+    if loaded:
+        logger.warning(f"import main loaded heavy modules: {', '.join(sorted(loaded))}")
+    return results
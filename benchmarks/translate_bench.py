@@ -0,0 +1,157 @@
+"""
+Translation throughput benchmark with the offline FakeTranslator.
+
+A synthetic book is written to a temporary directory and every chapter is
+queued and translated through the same worker loop, chunk tuner and
+single-flight wrapper as translate-chapters, with FakeTranslator standing in
+for the real backend. This exercises chunking, retries and concurrency
+without a NovelHi token or a ChatGPT login.
+"""
+import os
+import random
+import logging
+import tempfile
+import threading
+import time
+from typing import Callable, Dict, List
+
+from benchmarks.fixture_server import HANZI, to_chinese_number
+from benchmarks.results import get_peak_rss_mb, summarize_latencies
+from chunk_tuner import ChunkSizeTuner
+from job_queue import TranslationJob, TranslationJobQueue
+from packed_store import open_reader_writer
+from translators import FakeTranslator, SingleFlightTranslator
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+BENCHMARK_BOOK_ID = "translate-benchmark"
+
+SENTENCE_ENDINGS = "，。！？"
+
+
+def make_synthetic_chapter(chapter_num: int, chars: int, seed: int = 0) -> str:
+    """
+    Generate deterministic Chinese-looking chapter text.
+
+    Args:
+        chapter_num: Chapter number, varies the text
+        chars: Approximate length in characters
+        seed: Seed for the text
+
+    Returns:
+        Paragraphs of text separated by blank lines
+    """
+    rng = random.Random(seed * 1_000_003 + chapter_num)
+    paragraphs = []
+    length = 0
+    while length < chars:
+        sentence_count = rng.randint(2, 6)
+        paragraph = "".join(
+            "".join(rng.choice(HANZI) for _ in range(rng.randint(8, 30))) + rng.choice(SENTENCE_ENDINGS)
+            for _ in range(sentence_count)
+        )
+        paragraphs.append(paragraph)
+        length += len(paragraph) + 2
+    return "\n\n".join(paragraphs)
+
+
+def run_translate_benchmark(
+    run_worker: Callable[..., int],
+    translator: FakeTranslator,
+    chapters: int = 100,
+    chapter_chars: int = 3000,
+    workers: int = 1,
+    initial_chars: int = 2000,
+    seed: int = 0,
+) -> Dict:
+    """
+    Translate a synthetic book and measure throughput.
+
+    Storage, the job queue and everything else the translate path writes go
+    to a temporary directory, used as the working directory for the run.
+
+    Args:
+        run_worker: The translate commands' worker loop, called as
+            run_worker(job_queue, translator, tuner, book_id=..., workers=...,
+            on_chapter_done=...) and returning the number of failed chapters
+        translator: Fake backend, configured with the latency and failures to simulate
+        chapters: Number of chapters in the synthetic book
+        chapter_chars: Characters per chapter
+        workers: Number of chapters translated concurrently
+        initial_chars: Starting chunk size of the tuner
+        seed: Seed for the synthetic text
+
+    Returns:
+        Dictionary of measurements
+    """
+    latencies: List[float] = []
+    latencies_lock = threading.Lock()
+
+    def on_chapter_done(job: TranslationJob, seconds: float) -> None:
+        with latencies_lock:
+            latencies.append(seconds)
+
+    previous_dir = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="translate-benchmark-") as work_dir:
+        os.chdir(work_dir)
+        try:
+            text_rw = open_reader_writer(BENCHMARK_BOOK_ID)
+            text_rw.write_chapters(
+                [
+                    (
+                        BENCHMARK_BOOK_ID,
+                        f"{num}_第{to_chinese_number(num)}章",
+                        make_synthetic_chapter(num, chapter_chars, seed),
+                        True,
+                    )
+                    for num in range(1, chapters + 1)
+                ]
+            )
+            text_rw.save_chapter_index()
+
+            job_queue = TranslationJobQueue("jobs.sqlite")
+            job_queue.enqueue(BENCHMARK_BOOK_ID, range(1, chapters + 1))
+            tuner = ChunkSizeTuner("fake", state_file=None, initial_chars=initial_chars)
+
+            start = time.perf_counter()
+            failed_chapters = run_worker(
+                job_queue,
+                SingleFlightTranslator(translator),
+                tuner,
+                book_id=BENCHMARK_BOOK_ID,
+                workers=workers,
+                on_chapter_done=on_chapter_done,
+            )
+            wall_seconds = time.perf_counter() - start
+        finally:
+            os.chdir(previous_dir)
+
+    stats = translator.stats()
+    wasted_requests = stats["failures"] + stats["truncations"]
+    chunks = stats["requests"] - wasted_requests
+    results = {
+        "chapters": len(latencies),
+        "failed_chapters": failed_chapters,
+        "wall_seconds": wall_seconds,
+        "chunks": chunks,
+        "chunks_per_sec": chunks / wall_seconds if wall_seconds else 0.0,
+        "source_chars_per_sec": (stats["chars"] - stats["wasted_chars"]) / wall_seconds
+        if wall_seconds else 0.0,
+        "chapter_latency": summarize_latencies(latencies),
+        "requests": stats["requests"],
+        "wasted_retries": wasted_requests,
+        "failures": stats["failures"],
+        "truncations": stats["truncations"],
+        "wasted_chars": stats["wasted_chars"],
+        "final_chunk_chars": tuner.target_chars,
+        "peak_rss_mb": get_peak_rss_mb(),
+    }
+    logger.info(
+        f"Translated {len(latencies)}/{chapters} chapters in {wall_seconds:.2f}s: "
+        f"{results['chunks_per_sec']:.1f} chunks/s, "
+        f"chapter p50 {results['chapter_latency']['p50_ms']:.0f} ms, "
+        f"p95 {results['chapter_latency']['p95_ms']:.0f} ms, "
+        f"{wasted_requests} wasted retries ({stats['wasted_chars']} chars)"
+    )
+    return results
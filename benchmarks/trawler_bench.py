@@ -0,0 +1,141 @@
+"""
+Full-book download benchmark for the trawlers against the local fixture server.
+
+The trawler is pointed at the fixture server and downloads every chapter the
+way the download commands do, one get_chapter() call at a time. Time spent
+inside _get_content() counts as network wait, and CPU time spent outside it
+as parsing, so changes to either side show up separately.
+"""
+import time
+import logging
+from typing import Callable, Dict, List, TypeVar
+
+from benchmarks.fixture_server import SITE_NOVELFULL, SITE_UUKANSHU, FixtureConfig, FixtureServer
+from benchmarks.results import get_peak_rss_mb, summarize_latencies
+from trawlers import NovelFullTrawler, UukanshuNovelTrawler
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+TRAWLERS = {
+    SITE_UUKANSHU: UukanshuNovelTrawler,
+    SITE_NOVELFULL: NovelFullTrawler,
+}
+
+
+class _NetworkTimer:
+    """Wraps a trawler's _get_content() to time the network part of each call."""
+
+    def __init__(self, get_content: Callable) -> None:
+        self._get_content = get_content
+        self.wait_seconds = 0.0
+        self.cpu_seconds = 0.0
+        self.requests = 0
+
+    def __call__(self, url: str):
+        wall_start = time.perf_counter()
+        cpu_start = time.thread_time()
+        try:
+            return self._get_content(url)
+        finally:
+            self.wait_seconds += time.perf_counter() - wall_start
+            self.cpu_seconds += time.thread_time() - cpu_start
+            self.requests += 1
+
+
+def _with_retries(call: Callable[[], T], max_retries: int) -> T:
+    """Run call, retrying failures such as injected server errors."""
+    for attempt in range(max_retries + 1):
+        try:
+            return call()
+        except Exception:
+            if attempt == max_retries:
+                raise
+
+
+def run_trawler_benchmark(config: FixtureConfig, max_retries: int = 3) -> Dict:
+    """
+    Download a whole synthetic or recorded book and measure the trawler.
+
+    The trawlers don't retry, so an injected error makes get_chapter() fail;
+    failed chapters are retried up to max_retries times and the failed
+    attempts are counted, with their time included in the chapter latency.
+
+    Args:
+        config: Fixture server configuration, including the site to benchmark
+        max_retries: Retries per chapter after a failed attempt
+
+    Returns:
+        Dictionary of measurements
+    """
+    with FixtureServer(config) as server:
+        trawler = TRAWLERS[config.site]()
+        trawler.NOVEL_URL = server.url
+        timer = _NetworkTimer(trawler._get_content)
+        trawler._get_content = timer
+
+        def load_index() -> Dict:
+            # An error page parses as an empty or truncated chapter list
+            trawler.chapter_titles = None
+            titles = trawler.get_chapter_titles(config.book_id)
+            if not titles or (not config.fixtures_dir and len(titles) != config.chapters):
+                raise ValueError(f"Incomplete chapter list: {len(titles)} chapters")
+            return titles
+
+        index_start = time.perf_counter()
+        chapter_titles = _with_retries(load_index, max_retries)
+        index_seconds = time.perf_counter() - index_start
+        index_requests = timer.requests
+        timer.wait_seconds = timer.cpu_seconds = 0.0
+
+        latencies: List[float] = []
+        errors = 0
+        failed_chapters = 0
+        total_chars = 0
+        cpu_start = time.thread_time()
+        wall_start = time.perf_counter()
+        for chapter_num in chapter_titles:
+            chapter_start = time.perf_counter()
+            for attempt in range(max_retries + 1):
+                try:
+                    _, content = trawler.get_chapter(config.book_id, chapter_num)
+                except Exception as e:
+                    errors += 1
+                    logger.debug(f"Chapter {chapter_num} attempt {attempt + 1} failed: {str(e)}")
+                    continue
+                total_chars += len(content)
+                latencies.append(time.perf_counter() - chapter_start)
+                break
+            else:
+                failed_chapters += 1
+        wall_seconds = time.perf_counter() - wall_start
+        cpu_seconds = time.thread_time() - cpu_start
+
+    downloaded = len(latencies)
+    results = {
+        "chapters": downloaded,
+        "failed_chapters": failed_chapters,
+        "errors": errors,
+        "requests": timer.requests - index_requests,
+        "index_seconds": index_seconds,
+        "index_requests": index_requests,
+        "wall_seconds": wall_seconds,
+        "chapters_per_sec": downloaded / wall_seconds if wall_seconds else 0.0,
+        "chars": total_chars,
+        "latency": summarize_latencies(latencies),
+        "network_wait_seconds": timer.wait_seconds,
+        "network_cpu_seconds": timer.cpu_seconds,
+        "parse_cpu_seconds": cpu_seconds - timer.cpu_seconds,
+        "peak_rss_mb": get_peak_rss_mb(),
+    }
+    logger.info(
+        f"{config.site}: {downloaded} chapters in {wall_seconds:.2f}s "
+        f"({results['chapters_per_sec']:.1f} chapters/s), "
+        f"p50 {results['latency']['p50_ms']:.1f} ms, p95 {results['latency']['p95_ms']:.1f} ms, "
+        f"p99 {results['latency']['p99_ms']:.1f} ms, "
+        f"network wait {timer.wait_seconds:.2f}s, parse CPU {results['parse_cpu_seconds']:.2f}s, "
+        f"{errors} errors"
+    )
+    return results
@@ -3,13 +3,15 @@
 """Class definition for ChatGPT Handler"""
 
 import time
-import undetected_chromedriver as uc
+from typing import Optional
 
 ##from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
 import selenium.common.exceptions as Exceptions
 
+from browsers.pool import BrowserPool, get_default_pool
+
 
 class TalkingHeads:
     """An interface for talking heads"""
@@ -97,13 +99,11 @@ class Handler:
         password: str,
         headless: bool = True,
         cold_start: bool = False,
+        pool: Optional[BrowserPool] = None,
     ):
-        options = uc.ChromeOptions()
-        options.add_argument("--incognito")
-        if headless:
-            options.add_argument("--headless")
-        self.browser = uc.Chrome(options=options)
-        self.browser.set_page_load_timeout(15)
+        # The ChatGPT session lives in the browser, so hold it until close()
+        self.pool = pool or get_default_pool(headless)
+        self.browser = self.pool.acquire()
 
         self.browser.get("https://chat.openai.com/auth/login?next=/chat")
         if not cold_start:
@@ -199,6 +199,12 @@ class Handler:
         """the conversation is refreshed"""
         self.browser.find_element(By.XPATH, self.reset_xq).click()
 
+    def close(self):
+        """Hand the browser back to the pool"""
+        if self.browser is not None:
+            self.pool.release(self.browser)
+            self.browser = None
+
 
 if __name__ == "__main__":
     import argparse
@@ -1,12 +1,18 @@
 import json
+import logging
+from typing import Optional
 
 import html2text
 import requests
-import undetected_chromedriver as uc
 
 ##from selenium import webdriver
 from selenium.webdriver.common.by import By
 
+from browsers.pool import BrowserPool, get_default_pool
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
 
 class NovelHiHandler:
     NOVELHI_WEBSITE = "https://novelhi.com/s/Nine-Star-Hegemon-Body-Art"
@@ -16,26 +22,25 @@ class NovelHiHandler:
     def __init__(
         self,
         headless: bool = True,
+        pool: Optional[BrowserPool] = None,
     ):
         self.translate_token = None
-
-        options = uc.ChromeOptions()
-        options.add_argument("--incognito")
-        if headless:
-            options.add_argument("--headless")
-            # PROXY = "37.187.88.32:8001"
-            # options.add_argument(f'--proxy-server={PROXY}')
-        self.browser = uc.Chrome(options=options)
-        self.browser.set_page_load_timeout(15)
-
-        self.browser.get(self.NOVELHI_WEBSITE)
-        print(self.browser.find_element(By.TAG_NAME, "body").text)
+        # Reused across requests so connections to NovelHi stay open
+        self.session = requests.Session()
+        self.pool = pool or get_default_pool(headless)
+        # Started ahead of time, so refreshing the token later doesn't wait for Chrome
+        self.pool.prewarm(1)
         self._get_translate_token()
 
     def _get_translate_token(self) -> str:
         if self.translate_token is None:
-            token_element = self.browser.find_element(By.XPATH, self.transkey_xq)
-            self.translate_token = token_element.get_attribute("value")
+            # The browser is only needed to read the token, so hand it back right away
+            with self.pool.browser() as browser:
+                browser.get(self.NOVELHI_WEBSITE)
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug(f"NovelHi page: {browser.find_element(By.TAG_NAME, 'body').text}")
+                token_element = browser.find_element(By.XPATH, self.transkey_xq)
+                self.translate_token = token_element.get_attribute("value")
         return self.translate_token
 
     def translate_text(self, chinese_text: str) -> str:
@@ -44,8 +49,8 @@ class NovelHiHandler:
         headers = {
             "content-type": "application/json",
         }
-        response = requests.post(url, data=json.dumps(payload), headers=headers)
-        print(response.content)
+        response = self.session.post(url, data=json.dumps(payload), headers=headers)
+        logger.debug(f"NovelHi response: {response.content!r}")
         content = json.loads(response.content)
         html_text = content.get("data", {}).get("content")
         while "<br><br>" in html_text:
@@ -62,6 +67,6 @@ class NovelHiHandler:
 
 if __name__ == "__main__":
     novelhi = NovelHiHandler()
-    print("loaded website")
+    logger.debug("loaded website")
     novelhi.translate_text(chinese_text="真的吗？？为什么你么迷妹这么差")
-    print("got token")
+    logger.debug("got token")
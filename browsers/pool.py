@@ -0,0 +1,308 @@
+"""
+Shared pool of pre-warmed, recycled Chrome instances.
+
+Starting undetected Chrome is slow: the driver binary is re-downloaded and
+re-patched on every launch and each browser gets a fresh temporary profile.
+The pool caches the patched driver and gives every slot a persistent profile
+directory, and recycles browsers after a number of uses or once their memory
+grows past a threshold, so long translation runs don't grow without bound.
+"""
+import atexit
+import functools
+import logging
+import os
+import shutil
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+import undetected_chromedriver as uc
+from selenium.common.exceptions import SessionNotCreatedException
+
+try:
+    import psutil
+except ImportError:  # pragma: no cover - optional dependency
+    psutil = None
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = os.path.join(
+    os.path.expanduser("~"), ".cache", "trawl_translate_novel", "browsers"
+)
+
+
+class _PooledBrowser:
+    def __init__(self, browser: uc.Chrome, slot: int) -> None:
+        self.browser = browser
+        self.slot = slot
+        self.uses = 0
+
+
+class BrowserPool:
+    """
+    Hands out Chrome instances and recycles them.
+
+    Each pool slot has its own persistent profile directory, since Chrome
+    refuses to share one profile between running instances.
+    """
+
+    def __init__(
+        self,
+        size: int = 2,
+        max_uses: int = 50,
+        max_rss_mb: Optional[int] = 1500,
+        headless: bool = True,
+        cache_dir: str = DEFAULT_CACHE_DIR,
+        page_load_timeout: int = 15,
+    ) -> None:
+        """
+        Initialize the pool. Browsers are started lazily or via prewarm().
+
+        Args:
+            size: Maximum number of concurrently running browsers
+            max_uses: Number of acquisitions after which a browser is recycled
+            max_rss_mb: Memory of the browser process tree above which it is recycled, None to disable
+            headless: Whether to start Chrome headless
+            cache_dir: Directory holding the patched driver and profile directories
+            page_load_timeout: Page load timeout in seconds for new browsers
+        """
+        self.size = size
+        self.max_uses = max_uses
+        self.max_rss_mb = max_rss_mb
+        self.headless = headless
+        self.cache_dir = cache_dir
+        self.page_load_timeout = page_load_timeout
+
+        self.driver_path = os.path.join(cache_dir, "chromedriver")
+        self.profile_root = os.path.join(
+            cache_dir, "profiles-headless" if headless else "profiles"
+        )
+
+        self._condition = threading.Condition()
+        self._idle: List[_PooledBrowser] = []
+        self._in_use: Dict[int, _PooledBrowser] = {}
+        self._free_slots = list(range(size))
+        self._closed = False
+
+        if max_rss_mb and psutil is None:
+            logger.warning("psutil is not installed, browser memory limits are disabled")
+
+    def prewarm(self, count: Optional[int] = None) -> None:
+        """
+        Start browsers ahead of time so the first acquire() is fast.
+
+        Args:
+            count: Number of browsers to start, defaults to the pool size
+        """
+        count = self.size if count is None else min(count, self.size)
+        started = []
+        for _ in range(count):
+            started.append(self.acquire())
+        for browser in started:
+            self.release(browser)
+
+    def acquire(self) -> uc.Chrome:
+        """
+        Get a browser from the pool, starting one if needed.
+
+        Blocks while all browsers are in use.
+
+        Returns:
+            A running Chrome instance, which must be handed back with release()
+        """
+        with self._condition:
+            while True:
+                if self._closed:
+                    raise RuntimeError("Browser pool is closed")
+                if self._idle:
+                    pooled = self._idle.pop()
+                    break
+                if self._free_slots:
+                    slot = self._free_slots.pop(0)
+                    pooled = None
+                    break
+                self._condition.wait()
+
+        if pooled is None:
+            try:
+                pooled = _PooledBrowser(self._launch(slot), slot)
+            except Exception:
+                with self._condition:
+                    self._free_slots.append(slot)
+                    self._condition.notify()
+                raise
+
+        pooled.uses += 1
+        with self._condition:
+            self._in_use[id(pooled.browser)] = pooled
+        return pooled.browser
+
+    def release(self, browser: uc.Chrome) -> None:
+        """
+        Return a browser to the pool, recycling it if it is worn out.
+
+        Args:
+            browser: Browser previously returned by acquire()
+        """
+        with self._condition:
+            pooled = self._in_use.pop(id(browser), None)
+        if pooled is None:
+            # Already quit by close(quit_in_use=True)
+            return
+
+        if self._closed or self._should_recycle(pooled):
+            self._quit(pooled)
+            with self._condition:
+                self._free_slots.append(pooled.slot)
+                self._condition.notify()
+            return
+
+        with self._condition:
+            self._idle.append(pooled)
+            self._condition.notify()
+
+    @contextmanager
+    def browser(self):
+        """Context manager acquiring and releasing a browser."""
+        browser = self.acquire()
+        try:
+            yield browser
+        finally:
+            self.release(browser)
+
+    def close(self, quit_in_use: bool = False) -> None:
+        """
+        Quit all idle browsers. Browsers in use are quit on release.
+
+        Args:
+            quit_in_use: Also quit browsers that were never released, e.g. at exit
+        """
+        with self._condition:
+            self._closed = True
+            to_quit, self._idle = self._idle, []
+            if quit_in_use:
+                to_quit.extend(self._in_use.values())
+                self._in_use.clear()
+            self._condition.notify_all()
+        for pooled in to_quit:
+            self._quit(pooled)
+
+    def _launch(self, slot: int) -> uc.Chrome:
+        profile_dir = os.path.join(self.profile_root, f"slot-{slot}")
+        os.makedirs(profile_dir, exist_ok=True)
+
+        # Reuse the already patched driver instead of downloading and patching again
+        driver_path = self.driver_path if os.path.exists(self.driver_path) else None
+        logger.info(f"Starting Chrome in pool slot {slot} (cached driver: {bool(driver_path)})")
+        try:
+            browser = uc.Chrome(
+                options=self._options(),
+                user_data_dir=profile_dir,
+                driver_executable_path=driver_path,
+            )
+        except SessionNotCreatedException as e:
+            if driver_path is None:
+                raise
+            # The cached driver no longer matches Chrome, typically after a
+            # Chrome update, so drop it and let a matching one be patched
+            logger.warning(f"Cached chromedriver rejected, downloading a new one: {str(e)}")
+            self._discard_cached_driver()
+            driver_path = None
+            browser = uc.Chrome(options=self._options(), user_data_dir=profile_dir)
+        browser.set_page_load_timeout(self.page_load_timeout)
+
+        if driver_path is None:
+            self._cache_driver(browser)
+        return browser
+
+    def _cache_driver(self, browser: uc.Chrome) -> None:
+        patched_path = getattr(getattr(browser, "patcher", None), "executable_path", None)
+        if not patched_path or not os.path.exists(patched_path):
+            return
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_path = f"{self.driver_path}.tmp"
+            shutil.copy2(patched_path, tmp_path)
+            os.replace(tmp_path, self.driver_path)
+            logger.info(f"Cached patched chromedriver at {self.driver_path}")
+        except OSError as e:
+            logger.warning(f"Unable to cache patched chromedriver: {str(e)}")
+
+    def _options(self) -> uc.ChromeOptions:
+        # A fresh object per launch, since ChromeOptions can't be reused
+        options = uc.ChromeOptions()
+        if self.headless:
+            options.add_argument("--headless")
+        return options
+
+    def _discard_cached_driver(self) -> None:
+        try:
+            os.remove(self.driver_path)
+        except FileNotFoundError:
+            pass
+
+    def _should_recycle(self, pooled: _PooledBrowser) -> bool:
+        if pooled.uses >= self.max_uses:
+            logger.info(f"Recycling browser in slot {pooled.slot} after {pooled.uses} uses")
+            return True
+
+        rss_mb = self._browser_rss_mb(pooled.browser)
+        if self.max_rss_mb and rss_mb is not None and rss_mb > self.max_rss_mb:
+            logger.info(f"Recycling browser in slot {pooled.slot} using {rss_mb:.0f} MB")
+            return True
+
+        try:
+            # Drop the current page so idle browsers hold as little memory as possible
+            pooled.browser.get("about:blank")
+        except Exception as e:
+            logger.info(f"Recycling unresponsive browser in slot {pooled.slot}: {str(e)}")
+            return True
+        return False
+
+    def _browser_rss_mb(self, browser: uc.Chrome) -> Optional[float]:
+        pid = getattr(browser, "browser_pid", None)
+        if psutil is None or pid is None:
+            return None
+        try:
+            process = psutil.Process(pid)
+            processes = [process] + process.children(recursive=True)
+            rss = 0
+            for proc in processes:
+                try:
+                    rss += proc.memory_info().rss
+                except psutil.Error:
+                    pass
+            return rss / 1024 / 1024
+        except psutil.Error:
+            return None
+
+    def _quit(self, pooled: _PooledBrowser) -> None:
+        try:
+            pooled.browser.quit()
+        except Exception as e:
+            logger.debug(f"Error quitting browser in slot {pooled.slot}: {str(e)}")
+
+
+_default_pools: Dict[bool, BrowserPool] = {}
+_default_pools_lock = threading.Lock()
+
+
+def get_default_pool(headless: bool = True) -> BrowserPool:
+    """
+    Return the process-wide pool shared by all Selenium users.
+
+    Args:
+        headless: Whether the pool should start headless browsers
+
+    Returns:
+        The shared BrowserPool for the requested mode
+    """
+    with _default_pools_lock:
+        pool = _default_pools.get(headless)
+        if pool is None:
+            pool = BrowserPool(headless=headless)
+            _default_pools[headless] = pool
+            # Browsers still held at exit would otherwise outlive the process
+            atexit.register(functools.partial(pool.close, quit_in_use=True))
+        return pool
@@ -0,0 +1,139 @@
+"""
+Write-behind chapter writer.
+
+Download loops hand finished chapters to BufferedChapterWriter, which writes
+them on a background thread in batches. Each batch is written atomically and
+made durable with one round of fsyncs, so fetching never waits on the disk.
+"""
+import queue
+import logging
+import threading
+from typing import List, Optional, Tuple
+
+from base import TextReaderWriter
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class BufferedChapterWriter:
+    """
+    Queues chapters and writes them through a TextReaderWriter on a background thread.
+
+    Use as a context manager, or call close() when done. flush() blocks until
+    everything queued so far is on disk and re-raises the first write error.
+    """
+
+    def __init__(
+        self,
+        reader_writer: TextReaderWriter,
+        batch_size: int = 50,
+        max_queued: int = 1000,
+        fsync: bool = True,
+    ) -> None:
+        """
+        Initialize the writer and start its background thread.
+
+        Args:
+            reader_writer: Storage backend the chapters are written to
+            batch_size: Maximum number of chapters written per batch
+            max_queued: Maximum number of chapters waiting to be written before write_chapter blocks
+            fsync: Whether to make each batch durable before the next one
+        """
+        self.reader_writer = reader_writer
+        self.batch_size = batch_size
+        self.fsync = fsync
+
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_queued)
+        self._error: Optional[BaseException] = None
+        self._closed = False
+        self._thread = threading.Thread(
+            target=self._run, name="chapter-writer", daemon=True
+        )
+        self._thread.start()
+
+    def write_chapter(
+        self,
+        book_title: str,
+        chapter_title: str,
+        content: str,
+        is_downloaded: bool = True,
+    ) -> None:
+        """
+        Queue a chapter to be written.
+
+        Args:
+            book_title: Title of the book
+            chapter_title: Title of the chapter
+            content: Chapter content to write
+            is_downloaded: Whether to write to downloaded dir (True) or translated dir (False)
+        """
+        if self._closed:
+            raise RuntimeError("Chapter writer is closed")
+        self._raise_error()
+        self._queue.put((book_title, chapter_title, content, is_downloaded))
+
+    def flush(self) -> None:
+        """Block until every queued chapter has been written."""
+        self._queue.join()
+        self._raise_error()
+
+    def close(self) -> None:
+        """Write all queued chapters and stop the background thread."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join()
+        self._raise_error()
+
+    def __enter__(self) -> "BufferedChapterWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        # Always persist what was downloaded, but don't mask the original error
+        try:
+            self.close()
+        except Exception:
+            if exc_type is None:
+                raise
+            logger.exception("Error flushing chapters")
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            batch: List[Tuple[str, str, str, bool]] = []
+            stop = item is _STOP
+            if not stop:
+                batch.append(item)
+
+            # Drain whatever else is already queued, up to the batch size
+            while not stop and len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stop = True
+                else:
+                    batch.append(item)
+
+            try:
+                if batch and self._error is None:
+                    self.reader_writer.write_chapters(batch, fsync=self.fsync)
+                    logger.debug(f"Wrote batch of {len(batch)} chapters")
+            except BaseException as e:
+                logger.error(f"Error writing chapters: {str(e)}")
+                self._error = e
+            finally:
+                for _ in range(len(batch) + (1 if stop else 0)):
+                    self._queue.task_done()
+
+            if stop:
+                return
+
+    def _raise_error(self) -> None:
+        if self._error is not None:
+            raise self._error
@@ -0,0 +1,301 @@
+"""
+Adaptive chunk sizing for translation requests.
+
+Tracks latency, throughput and failure/truncation rates per translator backend
+and adjusts the target chunk size to maximise throughput. The learned settings
+are persisted so the next run starts from the last known good size.
+"""
+import json
+import os
+import time
+import threading
+import logging
+from typing import Callable, Dict, List, Optional
+
+from metrics import TRANSLATED_CHARS, TRANSLATION_CHUNKS, TRANSLATION_REQUEST_SECONDS, TRANSLATION_RETRIES
+from utils import split_content_by_size
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+class ChunkTruncatedError(Exception):
+    """Raised when a translation looks truncated compared to its source."""
+    pass
+
+
+class ChunkSizeTuner:
+    """
+    Hill-climbing tuner for the translation chunk size of a single backend.
+
+    Requests are grouped into windows. After each window the throughput
+    (source chars per second) is compared with the previous window: if it
+    improved the tuner keeps moving the target size in the same direction,
+    otherwise it reverses. Any failure or truncation in a window shrinks the
+    target multiplicatively.
+    """
+    DEFAULT_STATE_FILE = "chunk_tuning.json"
+
+    def __init__(
+        self,
+        backend: str,
+        state_file: Optional[str] = DEFAULT_STATE_FILE,
+        min_chars: int = 500,
+        max_chars: int = 8000,
+        initial_chars: int = 2000,
+        step: float = 1.25,
+        window: int = 5,
+    ) -> None:
+        """
+        Initialize the tuner, loading any previously learned state.
+
+        Args:
+            backend: Name of the translator backend (e.g. "novelhi")
+            state_file: JSON file used to persist learned settings, or None to disable
+            min_chars: Lower bound for the target chunk size
+            max_chars: Upper bound for the target chunk size
+            initial_chars: Target chunk size used when no state has been saved
+            step: Multiplicative factor applied on each adjustment
+            window: Number of requests between adjustments
+        """
+        self.backend = backend
+        self.state_file = state_file
+        self.min_chars = min_chars
+        self.max_chars = max_chars
+        self.step = step
+        self.window = window
+
+        self.target_chars = initial_chars
+        self.direction = 1
+        self.last_throughput = None
+
+        # Lifetime stats for the backend
+        self.requests = 0
+        self.failures = 0
+        self.truncations = 0
+        self.total_chars = 0
+        self.total_latency = 0.0
+
+        self._window_samples = []
+        # Chapters may be translated concurrently, so guard the shared stats
+        self._lock = threading.RLock()
+        self._load()
+        self.target_chars = self._clamp(self.target_chars)
+
+    def record(
+        self,
+        chars: int,
+        latency: float,
+        ok: bool = True,
+        truncated: bool = False,
+    ) -> None:
+        """
+        Record the outcome of a single translation request.
+
+        Args:
+            chars: Number of source characters sent
+            latency: Request latency in seconds
+            ok: Whether the request succeeded
+            truncated: Whether the response looked truncated
+        """
+        with self._lock:
+            self.requests += 1
+            self.total_latency += latency
+            if not ok:
+                self.failures += 1
+            elif truncated:
+                self.truncations += 1
+            else:
+                self.total_chars += chars
+
+            logger.debug(
+                f"[{self.backend}] {chars} chars in {latency:.2f}s "
+                f"(ok={ok}, truncated={truncated})"
+            )
+            self._window_samples.append((chars, latency, ok and not truncated))
+
+            # Shrink immediately on errors, otherwise adjust once per window
+            if not ok or truncated:
+                self._adjust()
+            elif len(self._window_samples) >= self.window:
+                self._adjust()
+
+    def split(self, content: str) -> List[str]:
+        """Split content using the current target chunk size."""
+        return split_content_by_size(content, self.target_chars)
+
+    def summary(self) -> Dict:
+        """Return lifetime stats for the backend."""
+        throughput = (
+            self.total_chars / self.total_latency if self.total_latency else 0.0
+        )
+        return {
+            "target_chars": self.target_chars,
+            "requests": self.requests,
+            "failures": self.failures,
+            "truncations": self.truncations,
+            "mean_latency": (
+                self.total_latency / self.requests if self.requests else 0.0
+            ),
+            "chars_per_second": throughput,
+        }
+
+    def save(self) -> None:
+        """Persist the learned settings for the backend."""
+        if not self.state_file:
+            return
+
+        with self._lock:
+            state = self._read_state_file()
+            state[self.backend] = {
+                "target_chars": self.target_chars,
+                "direction": self.direction,
+                "last_throughput": self.last_throughput,
+                "requests": self.requests,
+                "failures": self.failures,
+                "truncations": self.truncations,
+                "total_chars": self.total_chars,
+                "total_latency": self.total_latency,
+            }
+
+            tmp_path = f"{self.state_file}.tmp"
+            try:
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(state, f, indent=2)
+                os.replace(tmp_path, self.state_file)
+                logger.debug(f"Saved chunk tuning state to {self.state_file}")
+            except IOError as e:
+                logger.error(f"Error saving chunk tuning state: {str(e)}")
+
+    def _adjust(self) -> None:
+        samples = self._window_samples
+        self._window_samples = []
+        previous = self.target_chars
+
+        if not all(ok for _, _, ok in samples):
+            self.direction = -1
+            self.last_throughput = None
+            self.target_chars = self._clamp(int(self.target_chars / self.step))
+        else:
+            chars = sum(c for c, _, _ in samples)
+            latency = sum(l for _, l, _ in samples)
+            throughput = chars / latency if latency else 0.0
+            if self.last_throughput is not None and throughput < self.last_throughput:
+                self.direction = -self.direction
+            self.last_throughput = throughput
+
+            if self.direction > 0:
+                self.target_chars = self._clamp(int(self.target_chars * self.step))
+            else:
+                self.target_chars = self._clamp(int(self.target_chars / self.step))
+
+        if self.target_chars != previous:
+            logger.info(
+                f"[{self.backend}] Adjusted target chunk size {previous} -> {self.target_chars} chars"
+            )
+
+    def _clamp(self, chars: int) -> int:
+        return max(self.min_chars, min(self.max_chars, chars))
+
+    def _read_state_file(self) -> Dict:
+        if not self.state_file or not os.path.exists(self.state_file):
+            return {}
+        try:
+            with open(self.state_file, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (IOError, json.JSONDecodeError) as e:
+            logger.error(f"Error reading chunk tuning state: {str(e)}")
+            return {}
+
+    def _load(self) -> None:
+        state = self._read_state_file().get(self.backend)
+        if not state:
+            return
+        self.target_chars = state.get("target_chars", self.target_chars)
+        self.direction = state.get("direction", self.direction)
+        self.last_throughput = state.get("last_throughput")
+        self.requests = state.get("requests", 0)
+        self.failures = state.get("failures", 0)
+        self.truncations = state.get("truncations", 0)
+        self.total_chars = state.get("total_chars", 0)
+        self.total_latency = state.get("total_latency", 0.0)
+        logger.debug(
+            f"Loaded chunk tuning state for {self.backend}: {self.target_chars} chars"
+        )
+
+
+def translate_with_tuner(
+    translate: Callable[[str], str],
+    content: str,
+    tuner: ChunkSizeTuner,
+    min_output_ratio: float = 0.5,
+    max_attempts: int = 3,
+) -> str:
+    """
+    Translate content in tuner-sized chunks, feeding results back to the tuner.
+
+    Failed or truncated chunks are re-split with the (now smaller) target size
+    and retried.
+
+    Args:
+        translate: Function translating a single chunk
+        content: Full text to translate
+        tuner: Tuner providing the chunk size and recording outcomes
+        min_output_ratio: Output/input length ratio below which a response is treated as truncated
+        max_attempts: Maximum attempts per chunk before giving up
+
+    Returns:
+        Translated text
+    """
+    translated_contents = []
+    for chunk in tuner.split(content):
+        translated_contents.append(
+            _translate_chunk(translate, chunk, tuner, min_output_ratio, max_attempts)
+        )
+    return "".join(translated_contents)
+
+
+def _translate_chunk(
+    translate: Callable[[str], str],
+    chunk: str,
+    tuner: ChunkSizeTuner,
+    min_output_ratio: float,
+    attempts_left: int,
+) -> str:
+    logger.info(f"Translating content chunk ({len(chunk)} chars)")
+    backend = tuner.backend
+    start = time.perf_counter()
+    try:
+        translated = translate(chunk)
+        latency = time.perf_counter() - start
+        TRANSLATION_REQUEST_SECONDS.observe(latency, backend=backend)
+        if chunk.strip() and len(translated.strip()) < len(chunk.strip()) * min_output_ratio:
+            raise ChunkTruncatedError(
+                f"Translation of {len(chunk)} chars returned only {len(translated)} chars"
+            )
+        tuner.record(len(chunk), latency)
+        TRANSLATION_CHUNKS.inc(backend=backend, outcome="ok")
+        TRANSLATED_CHARS.inc(len(chunk), backend=backend)
+        return translated
+    except ChunkTruncatedError as e:
+        tuner.record(len(chunk), time.perf_counter() - start, truncated=True)
+        TRANSLATION_CHUNKS.inc(backend=backend, outcome="truncated")
+        error = e
+    except Exception as e:
+        latency = time.perf_counter() - start
+        tuner.record(len(chunk), latency, ok=False)
+        TRANSLATION_REQUEST_SECONDS.observe(latency, backend=backend)
+        TRANSLATION_CHUNKS.inc(backend=backend, outcome="failed")
+        error = e
+
+    attempts_left -= 1
+    if attempts_left <= 0:
+        raise error
+    logger.warning(f"Chunk translation failed ({str(error)}), retrying")
+    TRANSLATION_RETRIES.inc(backend=backend)
+
+    # Retry with the reduced target size
+    return "".join(
+        _translate_chunk(translate, sub_chunk, tuner, min_output_ratio, attempts_left)
+        for sub_chunk in tuner.split(chunk)
+    )
@@ -0,0 +1,362 @@
+"""
+Rule-based removal of ads, watermarks and other junk from chapter text.
+
+Rules are literal strings or regexes, usually loaded from a rules file:
+
+    # Lines starting with # are comments
+    Please visit example.com for the latest chapters
+    re:www\\.\\w+\\.com
+
+Every occurrence of a rule is removed and lines left empty are dropped. All
+rules are combined into one regex, so each line is scanned once no matter how
+many rules there are. clean_book() spreads a book's chapters over a process
+pool and rewrites only the chapters that changed, and ChapterCleaner applies a
+site's rules to chapters as they are downloaded.
+"""
+import os
+import re
+import logging
+import threading
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from compression import get_codec, strip_extension
+from packed_store import open_reader_writer
+from profiling import STAGE_CLEAN, timed
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+REGEX_PREFIX = "re:"
+
+# Per-site rules files, <site>.txt, applied while downloading. Found next to
+# this module, so downloads clean chapters whatever the working directory
+DEFAULT_RULES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cleaning_rules")
+
+# Number of changed lines kept as examples for reports
+MAX_SAMPLES = 20
+
+
+class CleaningRule(NamedTuple):
+    """A literal string or regex to remove from chapter text."""
+    pattern: str
+    is_regex: bool = False
+
+    @property
+    def name(self) -> str:
+        """The rule as written in a rules file."""
+        return f"{REGEX_PREFIX}{self.pattern}" if self.is_regex else self.pattern
+
+
+def parse_rules(lines: Iterable[str]) -> List[CleaningRule]:
+    """
+    Parse cleaning rules, one per line.
+
+    Blank lines and lines starting with # are skipped. Lines starting with re:
+    are regexes, all others literal strings.
+
+    Args:
+        lines: Rule lines
+
+    Returns:
+        List of rules
+
+    Raises:
+        ValueError: If a regex rule doesn't compile
+    """
+    rules = []
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        if line.startswith(REGEX_PREFIX):
+            pattern = line[len(REGEX_PREFIX):]
+            try:
+                re.compile(pattern)
+            except re.error as e:
+                raise ValueError(f"Invalid regex rule {line}: {str(e)}")
+            rules.append(CleaningRule(pattern, is_regex=True))
+        else:
+            rules.append(CleaningRule(line))
+    return rules
+
+
+def load_rules(path: str) -> List[CleaningRule]:
+    """
+    Load cleaning rules from a rules file.
+
+    Args:
+        path: Path of the rules file
+
+    Returns:
+        List of rules
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        return parse_rules(f)
+
+
+def load_site_rules(site: str, rules_dir: str = DEFAULT_RULES_DIR) -> List[CleaningRule]:
+    """
+    Load the cleaning rules of a site.
+
+    Args:
+        site: Site name, e.g. "novelfull"
+        rules_dir: Directory holding the <site>.txt rules files
+
+    Returns:
+        List of rules, empty if the site has no rules file
+    """
+    path = os.path.join(rules_dir, f"{site}.txt")
+    if not os.path.exists(path):
+        logger.warning(f"No cleaning rules for {site} at {path}, chapters won't be cleaned")
+        return []
+    return load_rules(path)
+
+
+class CleaningStats:
+    """Counts of what a cleaner removed, per rule."""
+
+    def __init__(self) -> None:
+        self.matches: Counter = Counter()
+        self.lines_removed: Counter = Counter()
+        self.lines_changed = 0
+        self.chapters_changed = 0
+        self.samples: List[Tuple[str, int, str, str]] = []
+
+    def merge(self, other: "CleaningStats") -> None:
+        """Add the counts of another CleaningStats to these."""
+        self.matches.update(other.matches)
+        self.lines_removed.update(other.lines_removed)
+        self.lines_changed += other.lines_changed
+        self.chapters_changed += other.chapters_changed
+        self.samples.extend(other.samples[:MAX_SAMPLES - len(self.samples)])
+
+    def report(self) -> List[str]:
+        """
+        Describe the counts and sample changes.
+
+        Returns:
+            Report lines, one per rule followed by the samples
+        """
+        lines = [
+            f"{self.chapters_changed} chapters changed, {self.lines_changed} lines changed, "
+            f"{sum(self.lines_removed.values())} lines removed"
+        ]
+        for rule, count in self.matches.most_common():
+            lines.append(f"  {count} matches, {self.lines_removed[rule]} lines removed: {rule}")
+        for source, line_num, before, after in self.samples:
+            lines.append(f"  {source} (line {line_num}): {before!r} -> {after!r}")
+        return lines
+
+
+class TextCleaner:
+    """Removes every occurrence of a set of rules in one pass per line."""
+
+    def __init__(self, rules: List[CleaningRule]) -> None:
+        """
+        Compile the rules into a single regex.
+
+        Each rule is wrapped in its own group, so the group that matched tells
+        which rule it was. Regex rules should not use numbered backreferences.
+
+        Args:
+            rules: Rules to apply
+        """
+        self.rules = rules
+        self._group_rules: Dict[int, str] = {}
+        alternatives = []
+        group = 1
+        for rule in rules:
+            pattern = rule.pattern if rule.is_regex else re.escape(rule.pattern)
+            self._group_rules[group] = rule.name
+            alternatives.append(f"({pattern})")
+            group += 1 + re.compile(pattern).groups
+        self._regex = re.compile("|".join(alternatives)) if alternatives else None
+
+    def clean(self, text: str, source: str = "") -> Tuple[str, CleaningStats]:
+        """
+        Remove all rule matches from text, dropping lines left empty.
+
+        Lines without matches are kept exactly as they are.
+
+        Args:
+            text: Chapter text
+            source: Name of the text for report samples
+
+        Returns:
+            Tuple of (cleaned text, stats)
+        """
+        stats = CleaningStats()
+        if self._regex is None or not self._regex.search(text):
+            return text, stats
+
+        matched_rules: List[str] = []
+
+        def remove(match: "re.Match") -> str:
+            rule = self._group_rules[match.lastindex]
+            stats.matches[rule] += 1
+            matched_rules.append(rule)
+            return ""
+
+        cleaned_lines = []
+        for line_num, line in enumerate(text.splitlines(keepends=True), start=1):
+            matched_rules.clear()
+            cleaned = self._regex.sub(remove, line)
+            if not matched_rules:
+                cleaned_lines.append(line)
+                continue
+
+            stats.lines_changed += 1
+            if len(stats.samples) < MAX_SAMPLES:
+                stats.samples.append((source, line_num, line.strip(), cleaned.strip()))
+            if cleaned.strip():
+                newline = "\n" if line.endswith("\n") else ""
+                # Only trailing whitespace, leading full-width indentation is formatting
+                cleaned_lines.append(cleaned.rstrip() + newline)
+            else:
+                for rule in set(matched_rules):
+                    stats.lines_removed[rule] += 1
+
+        cleaned_text = "".join(cleaned_lines)
+        if cleaned_text != text:
+            stats.chapters_changed = 1
+        return cleaned_text, stats
+
+
+class ChapterCleaner:
+    """
+    Cleans chapters as they are downloaded, keeping running counts per rule.
+
+    Safe to share between threads downloading chapters concurrently.
+    """
+
+    def __init__(self, rules: List[CleaningRule]) -> None:
+        self._cleaner = TextCleaner(rules)
+        self._lock = threading.Lock()
+        self.stats = CleaningStats()
+
+    @classmethod
+    def for_site(cls, site: str, rules_dir: str = DEFAULT_RULES_DIR) -> "ChapterCleaner":
+        """Create a cleaner with the rules file of a site."""
+        return cls(load_site_rules(site, rules_dir))
+
+    @property
+    def rules(self) -> List[CleaningRule]:
+        """The rules being applied."""
+        return self._cleaner.rules
+
+    @timed(STAGE_CLEAN)
+    def clean(self, chapter_title: str, content: str) -> str:
+        """
+        Clean a chapter and add what was removed to the running counts.
+
+        Args:
+            chapter_title: Title of the chapter, for report samples
+            content: Chapter text
+
+        Returns:
+            Cleaned chapter text
+        """
+        cleaned, stats = self._cleaner.clean(content, source=chapter_title)
+        if stats.lines_changed:
+            logger.debug(f"Cleaned {stats.lines_changed} lines from {chapter_title}")
+            with self._lock:
+                self.stats.merge(stats)
+        return cleaned
+
+
+# Per-process state for clean_book workers
+_worker_cleaner: Optional[TextCleaner] = None
+_worker_readers: Dict[str, object] = {}
+
+
+def _init_worker(rules: List[CleaningRule]) -> None:
+    global _worker_cleaner
+    _worker_cleaner = TextCleaner(rules)
+    _worker_readers.clear()
+
+
+def _clean_chapter(
+    book_title: str, filename: str, is_downloaded: bool
+) -> Tuple[str, Optional[str], CleaningStats]:
+    """Read and clean one chapter. Runs in a worker process."""
+    reader = _worker_readers.get(book_title)
+    if reader is None:
+        reader = open_reader_writer(book_title)
+        _worker_readers[book_title] = reader
+    chapter_title, content = reader.get_chapter_content(filename, is_downloaded)
+    cleaned, stats = _worker_cleaner.clean(content, source=chapter_title)
+    return filename, cleaned if stats.chapters_changed else None, stats
+
+
+def clean_book(
+    book_title: str,
+    rules: List[CleaningRule],
+    is_downloaded: bool = True,
+    dry_run: bool = False,
+    workers: Optional[int] = None,
+    batch_size: int = 200,
+) -> CleaningStats:
+    """
+    Clean every chapter of a book.
+
+    Chapters are read and cleaned on a process pool. Changed chapters are
+    rewritten atomically, in their original compression, in batches.
+
+    Args:
+        book_title: Title of the book
+        rules: Rules to apply
+        is_downloaded: Whether to clean downloaded (True) or translated (False) chapters
+        dry_run: Whether to only report what would change
+        workers: Number of processes, defaults to the CPU count
+        batch_size: Number of changed chapters written per batch
+
+    Returns:
+        Stats of what was (or would be) removed
+
+    Raises:
+        FileNotFoundError: If the book has no chapters
+    """
+    filenames = open_reader_writer(book_title).get_book_titles(is_downloaded=is_downloaded)
+    if not filenames:
+        raise FileNotFoundError(f"No chapters found for {book_title}")
+    logger.info(f"Cleaning {len(filenames)} chapters with {len(rules)} rules...")
+
+    # Writers per codec, so rewritten chapters keep their compression
+    writers = {}
+    pending: Dict[str, List[Tuple[str, str, str, bool]]] = {}
+    total = CleaningStats()
+
+    def flush(codec: str) -> None:
+        if codec not in writers:
+            writers[codec] = open_reader_writer(book_title, compression=codec)
+        writers[codec].write_chapters(pending.pop(codec))
+
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker, initargs=(rules,)
+    ) as executor:
+        results = executor.map(
+            _clean_chapter,
+            [book_title] * len(filenames),
+            filenames,
+            [is_downloaded] * len(filenames),
+            chunksize=max(1, min(64, len(filenames) // (workers * 4) or 1)),
+        )
+        for filename, cleaned, stats in results:
+            total.merge(stats)
+            if cleaned is None or dry_run:
+                continue
+            codec = get_codec(filename)
+            chapter_title = strip_extension(filename) or os.path.splitext(filename)[0]
+            pending.setdefault(codec, []).append((book_title, chapter_title, cleaned, is_downloaded))
+            if len(pending[codec]) >= batch_size:
+                flush(codec)
+
+    for codec in list(pending):
+        flush(codec)
+
+    action = "Would change" if dry_run else "Changed"
+    logger.info(f"{action} {total.chapters_changed} of {len(filenames)} chapters")
+    return total
@@ -0,0 +1,3 @@
+"""
+Per-site cleaning rules, <site>.txt, shipped as package data
+"""
@@ -0,0 +1,159 @@
+"""
+Compression codecs for stored chapter text.
+
+Chapters can be stored as plain .txt, gzip (.txt.gz) or zstd (.txt.zst). zstd
+can use a dictionary trained per book, which compresses short chapters much
+better than compressing each one on its own. The zstandard package is optional
+and only needed for the zstd codec.
+"""
+import gzip
+import logging
+from typing import Dict, List, Optional
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+CODEC_NONE = "none"
+CODEC_GZIP = "gzip"
+CODEC_ZSTD = "zstd"
+
+CODEC_EXTENSIONS = {
+    CODEC_NONE: ".txt",
+    CODEC_GZIP: ".txt.gz",
+    CODEC_ZSTD: ".txt.zst",
+}
+
+GZIP_LEVEL = 6
+# Fast enough for chapters written while downloading and translating
+ZSTD_LEVEL = 3
+# For recompressing a finished book, where the extra time buys smaller files
+ZSTD_RECOMPRESS_LEVEL = 19
+ZSTD_DICT_SIZE = 112640
+
+
+def get_codec(filename: str) -> str:
+    """
+    Get the codec a chapter file was stored with from its extension.
+
+    Args:
+        filename: Chapter filename
+
+    Returns:
+        Codec name
+    """
+    if filename.endswith(CODEC_EXTENSIONS[CODEC_GZIP]):
+        return CODEC_GZIP
+    if filename.endswith(CODEC_EXTENSIONS[CODEC_ZSTD]):
+        return CODEC_ZSTD
+    return CODEC_NONE
+
+
+def strip_extension(filename: str) -> Optional[str]:
+    """
+    Strip a chapter file extension.
+
+    Args:
+        filename: Chapter filename
+
+    Returns:
+        The filename without its chapter extension, or None if it has none
+    """
+    for extension in sorted(CODEC_EXTENSIONS.values(), key=len, reverse=True):
+        if filename.endswith(extension):
+            return filename[:-len(extension)]
+    return None
+
+
+def check_codec(codec: str) -> None:
+    """
+    Validate that a codec is known and usable.
+
+    Raises:
+        ValueError: If the codec is unknown
+        ImportError: If the codec needs a package that is not installed
+    """
+    if codec not in CODEC_EXTENSIONS:
+        raise ValueError(
+            f"Unknown compression {codec}, expected one of {', '.join(CODEC_EXTENSIONS)}"
+        )
+    if codec == CODEC_ZSTD and zstandard is None:
+        raise ImportError("zstd compression requires the zstandard package")
+
+
+def compress(data: bytes, codec: str, zstd_dict=None, zstd_level: int = ZSTD_LEVEL) -> bytes:
+    """
+    Compress chapter bytes.
+
+    Args:
+        data: Raw chapter bytes
+        codec: Codec name
+        zstd_dict: Optional zstandard.ZstdCompressionDict for the zstd codec
+        zstd_level: Compression level for the zstd codec
+
+    Returns:
+        Compressed bytes
+    """
+    check_codec(codec)
+    if codec == CODEC_GZIP:
+        # mtime=0 keeps the output identical for identical input
+        return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+    if codec == CODEC_ZSTD:
+        compressor = zstandard.ZstdCompressor(level=zstd_level, dict_data=zstd_dict)
+        return compressor.compress(data)
+    return data
+
+
+def decompress(data: bytes, codec: str, zstd_dicts: Optional[Dict[int, object]] = None) -> bytes:
+    """
+    Decompress chapter bytes.
+
+    Args:
+        data: Stored chapter bytes
+        codec: Codec name
+        zstd_dicts: zstd dictionaries by dictionary id, needed for chapters compressed with one
+
+    Returns:
+        Raw chapter bytes
+    """
+    check_codec(codec)
+    if codec == CODEC_GZIP:
+        return gzip.decompress(data)
+    if codec == CODEC_ZSTD:
+        dict_id = zstandard.get_frame_parameters(data).dict_id
+        zstd_dict = None
+        if dict_id:
+            zstd_dict = (zstd_dicts or {}).get(dict_id)
+            if zstd_dict is None:
+                raise ValueError(f"Missing zstd dictionary {dict_id}")
+        return zstandard.ZstdDecompressor(dict_data=zstd_dict).decompress(data)
+    return data
+
+
+def train_zstd_dictionary(samples: List[bytes], dict_size: int = ZSTD_DICT_SIZE):
+    """
+    Train a zstd dictionary from sample chapters.
+
+    Args:
+        samples: Raw chapter bytes to train on
+        dict_size: Target dictionary size in bytes
+
+    Returns:
+        zstandard.ZstdCompressionDict, or None if there are too few samples
+    """
+    check_codec(CODEC_ZSTD)
+    try:
+        return zstandard.train_dictionary(dict_size, samples)
+    except zstandard.ZstdError as e:
+        logger.warning(f"Unable to train zstd dictionary: {str(e)}")
+        return None
+
+
+def load_zstd_dictionary(data: bytes):
+    """Load a zstd dictionary from its serialized bytes."""
+    check_codec(CODEC_ZSTD)
+    return zstandard.ZstdCompressionDict(data)
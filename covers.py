@@ -0,0 +1,180 @@
+"""
+Cover image processing.
+
+Sites serve covers in whatever format and size they like. Covers are detected
+by their magic bytes, so EPUBs declare the right media type, and, when the
+optional Pillow package is installed, downscaled to a maximum resolution and
+re-encoded at a target quality. Optimized covers are cached next to the
+original cover by the storage backend, so exports don't repeat the work.
+"""
+import io
+import hashlib
+import logging
+from typing import Optional, Tuple
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+FORMAT_JPEG = "jpeg"
+FORMAT_PNG = "png"
+FORMAT_GIF = "gif"
+FORMAT_WEBP = "webp"
+
+MEDIA_TYPES = {
+    FORMAT_JPEG: "image/jpeg",
+    FORMAT_PNG: "image/png",
+    FORMAT_GIF: "image/gif",
+    FORMAT_WEBP: "image/webp",
+}
+
+EXTENSIONS = {
+    FORMAT_JPEG: ".jpg",
+    FORMAT_PNG: ".png",
+    FORMAT_GIF: ".gif",
+    FORMAT_WEBP: ".webp",
+}
+
+# Large enough for high resolution e-readers, small enough to keep EPUBs light
+DEFAULT_MAX_SIZE = (1600, 2400)
+DEFAULT_QUALITY = 85
+
+# Bump when optimize_cover output changes, so cached covers are rebuilt
+COVER_CACHE_VERSION = 1
+
+
+def detect_image_format(data: bytes) -> Optional[str]:
+    """
+    Detect an image format from its magic bytes.
+
+    Args:
+        data: Image bytes
+
+    Returns:
+        Format name, or None if the format is not recognized
+    """
+    if data.startswith(b"\xff\xd8\xff"):
+        return FORMAT_JPEG
+    if data.startswith(b"\x89PNG\r\n\x1a\n"):
+        return FORMAT_PNG
+    if data[:6] in (b"GIF87a", b"GIF89a"):
+        return FORMAT_GIF
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return FORMAT_WEBP
+    return None
+
+
+def get_media_type(data: bytes) -> str:
+    """Get the media type of an image, assuming JPEG if it is not recognized."""
+    return MEDIA_TYPES[detect_image_format(data) or FORMAT_JPEG]
+
+
+def get_extension(data: bytes) -> str:
+    """Get the file extension of an image, assuming JPEG if it is not recognized."""
+    return EXTENSIONS[detect_image_format(data) or FORMAT_JPEG]
+
+
+def parse_max_size(max_size: str) -> Tuple[int, int]:
+    """
+    Parse a maximum cover size such as "1600x2400".
+
+    Args:
+        max_size: Size string, WIDTHxHEIGHT
+
+    Returns:
+        Tuple of (width, height)
+
+    Raises:
+        ValueError: If the size is malformed
+    """
+    try:
+        width, height = (int(part) for part in max_size.lower().split("x"))
+    except ValueError:
+        raise ValueError(f"Invalid cover size: {max_size}, expected WIDTHxHEIGHT")
+    if width < 1 or height < 1:
+        raise ValueError(f"Invalid cover size: {max_size}, expected WIDTHxHEIGHT")
+    return width, height
+
+
+def get_cover_cache_name(
+    data: bytes,
+    max_size: Tuple[int, int] = DEFAULT_MAX_SIZE,
+    quality: int = DEFAULT_QUALITY,
+) -> str:
+    """
+    Name of the cached optimized version of a cover.
+
+    The name is derived from the original bytes and the settings, so a new
+    cover or new settings never pick up a stale cached file.
+
+    Args:
+        data: Original cover bytes
+        max_size: Maximum (width, height)
+        quality: Encoder quality (1-95)
+
+    Returns:
+        Dotfile name, kept out of chapter listings
+    """
+    digest = hashlib.sha256(data).hexdigest()[:16]
+    width, height = max_size
+    return f".cover_optimized.{digest}.{width}x{height}-q{quality}-v{COVER_CACHE_VERSION}"
+
+
+def optimize_cover(
+    data: bytes,
+    max_size: Tuple[int, int] = DEFAULT_MAX_SIZE,
+    quality: int = DEFAULT_QUALITY,
+) -> bytes:
+    """
+    Downscale and re-encode a cover image.
+
+    Covers with transparency are kept as PNG, everything else becomes JPEG. The
+    original is returned if Pillow is not installed, the image can't be decoded,
+    or re-encoding doesn't make a small enough cover any smaller.
+
+    Args:
+        data: Original cover bytes
+        max_size: Maximum (width, height), aspect ratio is preserved
+        quality: JPEG quality (1-95)
+
+    Returns:
+        Optimized cover bytes
+    """
+    # Imported here so commands that never touch covers don't load Pillow
+    try:
+        from PIL import Image
+    except ImportError:  # pragma: no cover - optional dependency
+        logger.debug("Pillow is not installed, using the cover as is")
+        return data
+
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            original_size = image.size
+            # Let the JPEG decoder downscale while decoding, which is much faster
+            image.draft("RGB", max_size)
+            image.seek(0)
+            image = image.copy()
+    except Exception as e:
+        logger.warning(f"Unable to decode cover image, using it as is: {str(e)}")
+        return data
+
+    resized = image.width > max_size[0] or image.height > max_size[1]
+    if resized:
+        image.thumbnail(max_size, Image.LANCZOS)
+
+    output = io.BytesIO()
+    has_alpha = image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info)
+    if has_alpha:
+        image.save(output, format="PNG", optimize=True)
+    else:
+        image.convert("RGB").save(
+            output, format="JPEG", quality=quality, optimize=True, progressive=True
+        )
+    optimized = output.getvalue()
+
+    if not resized and len(optimized) >= len(data):
+        return data
+    logger.info(
+        f"Optimized cover from {original_size[0]}x{original_size[1]} ({len(data)} bytes) "
+        f"to {image.width}x{image.height} ({len(optimized)} bytes)"
+    )
+    return optimized
@@ -0,0 +1,185 @@
+"""
+Long-running translation daemon.
+
+Keeps a warm translator session (browser, translate token and HTTP pool) alive
+and serves translation requests over localhost HTTP, so short CLI invocations
+don't pay for starting Chrome on every call.
+"""
+import json
+import os
+import logging
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+from base import BaseTranslator
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DAEMON_URL_ENV = "TRANSLATE_DAEMON_URL"
+# Returned by /health, so clients don't mistake another local service for the daemon
+SERVICE_NAME = "trawl-translate-daemon"
+
+
+class TranslationDaemon:
+    """
+    Localhost HTTP server exposing a warm translator.
+
+    Endpoints:
+        GET /health: {"status": "ok", "service": SERVICE_NAME}
+        POST /translate: {"text": "..."} -> {"text": "..."}
+    """
+
+    def __init__(
+        self,
+        translator: BaseTranslator,
+        host: str = DEFAULT_HOST,
+        port: int = DEFAULT_PORT,
+    ) -> None:
+        """
+        Initialize the daemon.
+
+        Args:
+            translator: Translator kept warm for the lifetime of the daemon
+            host: Interface to bind, localhost by default
+            port: Port to listen on
+        """
+        self.translator = translator
+        self.server = ThreadingHTTPServer((host, port), self._make_handler())
+        self.server.daemon_threads = True
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def serve_forever(self) -> None:
+        """Serve requests until interrupted."""
+        logger.info(f"Translation daemon listening on {self.url}")
+        try:
+            self.server.serve_forever()
+        except KeyboardInterrupt:
+            logger.info("Shutting down translation daemon")
+        finally:
+            self.server.server_close()
+
+    def shutdown(self) -> None:
+        """Stop a daemon running in another thread."""
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _make_handler(self):
+        translator = self.translator
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != "/health":
+                    self._send_json(404, {"error": "not found"})
+                    return
+                self._send_json(200, {"status": "ok", "service": SERVICE_NAME})
+
+            def do_POST(self):
+                if self.path != "/translate":
+                    self._send_json(404, {"error": "not found"})
+                    return
+                try:
+                    length = int(self.headers.get("Content-Length", 0))
+                    payload = json.loads(self.rfile.read(length))
+                    text = payload["text"]
+                except (ValueError, KeyError) as e:
+                    self._send_json(400, {"error": f"invalid request: {str(e)}"})
+                    return
+
+                try:
+                    self._send_json(200, {"text": translator.translate_text(text)})
+                except Exception as e:
+                    logger.error(f"Translation failed: {str(e)}")
+                    self._send_json(500, {"error": str(e)})
+
+            def _send_json(self, status: int, body: dict) -> None:
+                data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                logger.debug(format % args)
+
+        return Handler
+
+
+class DaemonTranslator(BaseTranslator):
+    """
+    Translator that forwards requests to a running TranslationDaemon.
+    """
+
+    def __init__(self, url: str, timeout: float = 300) -> None:
+        """
+        Initialize the daemon client.
+
+        Args:
+            url: Base URL of the daemon
+            timeout: Per-request timeout in seconds
+        """
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+        # Imported here so commands that never talk to the daemon don't load requests
+        import requests
+
+        self.session = requests.Session()
+
+    def translate_text(self, text: str) -> str:
+        """
+        Translate text through the daemon.
+
+        Args:
+            text: Chinese text to translate
+
+        Returns:
+            Translated English text
+        """
+        response = self.session.post(
+            f"{self.url}/translate", json={"text": text}, timeout=self.timeout
+        )
+        if response.status_code != 200:
+            # Errors from a proxy or a crashed handler may not be JSON
+            try:
+                error = response.json().get("error")
+            except ValueError:
+                error = response.text[:200]
+            raise RuntimeError(f"Translation daemon error ({response.status_code}): {error}")
+        return response.json()["text"]
+
+
+def get_daemon_url() -> str:
+    """Return the daemon URL, honouring the TRANSLATE_DAEMON_URL override."""
+    return os.environ.get(DAEMON_URL_ENV, f"http://{DEFAULT_HOST}:{DEFAULT_PORT}")
+
+
+def connect_to_daemon(url: Optional[str] = None, timeout: float = 0.5) -> Optional[DaemonTranslator]:
+    """
+    Return a client for the daemon if one is running.
+
+    Args:
+        url: Daemon URL, defaults to get_daemon_url()
+        timeout: Health check timeout in seconds
+
+    Returns:
+        DaemonTranslator, or None if no daemon answered
+    """
+    import requests
+
+    url = url or get_daemon_url()
+    try:
+        response = requests.get(f"{url}/health", timeout=timeout)
+        if response.status_code == 200 and response.json().get("service") == SERVICE_NAME:
+            logger.info(f"Using translation daemon at {url}")
+            return DaemonTranslator(url)
+    except (requests.RequestException, ValueError, AttributeError):
+        pass
+    logger.debug(f"No translation daemon at {url}")
+    return None
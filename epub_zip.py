@@ -0,0 +1,237 @@
+"""
+Minimal zip writer and reader working on raw, already compressed entries.
+
+zipfile always compresses the data it is given. Exporters that reuse entries
+from a previous archive, or compress entries on other processes, need to write
+the deflated bytes as they are, so this module writes the zip structures
+itself. Archives are plain zips without zip64, which is plenty for EPUBs.
+"""
+import os
+import struct
+import time
+import zipfile
+import zlib
+from typing import Dict, NamedTuple, Optional, Tuple, Union
+
+from profiling import STAGE_COMPRESS, timed
+
+_LOCAL_HEADER = struct.Struct("<4s5H3L2H")
+_CENTRAL_HEADER = struct.Struct("<4s6H3L5H2L")
+_END_OF_CENTRAL_DIR = struct.Struct("<4s4H2LH")
+_UTF8_FLAG = 0x800
+_MAX_ENTRIES = 0xFFFF
+_MAX_SIZE = 0xFFFFFFFF
+
+DateTime = Tuple[int, int, int, int, int, int]
+
+
+class ZipEntry(NamedTuple):
+    """Metadata of a compressed zip entry."""
+    name: str
+    method: int
+    crc: int
+    compress_size: int
+    file_size: int
+
+
+@timed(STAGE_COMPRESS)
+def compress_entry(
+    name: str,
+    data: Union[bytes, str],
+    compresslevel: int = 6,
+    method: int = zipfile.ZIP_DEFLATED,
+) -> Tuple[ZipEntry, bytes]:
+    """
+    Compress data into a raw zip entry.
+
+    Module-level so it can be run in worker processes.
+
+    Args:
+        name: Entry name in the archive
+        data: Entry content, str is encoded as UTF-8
+        compresslevel: Deflate level (0-9)
+        method: zipfile.ZIP_DEFLATED or zipfile.ZIP_STORED
+
+    Returns:
+        Tuple of (entry metadata, raw entry bytes)
+    """
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    if method == zipfile.ZIP_STORED:
+        raw = data
+    elif method == zipfile.ZIP_DEFLATED:
+        compressor = zlib.compressobj(compresslevel, zlib.DEFLATED, -15)
+        raw = compressor.compress(data) + compressor.flush()
+    else:
+        raise ValueError(f"Unsupported compression method {method}")
+    entry = ZipEntry(name, method, zlib.crc32(data), len(raw), len(data))
+    return entry, raw
+
+
+def _dos_date_time(date_time: DateTime) -> Tuple[int, int]:
+    year, month, day, hour, minute, second = date_time
+    dos_date = (max(year, 1980) - 1980) << 9 | month << 5 | day
+    dos_time = hour << 11 | minute << 5 | second // 2
+    return dos_date, dos_time
+
+
+class RawZipWriter:
+    """
+    Writes a zip archive from raw compressed entries.
+
+    Use as a context manager, or call close() to write the central directory.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        date_time: Optional[DateTime] = None,
+        compresslevel: int = 6,
+    ) -> None:
+        """
+        Open a new archive for writing.
+
+        Args:
+            path: Output file path
+            date_time: Timestamp stored for every entry, defaults to the current local time
+            compresslevel: Default deflate level (0-9) for writestr()
+        """
+        self.path = path
+        self.compresslevel = compresslevel
+        self.date_time = date_time or time.localtime()[:6]
+        self._fp = open(path, "wb")
+        self._central_dir = []
+
+    def writestr(
+        self,
+        name: str,
+        data: Union[bytes, str],
+        compresslevel: Optional[int] = None,
+        compress_type: int = zipfile.ZIP_DEFLATED,
+    ) -> ZipEntry:
+        """
+        Compress and write an entry.
+
+        Args:
+            name: Entry name in the archive
+            data: Entry content, str is encoded as UTF-8
+            compresslevel: Deflate level (0-9), defaults to the writer's level
+            compress_type: zipfile.ZIP_DEFLATED or zipfile.ZIP_STORED
+
+        Returns:
+            The written entry's metadata
+        """
+        if compresslevel is None:
+            compresslevel = self.compresslevel
+        entry, raw = compress_entry(name, data, compresslevel, compress_type)
+        self.write_raw(entry, raw)
+        return entry
+
+    def write_raw(self, entry: ZipEntry, raw: bytes) -> None:
+        """
+        Write an entry whose data is already compressed.
+
+        Args:
+            entry: Entry metadata
+            raw: Compressed entry bytes, exactly entry.compress_size long
+        """
+        if len(raw) != entry.compress_size:
+            raise ValueError(f"Size mismatch for zip entry {entry.name}")
+        if len(self._central_dir) >= _MAX_ENTRIES:
+            raise ValueError("Too many entries for a zip archive without zip64")
+
+        offset = self._fp.tell()
+        if offset > _MAX_SIZE or entry.compress_size > _MAX_SIZE or entry.file_size > _MAX_SIZE:
+            raise ValueError("Archive too large for a zip archive without zip64")
+
+        name = entry.name.encode("utf-8")
+        flags = 0 if entry.name.isascii() else _UTF8_FLAG
+        dos_date, dos_time = _dos_date_time(self.date_time)
+        self._fp.write(
+            _LOCAL_HEADER.pack(
+                b"PK\x03\x04", 20, flags, entry.method, dos_time, dos_date,
+                entry.crc, entry.compress_size, entry.file_size, len(name), 0,
+            )
+        )
+        self._fp.write(name)
+        self._fp.write(raw)
+        self._central_dir.append((entry, name, flags, dos_date, dos_time, offset))
+
+    def close(self) -> None:
+        """Write the central directory and close the archive."""
+        if self._fp.closed:
+            return
+        start = self._fp.tell()
+        for entry, name, flags, dos_date, dos_time, offset in self._central_dir:
+            self._fp.write(
+                _CENTRAL_HEADER.pack(
+                    b"PK\x01\x02", 20, 20, flags, entry.method, dos_time, dos_date,
+                    entry.crc, entry.compress_size, entry.file_size, len(name),
+                    0, 0, 0, 0, 0, offset,
+                )
+            )
+            self._fp.write(name)
+        end = self._fp.tell()
+        count = len(self._central_dir)
+        self._fp.write(
+            _END_OF_CENTRAL_DIR.pack(b"PK\x05\x06", 0, 0, count, count, end - start, start, 0)
+        )
+        self._fp.close()
+
+    def __enter__(self) -> "RawZipWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+
+class RawZipReader:
+    """Reads entries of an existing zip archive without decompressing them."""
+
+    def __init__(self, path: str) -> None:
+        """
+        Open an archive for reading.
+
+        Args:
+            path: Archive file path
+        """
+        with zipfile.ZipFile(path) as archive:
+            self.entries: Dict[str, Tuple[ZipEntry, int]] = {
+                info.filename: (
+                    ZipEntry(info.filename, info.compress_type, info.CRC, info.compress_size, info.file_size),
+                    info.header_offset,
+                )
+                for info in archive.infolist()
+            }
+        self._fp = open(path, "rb")
+
+    def get_entry(self, name: str) -> Optional[ZipEntry]:
+        """Get an entry's metadata, or None if the archive doesn't contain it."""
+        entry = self.entries.get(name)
+        return entry[0] if entry else None
+
+    def read_raw(self, name: str) -> Tuple[ZipEntry, bytes]:
+        """
+        Read an entry's compressed bytes.
+
+        Args:
+            name: Entry name in the archive
+
+        Returns:
+            Tuple of (entry metadata, raw entry bytes)
+        """
+        entry, offset = self.entries[name]
+        self._fp.seek(offset)
+        header = _LOCAL_HEADER.unpack(self._fp.read(_LOCAL_HEADER.size))
+        name_length, extra_length = header[-2:]
+        self._fp.seek(name_length + extra_length, os.SEEK_CUR)
+        return entry, self._fp.read(entry.compress_size)
+
+    def close(self) -> None:
+        self._fp.close()
+
+    def __enter__(self) -> "RawZipReader":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
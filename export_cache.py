@@ -0,0 +1,117 @@
+"""
+Content hashes for reproducible EPUB exports.
+
+A reproducible export takes its modification date from the newest input
+instead of the clock, so identical inputs produce a byte-identical EPUB. The
+export hash covers the chapter manifest (names, sizes and modification times),
+the cover, the book info and the export options, and is stored next to the
+EPUB, so an export whose inputs haven't changed can be skipped.
+"""
+import os
+import json
+import hashlib
+import logging
+import datetime
+from typing import Dict, List, Optional, Tuple
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Bump when exporter output changes, so existing exports are rebuilt once
+EXPORT_FORMAT_VERSION = 1
+
+
+def get_source_date(manifest: List[Tuple[str, int, int]]) -> datetime.datetime:
+    """
+    Get the modification date of the newest input.
+
+    Args:
+        manifest: (name, size, mtime_ns) of every input
+
+    Returns:
+        UTC datetime, truncated to seconds
+    """
+    mtime_ns = max((mtime for _, _, mtime in manifest), default=0)
+    modified = datetime.datetime.fromtimestamp(mtime_ns // 1_000_000_000, tz=datetime.timezone.utc)
+    # Zip timestamps can't go before 1980
+    return max(modified, datetime.datetime(1980, 1, 1, tzinfo=datetime.timezone.utc))
+
+
+def compute_export_hash(
+    manifest: List[Tuple[str, int, int]],
+    cover_page: Optional[bytes],
+    book_info: Dict,
+    options: Dict,
+) -> str:
+    """
+    Hash everything an export depends on.
+
+    Args:
+        manifest: (name, size, mtime_ns) of every input
+        cover_page: The cover image as bytes
+        book_info: Dictionary containing metadata about the book
+        options: Export options that affect the output
+
+    Returns:
+        Hex digest
+    """
+    digest = hashlib.sha256()
+    digest.update(
+        json.dumps(
+            {
+                "version": EXPORT_FORMAT_VERSION,
+                "manifest": manifest,
+                "book_info": book_info,
+                "options": options,
+            },
+            sort_keys=True,
+            ensure_ascii=False,
+        ).encode("utf-8")
+    )
+    digest.update(cover_page or b"")
+    return digest.hexdigest()
+
+
+def get_hash_path(output_file: str) -> str:
+    """Return the sidecar file holding the hash of an export."""
+    return f"{output_file}.sha256"
+
+
+def is_export_current(output_file: str, export_hash: str) -> bool:
+    """
+    Check whether an export exists and was built from the same inputs.
+
+    Args:
+        output_file: Path of the EPUB
+        export_hash: Hash of the inputs about to be exported
+
+    Returns:
+        bool: True if the existing EPUB is up to date
+    """
+    hash_path = get_hash_path(output_file)
+    if not os.path.exists(output_file) or not os.path.exists(hash_path):
+        return False
+    with open(hash_path, "r", encoding="utf-8") as f:
+        return f.read().strip() == export_hash
+
+
+def save_export_hash(output_file: str, export_hash: str) -> None:
+    """
+    Record the hash of the inputs an export was built from.
+
+    Args:
+        output_file: Path of the EPUB
+        export_hash: Hash of its inputs
+    """
+    hash_path = get_hash_path(output_file)
+    tmp_path = f"{hash_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(f"{export_hash}\n")
+    os.replace(tmp_path, hash_path)
+
+
+def clear_export_hash(output_file: str) -> None:
+    """Forget the hash of an export about to be overwritten by a non-reproducible build."""
+    hash_path = get_hash_path(output_file)
+    if os.path.exists(hash_path):
+        os.remove(hash_path)
@@ -0,0 +1,428 @@
+import os
+import json
+import html
+import hashlib
+import logging
+import datetime
+import zipfile
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+from covers import get_extension, get_media_type
+from epub_zip import RawZipReader, RawZipWriter
+from exporters_v2 import EpubExporterV2
+from metrics import CACHE_HITS
+from profiling import STAGE_RENDER, timed
+from volumes import TOC_GROUP_NONE, Volume
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+class ManifestEntry(NamedTuple):
+    """Lightweight record of a chapter already written to the archive."""
+    item_id: str
+    file_name: str
+    title: str
+
+
+class EpubStreamExporter(EpubExporterV2):
+    """
+    EPUB exporter that streams chapters straight into the zip container.
+
+    Produces the same EPUB 3 layout as EpubExporterV2, but chapters are rendered
+    and compressed one at a time and only their titles and file names are kept,
+    so peak memory does not depend on the length of the book.
+
+    With incremental=True a sidecar cache of chapter source hashes is kept next
+    to the EPUB, and chapters that haven't changed since the previous export are
+    copied from it still compressed instead of being rendered again.
+    """
+
+    CACHE_VERSION = 1
+
+    CONTAINER_XML = """<?xml version="1.0" encoding="utf-8"?>
+<container xmlns="urn:oasis:names:tc:opendocument:xmlns:container" version="1.0">
+  <rootfiles>
+    <rootfile media-type="application/oebps-package+xml" full-path="EPUB/content.opf"/>
+  </rootfiles>
+</container>
+"""
+    CHAPTER_TEMPLATE = """<?xml version='1.0' encoding='utf-8'?>
+<!DOCTYPE html>
+<html xmlns="http://www.w3.org/1999/xhtml" xmlns:epub="http://www.idpf.org/2007/ops" lang="en" xml:lang="en">
+  <head>
+    <title>{title}</title>
+    <link href="style/default.css" rel="stylesheet" type="text/css"/>
+  </head>
+  <body>{body}</body>
+</html>
+"""
+
+    def __init__(
+        self,
+        book_id: str,
+        compresslevel: int = 6,
+        incremental: bool = False,
+        volume: Optional[Volume] = None,
+        toc_group: str = TOC_GROUP_NONE,
+        modified: Optional[datetime.datetime] = None,
+    ) -> None:
+        """
+        Initialize the streaming EPUB exporter.
+
+        Args:
+            book_id: The unique identifier for the book
+            compresslevel: Deflate level (0-9) used for archive entries
+            incremental: Whether to reuse unchanged chapters from the previous export
+            volume: Volume to export, if the book is split into several EPUBs
+            toc_group: How to group the table of contents: none, hundreds or volume
+            modified: Fixed modification date for reproducible output, defaults to now
+        """
+        super().__init__(
+            book_id,
+            compresslevel=compresslevel,
+            workers=1,
+            volume=volume,
+            toc_group=toc_group,
+            modified=modified,
+        )
+        self.incremental = incremental
+        self.cache_file = f"{self.output_file}.cache.json"
+
+    def export_epub(
+        self,
+        cover_page: Optional[bytes],
+        book_info: Dict,
+        book_content: Iterable[Tuple[str, str]],
+    ) -> bool:
+        """
+        Export book content to EPUB format, streaming chapters into the archive.
+
+        Args:
+            cover_page: The cover image as bytes
+            book_info: Dictionary containing metadata about the book
+            book_content: (chapter_title, chapter_content) pairs in reading order,
+                e.g. TextReaderWriter.iter_chapters()
+
+        Returns:
+            bool: True if export was successful, False otherwise
+        """
+        output_file = self.output_file
+        tmp_file = f"{output_file}.tmp"
+        previous = None
+        try:
+            logger.debug("Starting streaming EPUB export process...")
+            previous, cached_hashes = self._open_previous_export()
+            hashes: Dict[str, str] = {}
+
+            with RawZipWriter(tmp_file, date_time=self._get_modified().timetuple()[:6]) as archive:
+                # The mimetype must be the first entry and stored uncompressed
+                archive.writestr("mimetype", "application/epub+zip", compress_type=zipfile.ZIP_STORED)
+                self._write_entry(archive, "META-INF/container.xml", self.CONTAINER_XML)
+
+                if cover_page:
+                    logger.debug(f"Adding cover image ({len(cover_page)} bytes)")
+                    # Images are already compressed, store them as they are
+                    archive.writestr(
+                        f"EPUB/images/cover{get_extension(cover_page)}",
+                        cover_page,
+                        compress_type=zipfile.ZIP_STORED,
+                    )
+                self._write_entry(archive, "EPUB/style/default.css", self.STYLE)
+
+                chapters = self._write_chapters(
+                    archive, book_info, book_content, previous, cached_hashes, hashes
+                )
+
+                self._write_entry(archive, "EPUB/style/nav.css", self.STYLE)
+                self._write_entry(archive, "EPUB/toc.ncx", self._build_ncx(chapters))
+                self._write_entry(archive, "EPUB/nav.xhtml", self._build_nav(chapters))
+                self._write_entry(
+                    archive,
+                    "EPUB/content.opf",
+                    self._build_opf(chapters, book_info, cover_page),
+                )
+
+            if previous is not None:
+                previous.close()
+            os.replace(tmp_file, output_file)
+            if self.incremental:
+                self._save_cache(hashes)
+            logger.info(f"Successfully exported EPUB with {len(chapters)} sections to {output_file}")
+
+            file_size = os.path.getsize(output_file)
+            logger.info(f"EPUB file details:")
+            logger.info(f"  - Path: {os.path.abspath(output_file)}")
+            logger.info(f"  - Size: {file_size} bytes ({file_size / 1024 / 1024:.2f} MB)")
+            return True
+
+        except Exception as e:
+            logger.error(f"Fatal error in export_epub: {str(e)}")
+            logger.debug("Traceback:", exc_info=True)
+            if previous is not None:
+                previous.close()
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+            return False
+
+    def _write_entry(self, archive: RawZipWriter, name: str, data) -> None:
+        archive.writestr(name, data, compresslevel=self.compresslevel)
+
+    def _write_chapters(
+        self,
+        archive: RawZipWriter,
+        book_info: Dict,
+        book_content: Iterable[Tuple[str, str]],
+        previous: Optional[RawZipReader] = None,
+        cached_hashes: Optional[Dict[str, str]] = None,
+        hashes: Optional[Dict[str, str]] = None,
+    ) -> List[ManifestEntry]:
+        """Render and write the introduction and chapters, keeping only their metadata."""
+        chapters = []
+        cached_hashes = cached_hashes or {}
+        hashes = {} if hashes is None else hashes
+        reused = 0
+
+        def write_document(file_name: str, title: str, content: str) -> None:
+            nonlocal reused
+            name = f"EPUB/{file_name}"
+            source_hash = self._hash_source(title, content)
+            hashes[file_name] = source_hash
+            if (
+                previous is not None
+                and cached_hashes.get(file_name) == source_hash
+                and previous.get_entry(name) is not None
+            ):
+                archive.write_raw(*previous.read_raw(name))
+                reused += 1
+                CACHE_HITS.inc(cache="export_chapter")
+                return
+            self._write_entry(archive, name, self._render_document(title, content))
+
+        introduction = book_info.get("description", "")
+        if introduction and introduction.strip():
+            logger.debug("Adding introduction chapter")
+            write_document("intro.xhtml", "Introduction", introduction)
+            chapters.append(ManifestEntry("chapter_0", "intro.xhtml", "Introduction"))
+
+        for i, (chapter_title, chapter_content) in enumerate(book_content):
+            if not chapter_content.strip():
+                logger.warning(f"Empty content for chapter {chapter_title}, skipping")
+                continue
+
+            logger.debug(f"Adding chapter: {chapter_title}")
+            file_name = f"chapter_{i+1:04d}.xhtml"
+            write_document(file_name, chapter_title, chapter_content)
+            chapters.append(ManifestEntry(f"chapter_{i+1}", file_name, chapter_title))
+
+        if self.incremental:
+            logger.info(f"Reused {reused} unchanged sections, rendered {len(chapters) - reused}")
+        return chapters
+
+    def _hash_source(self, title: str, content: str) -> str:
+        """Hash everything a rendered chapter entry depends on."""
+        digest = hashlib.sha256()
+        for part in (self.CHAPTER_TEMPLATE, str(self.compresslevel), title, content):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def _open_previous_export(self) -> Tuple[Optional[RawZipReader], Dict[str, str]]:
+        """Open the previous export and its hash cache, if incremental and both are usable."""
+        if not self.incremental:
+            return None, {}
+        if not os.path.exists(self.output_file) or not os.path.exists(self.cache_file):
+            logger.info("No previous export to reuse, rendering every chapter")
+            return None, {}
+        try:
+            with open(self.cache_file, "r", encoding="utf-8") as f:
+                cache = json.load(f)
+            if cache.get("version") != self.CACHE_VERSION:
+                logger.info("Export cache is from another version, rendering every chapter")
+                return None, {}
+            previous = RawZipReader(self.output_file)
+        except (OSError, ValueError, zipfile.BadZipFile) as e:
+            logger.warning(f"Unable to reuse previous export: {str(e)}")
+            return None, {}
+
+        # Only trust hashes for entries still matching what the cache saw
+        hashes = {}
+        for file_name, (source_hash, crc) in cache.get("entries", {}).items():
+            entry = previous.get_entry(f"EPUB/{file_name}")
+            if entry is not None and entry.crc == crc:
+                hashes[file_name] = source_hash
+        return previous, hashes
+
+    def _save_cache(self, hashes: Dict[str, str]) -> None:
+        """Save the source hash of every section, alongside its entry CRC, next to the EPUB."""
+        with RawZipReader(self.output_file) as archive:
+            entries = {
+                file_name: (source_hash, archive.get_entry(f"EPUB/{file_name}").crc)
+                for file_name, source_hash in hashes.items()
+            }
+        tmp_file = f"{self.cache_file}.tmp"
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            json.dump({"version": self.CACHE_VERSION, "entries": entries}, f)
+        os.replace(tmp_file, self.cache_file)
+
+    @timed(STAGE_RENDER)
+    def _render_document(self, title: str, content: str) -> str:
+        """Render a full XHTML document for a chapter, escaping its text."""
+        paragraphs = [p.strip() for p in content.strip().split("\n\n")]
+        body = [f"<h1>{html.escape(title, quote=False)}</h1>\n"]
+        body.extend(
+            f"<p>{html.escape(paragraph, quote=False)}</p>\n"
+            for paragraph in paragraphs
+            if paragraph
+        )
+        return self.CHAPTER_TEMPLATE.format(
+            title=html.escape(title, quote=False), body="".join(body)
+        )
+
+    def _get_modified_date(self) -> str:
+        return self._get_modified().strftime("%Y-%m-%dT%H:%M:%SZ")
+
+    def _build_opf(
+        self, chapters: List[ManifestEntry], book_info: Dict, cover_page: Optional[bytes]
+    ) -> str:
+        """Build the package document from chapter metadata."""
+        metadata = [
+            f'    <meta property="dcterms:modified">{self._get_modified_date()}</meta>',
+            f'    <dc:identifier id="id">{html.escape(self.identifier)}</dc:identifier>',
+            f"    <dc:title>{html.escape(self.book_title)}</dc:title>",
+            "    <dc:language>en</dc:language>",
+            f'    <dc:creator id="creator">{html.escape(book_info.get("Author", "Unknown"))}</dc:creator>',
+        ]
+        if "description" in book_info:
+            metadata.append(
+                f"    <dc:description>{html.escape(book_info['description'], quote=False)}</dc:description>"
+            )
+        if self.volume is not None and self.volume.total > 1:
+            metadata.extend(
+                [
+                    f'    <meta property="belongs-to-collection" id="series">{html.escape(self.series_title)}</meta>',
+                    '    <meta refines="#series" property="collection-type">series</meta>',
+                    f'    <meta refines="#series" property="group-position">{self.volume.number}</meta>',
+                ]
+            )
+        if cover_page:
+            metadata.append('    <meta name="cover" content="cover-image"/>')
+
+        manifest = []
+        if cover_page:
+            manifest.append(
+                f'    <item href="images/cover{get_extension(cover_page)}" id="cover-image" '
+                f'media-type="{get_media_type(cover_page)}"/>'
+            )
+        manifest.append('    <item href="style/default.css" id="style_default" media-type="text/css"/>')
+        manifest.extend(
+            f'    <item href="{chapter.file_name}" id="{chapter.item_id}" media-type="application/xhtml+xml"/>'
+            for chapter in chapters
+        )
+        manifest.append('    <item href="style/nav.css" id="style_nav" media-type="text/css"/>')
+        manifest.append('    <item href="toc.ncx" id="ncx" media-type="application/x-dtbncx+xml"/>')
+        manifest.append('    <item href="nav.xhtml" id="nav" media-type="application/xhtml+xml" properties="nav"/>')
+
+        spine = ['    <itemref idref="nav"/>']
+        spine.extend(f'    <itemref idref="{chapter.item_id}"/>' for chapter in chapters)
+
+        return "\n".join(
+            [
+                "<?xml version='1.0' encoding='utf-8'?>",
+                '<package xmlns="http://www.idpf.org/2007/opf" unique-identifier="id" version="3.0" '
+                'prefix="rendition: http://www.idpf.org/vocab/rendition/#">',
+                '  <metadata xmlns:dc="http://purl.org/dc/elements/1.1/" xmlns:opf="http://www.idpf.org/2007/opf">',
+                *metadata,
+                "  </metadata>",
+                "  <manifest>",
+                *manifest,
+                "  </manifest>",
+                '  <spine toc="ncx">',
+                *spine,
+                "  </spine>",
+                "</package>",
+                "",
+            ]
+        )
+
+    def _build_toc(
+        self, chapters: List[ManifestEntry]
+    ) -> List[Tuple[Optional[str], List[ManifestEntry]]]:
+        """Group chapters into TOC sections, keeping the introduction at the top level."""
+        intro = [chapter for chapter in chapters if chapter.item_id == "chapter_0"]
+        book_chapters = [chapter for chapter in chapters if chapter.item_id != "chapter_0"]
+        return [(None, intro)] + self._group_toc(book_chapters, lambda chapter: chapter.title)
+
+    def _build_nav(self, chapters: List[ManifestEntry]) -> str:
+        """Build the EPUB 3 navigation document from chapter metadata."""
+        title = html.escape(self.book_title)
+
+        def nav_items(entries: List[ManifestEntry], indent: str) -> str:
+            return "".join(
+                f'{indent}<li>\n{indent}  <a href="{chapter.file_name}">{html.escape(chapter.title, quote=False)}</a>\n{indent}</li>\n'
+                for chapter in entries
+            )
+
+        items = []
+        for section_title, entries in self._build_toc(chapters):
+            if section_title is None:
+                items.append(nav_items(entries, "        "))
+                continue
+            items.append(
+                "        <li>\n"
+                f'          <a href="{entries[0].file_name}">{html.escape(section_title, quote=False)}</a>\n'
+                f"          <ol>\n{nav_items(entries, '            ')}          </ol>\n"
+                "        </li>\n"
+            )
+        return (
+            "<?xml version='1.0' encoding='utf-8'?>\n"
+            "<!DOCTYPE html>\n"
+            '<html xmlns="http://www.w3.org/1999/xhtml" xmlns:epub="http://www.idpf.org/2007/ops" lang="en" xml:lang="en">\n'
+            f"  <head>\n    <title>{title}</title>\n  </head>\n"
+            "  <body>\n"
+            '    <nav epub:type="toc" id="id" role="doc-toc">\n'
+            f"      <h2>{title}</h2>\n"
+            f"      <ol>\n{''.join(items)}      </ol>\n"
+            "    </nav>\n"
+            "  </body>\n"
+            "</html>\n"
+        )
+
+    def _build_ncx(self, chapters: List[ManifestEntry]) -> str:
+        """Build the EPUB 2 NCX table of contents from chapter metadata."""
+
+        def nav_points(entries: List[ManifestEntry], indent: str) -> str:
+            return "".join(
+                f'{indent}<navPoint id="{chapter.item_id}">\n'
+                f"{indent}  <navLabel>\n{indent}    <text>{html.escape(chapter.title, quote=False)}</text>\n{indent}  </navLabel>\n"
+                f'{indent}  <content src="{chapter.file_name}"/>\n'
+                f"{indent}</navPoint>\n"
+                for chapter in entries
+            )
+
+        points = []
+        depth = 1
+        for i, (section_title, entries) in enumerate(self._build_toc(chapters)):
+            if section_title is None:
+                points.append(nav_points(entries, "    "))
+                continue
+            depth = 2
+            points.append(
+                f'    <navPoint id="section_{i}">\n'
+                f"      <navLabel>\n        <text>{html.escape(section_title, quote=False)}</text>\n      </navLabel>\n"
+                f'      <content src="{entries[0].file_name}"/>\n'
+                f"{nav_points(entries, '      ')}"
+                "    </navPoint>\n"
+            )
+        return (
+            "<?xml version='1.0' encoding='utf-8'?>\n"
+            '<ncx xmlns="http://www.daisy.org/z3986/2005/ncx/" version="2005-1">\n'
+            "  <head>\n"
+            f'    <meta content="{html.escape(self.identifier)}" name="dtb:uid"/>\n'
+            f'    <meta content="{depth}" name="dtb:depth"/>\n'
+            '    <meta content="0" name="dtb:totalPageCount"/>\n'
+            '    <meta content="0" name="dtb:maxPageNumber"/>\n'
+            "  </head>\n"
+            f"  <docTitle>\n    <text>{html.escape(self.book_title, quote=False)}</text>\n  </docTitle>\n"
+            f"  <navMap>\n{''.join(points)}  </navMap>\n"
+            "</ncx>\n"
+        )
@@ -1,14 +1,130 @@
 import re
+import html
 import logging
 import datetime
 import os
-from typing import Dict, List, Tuple
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple, TypeVar
 from base import BaseExporter
+from covers import get_extension, get_media_type
 from ebooklib import epub
+from epub_zip import RawZipWriter, ZipEntry, compress_entry
+import profiling
+from profiling import STAGE_RENDER, span
+from volumes import TOC_GROUP_HUNDREDS, TOC_GROUP_NONE, TOC_GROUPS, Volume
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
+# Volume markers in chapter titles, e.g. "Volume 3", "Book 2" or "第三卷"
+VOLUME_MARKER = re.compile(r'\b(?:Volume|Vol\.|Book)\s*(\d+)|第\s*([0-9一二三四五六七八九十百千]+)\s*卷', re.IGNORECASE)
+
+T = TypeVar("T")
+
+
+def _render_and_compress(
+    name: str,
+    title: str,
+    file_name: str,
+    lang: str,
+    links: List[Dict],
+    content: str,
+    compresslevel: int,
+) -> Tuple[ZipEntry, bytes]:
+    """Serialize a chapter document and deflate it. Runs in a worker process."""
+    chapter = epub.EpubHtml(title=title, file_name=file_name, lang=lang)
+    chapter.book = epub.EpubBook()
+    chapter.links = links
+    chapter.set_content(content)
+    with span(STAGE_RENDER):
+        data = chapter.get_content()
+    return compress_entry(name, data, compresslevel)
+
+
+def _render_and_compress_in_worker(
+    profile: bool, *args
+) -> Tuple[ZipEntry, bytes, Dict[str, List[float]]]:
+    """Run _render_and_compress in a pool process, returning its spans for the parent."""
+    # Forked workers start with a copy of the parent's spans
+    profiling.reset()
+    if profile:
+        profiling.enable()
+    entry, raw = _render_and_compress(*args)
+    return entry, raw, profiling.snapshot()
+
+
+class _ParallelEpubWriter(epub.EpubWriter):
+    """
+    EpubWriter that renders and deflates chapter documents on a process pool.
+
+    Other items are written by the main process. Images are already compressed
+    so they are stored as they are.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        book: epub.EpubBook,
+        options: Dict,
+        compresslevel: int,
+        executor: Optional[ProcessPoolExecutor],
+    ) -> None:
+        super().__init__(name, book, options)
+        self.compresslevel = compresslevel
+        self.executor = executor
+
+    def write(self):
+        # A fixed mtime also fixes the zip entry timestamps, for reproducible output
+        date_time = self.options['mtime'].timetuple()[:6] if 'mtime' in self.options else None
+        with RawZipWriter(self.file_name, date_time=date_time, compresslevel=self.compresslevel) as self.out:
+            self.out.writestr('mimetype', 'application/epub+zip', compress_type=zipfile.ZIP_STORED)
+
+            self._write_container()
+            self._write_opf()
+            self._write_items()
+
+    def _write_items(self):
+        items = list(self.book.get_items())
+        chapters = [item for item in items if self._is_chapter(item)]
+        jobs = (
+            [f'{self.book.FOLDER_NAME}/{item.file_name}' for item in chapters],
+            [item.title for item in chapters],
+            [item.file_name for item in chapters],
+            [item.lang or self.book.language for item in chapters],
+            [item.links for item in chapters],
+            [item.content for item in chapters],
+            [self.compresslevel] * len(chapters),
+        )
+        if self.executor is not None:
+            profile = [profiling.is_enabled()] * len(chapters)
+            rendered = self.executor.map(
+                _render_and_compress_in_worker, profile, *jobs, chunksize=16
+            )
+        else:
+            rendered = (entry + ({},) for entry in map(_render_and_compress, *jobs))
+
+        for item in items:
+            name = f'{self.book.FOLDER_NAME}/{item.file_name}'
+            if self._is_chapter(item):
+                entry, raw, durations = next(rendered)
+                profiling.merge(durations)
+                self.out.write_raw(entry, raw)
+            elif isinstance(item, epub.EpubNcx):
+                self.out.writestr(name, self._get_ncx())
+            elif isinstance(item, epub.EpubNav):
+                self.out.writestr(name, self._get_nav(item))
+            elif item.media_type.startswith('image/'):
+                self.out.writestr(name, item.get_content(), compress_type=zipfile.ZIP_STORED)
+            elif item.manifest:
+                self.out.writestr(name, item.get_content())
+            else:
+                self.out.writestr(item.file_name, item.get_content())
+
+    def _is_chapter(self, item) -> bool:
+        return isinstance(item, epub.EpubHtml) and not isinstance(item, epub.EpubNav)
+
+
 class EpubExporterV2(BaseExporter):
     """
     An improved V2 implementation of the EPUB exporter using ebooklib.
@@ -30,16 +146,70 @@ class EpubExporterV2(BaseExporter):
 </body>
 </html>
 """
+    STYLE = """
+            body {
+                font-family: "Helvetica", "Arial", sans-serif;
+                margin: 5%;
+                padding: 0;
+                line-height: 1.5;
+            }
+            h1 {
+                text-align: center;
+                font-size: 1.5em;
+                margin: 1em 0;
+            }
+            p {
+                margin: 0.5em 0;
+                text-indent: 1.5em;
+            }
+            """
     
-    def __init__(self, book_id: str) -> None:
+    def __init__(
+        self,
+        book_id: str,
+        compresslevel: int = 6,
+        workers: Optional[int] = None,
+        volume: Optional[Volume] = None,
+        toc_group: str = TOC_GROUP_NONE,
+        modified: Optional[datetime.datetime] = None,
+    ) -> None:
         """
         Initialize the EPUB exporter with a book ID.
         
         Args:
             book_id: The unique identifier for the book
+            compresslevel: Deflate level (0-9) used for archive entries
+            workers: Number of processes rendering and compressing chapters, defaults to the CPU count
+            volume: Volume to export, if the book is split into several EPUBs
+            toc_group: How to group the table of contents: none, hundreds or volume
+            modified: Fixed modification date for reproducible output, defaults to now
+            
+        Raises:
+            ValueError: If toc_group is unknown
         """
+        if toc_group not in TOC_GROUPS:
+            raise ValueError(f"Unknown TOC grouping {toc_group}, expected one of {', '.join(TOC_GROUPS)}")
         self.book_id = book_id
-        self.book_title = self._format_title()
+        self.toc_group = toc_group
+        self.modified = modified
+        self.compresslevel = compresslevel
+        self.workers = workers or os.cpu_count() or 1
+        self.volume = volume
+        self.series_title = self._format_title()
+        self.book_title = self.series_title
+        self.identifier = f"akahitsuji-{book_id}"
+        self.output_file = f"{book_id}.epub"
+
+        if volume is not None and (volume.requested or volume.total == 1):
+            # Named after the chapters, so the files of different ranges don't collide
+            first, last = volume.chapter_range.start, volume.chapter_range.stop - 1
+            self.book_title = f"{self.series_title} ({volume.label})"
+            self.identifier = f"{self.identifier}-chapters-{first}-{last}"
+            self.output_file = f"{book_id}-chapters-{first}-{last}.epub"
+        elif volume is not None:
+            self.book_title = f"{self.series_title} Vol. {volume.number} ({volume.label})"
+            self.identifier = f"{self.identifier}-vol-{volume.number}"
+            self.output_file = f"{book_id}-vol-{volume.number:02d}.epub"
         logger.debug(f"Initialized EpubExporterV2 with book_id: {book_id}")
 
     def _create_html_content(self, title: str, content: str) -> str:
@@ -47,15 +217,15 @@ class EpubExporterV2(BaseExporter):
         # Process the text by splitting into paragraphs
         paragraphs = content.strip().split('\n\n')
         
-        # Build HTML content
-        html_content = f'<h1>{title}</h1>\n'
+        # Build HTML content, escaping the text so stray <, > and & survive parsing
+        parts = [f'<h1>{html.escape(title, quote=False)}</h1>\n']
         
         # Add paragraphs
         for paragraph in paragraphs:
             if paragraph.strip():
-                html_content += f"<p>{paragraph.strip()}</p>\n"
+                parts.append(f"<p>{html.escape(paragraph.strip(), quote=False)}</p>\n")
                 
-        return html_content
+        return ''.join(parts)
 
     def _extract_chapter_number(self, chapter_title: str) -> int:
         """
@@ -72,6 +242,55 @@ class EpubExporterV2(BaseExporter):
             return int(match.group(1))
         return 0
 
+    def _get_modified(self) -> datetime.datetime:
+        """Get the modification date to stamp the EPUB with."""
+        return self.modified or datetime.datetime.now()
+
+    def _group_toc(
+        self, entries: List[T], get_title: Callable[[T], str]
+    ) -> List[Tuple[Optional[str], List[T]]]:
+        """
+        Group table of contents entries into sections according to toc_group.
+        
+        Args:
+            entries: Chapter entries in reading order
+            get_title: Function returning an entry's chapter title
+            
+        Returns:
+            List of (section_title, entries); a None section title means the
+            entries go at the top level
+        """
+        if self.toc_group == TOC_GROUP_NONE or not entries:
+            return [(None, entries)]
+
+        groups: List[Tuple[Optional[str], List[T]]] = []
+        current_key = None
+        for entry in entries:
+            title = get_title(entry)
+            if self.toc_group == TOC_GROUP_HUNDREDS:
+                number = self._extract_chapter_number(title)
+                key = (number - 1) // 100 if number else current_key
+            else:
+                match = VOLUME_MARKER.search(title)
+                key = (match.group(1) or match.group(2)) if match else current_key
+
+            if key != current_key or not groups:
+                groups.append((key, []))
+                current_key = key
+            groups[-1][1].append(entry)
+
+        sections = []
+        for key, section_entries in groups:
+            if key is None:
+                sections.append((None, section_entries))
+            elif self.toc_group == TOC_GROUP_HUNDREDS:
+                first = self._extract_chapter_number(get_title(section_entries[0])) or key * 100 + 1
+                last = self._extract_chapter_number(get_title(section_entries[-1])) or first
+                sections.append((f"Chapters {first}-{last}", section_entries))
+            else:
+                sections.append((f"Volume {key}", section_entries))
+        return sections
+
     def _sort_chapters(self, book_content: Dict[str, str]) -> List[Tuple[str, str]]:
         """
         Sort chapters by their numerical order rather than lexicographical order.
@@ -113,10 +332,16 @@ class EpubExporterV2(BaseExporter):
             book = epub.EpubBook()
             
             # Set required metadata
-            book.set_identifier(f"akahitsuji-{self.book_id}")
+            book.set_identifier(self.identifier)
             book.set_title(self.book_title)
             book.set_language('en')
             
+            # Mark volumes as part of the series so readers group and order them
+            if self.volume is not None and self.volume.total > 1:
+                book.add_metadata(None, 'meta', self.series_title, {'property': 'belongs-to-collection', 'id': 'series'})
+                book.add_metadata(None, 'meta', 'series', {'refines': '#series', 'property': 'collection-type'})
+                book.add_metadata(None, 'meta', str(self.volume.number), {'refines': '#series', 'property': 'group-position'})
+            
             # Add author
             book.add_author(book_info.get("Author", "Unknown"))
             
@@ -124,17 +349,18 @@ class EpubExporterV2(BaseExporter):
             if "description" in book_info:
                 book.add_metadata('DC', 'description', book_info["description"])
             
-            # Add the current date for the modified date metadata (required for EPUB 3.0)
-            current_date = datetime.datetime.now().strftime("%Y-%m-%dT%H:%M:%SZ")
+            # Add the modified date metadata (required for EPUB 3.0)
+            current_date = self._get_modified().strftime("%Y-%m-%dT%H:%M:%SZ")
             book.add_metadata(None, 'meta', '', {'property': 'dcterms:modified', 'content': current_date})
             
             # Add cover image if provided
             if cover_page:
                 logger.debug(f"Adding cover image ({len(cover_page)} bytes)")
+                # Declare the cover's real format, sites don't always serve JPEG
                 cover_image = epub.EpubItem(
                     uid="cover-image",
-                    file_name="images/cover.jpg",
-                    media_type="image/jpeg",
+                    file_name=f"images/cover{get_extension(cover_page)}",
+                    media_type=get_media_type(cover_page),
                     content=cover_page
                 )
                 book.add_item(cover_image)
@@ -143,23 +369,7 @@ class EpubExporterV2(BaseExporter):
                 book.add_metadata(None, 'meta', '', {'name': 'cover', 'content': 'cover-image'})
             
             # Add CSS style
-            style = """
-            body {
-                font-family: "Helvetica", "Arial", sans-serif;
-                margin: 5%;
-                padding: 0;
-                line-height: 1.5;
-            }
-            h1 {
-                text-align: center;
-                font-size: 1.5em;
-                margin: 1em 0;
-            }
-            p {
-                margin: 0.5em 0;
-                text-indent: 1.5em;
-            }
-            """
+            style = self.STYLE
             
             css = epub.EpubItem(
                 uid="style_default",
@@ -238,14 +448,22 @@ class EpubExporterV2(BaseExporter):
             book.add_item(epub.EpubNcx())
             book.add_item(epub.EpubNav())
             
-            # Define Table of Contents
-            book.toc = chapters
+            # Define Table of Contents, nesting chapters in sections if grouped
+            toc = [intro_chapter] if intro_chapter else []
+            book_chapters = chapters[1:] if intro_chapter else chapters
+            for section_title, section_chapters in self._group_toc(book_chapters, lambda c: c.title):
+                if section_title is None:
+                    toc.extend(section_chapters)
+                else:
+                    section = epub.Section(section_title, href=section_chapters[0].file_name)
+                    toc.append((section, section_chapters))
+            book.toc = toc
             
             # Define book spine
             book.spine = ['nav'] + chapters
             
             # Write EPUB file
-            output_file = f"{self.book_id}.epub"
+            output_file = self.output_file
             logger.debug(f"Writing EPUB to {output_file}")
             
             # Ensure output directory exists
@@ -253,17 +471,20 @@ class EpubExporterV2(BaseExporter):
             if output_dir and not os.path.exists(output_dir):
                 os.makedirs(output_dir)
             
-            # Write the EPUB file with specific options
-            epub.write_epub(
-                output_file, 
-                book, 
-                {
-                    'epub3_landmark': True,
-                    'epub3_pages': False,
-                    'ignore_ncx': False,
-                    'compresslevel': 9
-                }
-            )
+            # Write the EPUB file with specific options, rendering and
+            # compressing chapters on a process pool
+            options = {
+                'epub3_landmark': True,
+                'epub3_pages': False,
+                'ignore_ncx': False,
+                'mtime': self._get_modified(),
+            }
+            logger.debug(f"Rendering chapters with {self.workers} workers at compresslevel {self.compresslevel}")
+            if self.workers > 1:
+                with ProcessPoolExecutor(max_workers=self.workers) as executor:
+                    self._write_epub(output_file, book, options, executor)
+            else:
+                self._write_epub(output_file, book, options, None)
             
             logger.info(f"Successfully exported EPUB to {output_file}")
             
@@ -292,6 +513,18 @@ class EpubExporterV2(BaseExporter):
                 logger.debug("Traceback:", exc_info=True)
                 return False
 
+    def _write_epub(
+        self,
+        output_file: str,
+        book: epub.EpubBook,
+        options: Dict,
+        executor: Optional[ProcessPoolExecutor],
+    ) -> None:
+        """Write the book the way epub.write_epub does, but with the parallel writer."""
+        writer = _ParallelEpubWriter(output_file, book, options, self.compresslevel, executor)
+        writer.process()
+        writer.write()
+
     def _format_title(self) -> str:
         """
         Format the book ID as a proper title by replacing hyphens with spaces 
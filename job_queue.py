@@ -0,0 +1,271 @@
+"""
+Persistent priority queue of chapter translation jobs.
+
+Jobs are stored in a small SQLite database so that several translate commands
+(and long-running workers) share one queue, and pending work survives restarts.
+Workers always claim the highest-priority pending job first.
+"""
+import os
+import sqlite3
+import time
+import logging
+from contextlib import closing
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+class TranslationJob(NamedTuple):
+    id: int
+    book_id: str
+    chapter_num: str
+    priority: int
+
+
+class TranslationJobQueue:
+    """
+    SQLite backed queue of chapter translation jobs ordered by priority.
+
+    Within the same priority, jobs are ordered by chapter number, ascending by
+    default or descending when enqueued newest-first.
+    """
+    DEFAULT_DB_PATH = "translation_jobs.sqlite"
+    PRIORITY_NORMAL = 0
+    PRIORITY_URGENT = 100
+
+    STATUS_PENDING = "pending"
+    STATUS_RUNNING = "running"
+    STATUS_DONE = "done"
+    STATUS_FAILED = "failed"
+
+    def __init__(self, db_path: str = DEFAULT_DB_PATH) -> None:
+        """
+        Initialize the queue, creating the database if needed.
+
+        Args:
+            db_path: Path to the SQLite database file
+        """
+        self.db_path = db_path
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+
+        with closing(self._connect()) as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    book_id TEXT NOT NULL,
+                    chapter_num TEXT NOT NULL,
+                    priority INTEGER NOT NULL,
+                    sort_key INTEGER NOT NULL,
+                    status TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    error TEXT,
+                    updated_at REAL NOT NULL,
+                    UNIQUE (book_id, chapter_num)
+                )
+                """
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS jobs_by_priority "
+                "ON jobs (status, priority DESC, sort_key, id)"
+            )
+
+    def enqueue(
+        self,
+        book_id: str,
+        chapter_nums: Iterable[int],
+        priority: int = PRIORITY_NORMAL,
+        newest_first: bool = False,
+    ) -> int:
+        """
+        Add chapters to the queue.
+
+        Chapters that are already pending keep the higher of their current and
+        new priority. Finished or failed chapters are queued again.
+
+        Args:
+            book_id: Book the chapters belong to
+            chapter_nums: Chapter numbers to translate
+            priority: Job priority, higher values are claimed first
+            newest_first: Whether higher chapter numbers should be claimed first within the priority
+
+        Returns:
+            Number of chapters enqueued or re-prioritised
+        """
+        now = time.time()
+        rows = [
+            (
+                book_id,
+                str(chapter_num),
+                priority,
+                -int(chapter_num) if newest_first else int(chapter_num),
+                self.STATUS_PENDING,
+                now,
+            )
+            for chapter_num in chapter_nums
+        ]
+
+        with closing(self._connect()) as conn:
+            before = conn.total_changes
+            conn.executemany(
+                """
+                INSERT INTO jobs (book_id, chapter_num, priority, sort_key, status, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (book_id, chapter_num) DO UPDATE SET
+                    priority = CASE
+                        WHEN jobs.status = 'pending' THEN MAX(jobs.priority, excluded.priority)
+                        ELSE excluded.priority
+                    END,
+                    sort_key = excluded.sort_key,
+                    status = 'pending',
+                    error = NULL,
+                    updated_at = excluded.updated_at
+                WHERE jobs.status != 'running'
+                """,
+                rows,
+            )
+            changed = conn.total_changes - before
+
+        logger.info(f"Enqueued {changed} chapters of {book_id} with priority {priority}")
+        return changed
+
+    def claim(
+        self, book_id: Optional[str] = None, chapter_ranges: Optional[Sequence[range]] = None
+    ) -> Optional[TranslationJob]:
+        """
+        Claim the highest-priority pending job.
+
+        Args:
+            book_id: Only claim jobs for this book if provided
+            chapter_ranges: Only claim chapters in one of these ranges if provided
+
+        Returns:
+            The claimed job, or None if the queue is empty
+        """
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            query = (
+                "SELECT id, book_id, chapter_num, priority FROM jobs WHERE status = ?"
+            )
+            params: Tuple = (self.STATUS_PENDING,)
+            if book_id is not None:
+                query += " AND book_id = ?"
+                params += (book_id,)
+            if chapter_ranges is not None:
+                query += " AND (" + " OR ".join(
+                    "CAST(chapter_num AS INTEGER) >= ? AND CAST(chapter_num AS INTEGER) < ?"
+                    for _ in chapter_ranges
+                ) + ")"
+                for chapter_range in chapter_ranges:
+                    params += (chapter_range.start, chapter_range.stop)
+            query += " ORDER BY priority DESC, sort_key, id LIMIT 1"
+
+            row = conn.execute(query, params).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+
+            conn.execute(
+                "UPDATE jobs SET status = ?, attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                (self.STATUS_RUNNING, time.time(), row[0]),
+            )
+            conn.execute("COMMIT")
+            return TranslationJob(*row)
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def complete(self, job: TranslationJob) -> None:
+        """Mark a running job as done."""
+        self._set_status(job, self.STATUS_DONE)
+
+    def fail(self, job: TranslationJob, error: str) -> None:
+        """Mark a running job as failed, recording the error."""
+        self._set_status(job, self.STATUS_FAILED, error)
+
+    def release(self, job: TranslationJob) -> None:
+        """Return a claimed job that won't be finished, e.g. on interruption, to the pending state."""
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, updated_at = ? WHERE id = ? AND status = ?",
+                (self.STATUS_PENDING, time.time(), job.id, self.STATUS_RUNNING),
+            )
+
+    def requeue_stale(self, max_age: float = 3600) -> int:
+        """
+        Return jobs left running by crashed workers to the pending state.
+
+        Args:
+            max_age: Seconds after which a running job is considered abandoned
+
+        Returns:
+            Number of jobs requeued
+        """
+        with closing(self._connect()) as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = ?, updated_at = ? WHERE status = ? AND updated_at < ?",
+                (self.STATUS_PENDING, time.time(), self.STATUS_RUNNING, time.time() - max_age),
+            )
+            if cursor.rowcount:
+                logger.info(f"Requeued {cursor.rowcount} stale jobs")
+            return cursor.rowcount
+
+    def counts(self, book_id: Optional[str] = None) -> Dict[str, int]:
+        """
+        Count jobs by status.
+
+        Args:
+            book_id: Only count jobs for this book if provided
+
+        Returns:
+            Dictionary mapping status to number of jobs
+        """
+        query = "SELECT status, COUNT(*) FROM jobs"
+        params: Tuple = ()
+        if book_id is not None:
+            query += " WHERE book_id = ?"
+            params = (book_id,)
+        query += " GROUP BY status"
+
+        with closing(self._connect()) as conn:
+            return dict(conn.execute(query, params).fetchall())
+
+    def failed_jobs(self, book_id: Optional[str] = None) -> List[Tuple[str, str, str]]:
+        """Return (book_id, chapter_num, error) for failed jobs."""
+        query = "SELECT book_id, chapter_num, error FROM jobs WHERE status = ?"
+        params: Tuple = (self.STATUS_FAILED,)
+        if book_id is not None:
+            query += " AND book_id = ?"
+            params += (book_id,)
+
+        with closing(self._connect()) as conn:
+            return conn.execute(query, params).fetchall()
+
+    def _set_status(
+        self, job: TranslationJob, status: str, error: Optional[str] = None
+    ) -> None:
+        # Only while still running, so a job released or requeued in the
+        # meantime, and maybe claimed by another worker, isn't overwritten
+        with closing(self._connect()) as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE id = ? AND status = ?",
+                (status, error, time.time(), job.id, self.STATUS_RUNNING),
+            )
+            if not cursor.rowcount:
+                logger.warning(
+                    f"{job.book_id} chapter {job.chapter_num} was no longer running, "
+                    f"not marking it {status}"
+                )
+
+    def _connect(self) -> sqlite3.Connection:
+        # A fresh connection per call keeps the queue safe to use from worker threads
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
@@ -1,19 +1,44 @@
+import re
+import signal
 import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 import logging
-from typing import Optional
+from typing import Callable, Dict, List, Optional
 import typer
-from base import TextReaderWriter
-from exporters import EpubExporter
-from exporters_v2 import EpubExporterV2
-from translators import ChatGPTTranslator, NovelHiTranslator
-from trawlers import NovelFullTrawler, UukanshuNovelTrawler
+from base import BaseTranslator, TextReaderWriter
+from covers import DEFAULT_QUALITY, parse_max_size
+from volumes import TOC_GROUP_NONE, TOC_GROUPS, export_volume, export_volumes, plan_volumes
+from translators import ChatGPTTranslator, FakeTranslator, NovelHiTranslator, SingleFlightTranslator
+from chapter_writer import BufferedChapterWriter
+from cleaning import ChapterCleaner, clean_book as clean_book_chapters, load_rules
+from chunk_tuner import ChunkSizeTuner, translate_with_tuner
+from job_queue import TranslationJob, TranslationJobQueue
+from compression import CODEC_NONE, CODEC_ZSTD, check_codec
+from pdf_to_epub import DEFAULT_HEADING_PATTERN, import_pdf as import_pdf_chapters
+from packed_store import STORAGE_FILES, STORAGE_SQLITE, migrate_book, open_reader_writer
+from metrics import CHAPTERS_TRANSLATED, MetricsFileWriter, MetricsServer
+import profiling
+from profiling import PROFILER_CPROFILE, PROFILERS, start_profiler, stop_profiler
+from daemon import DEFAULT_HOST, DEFAULT_PORT, TranslationDaemon, connect_to_daemon
+from benchmarks.fixture_server import SITES, FixtureConfig
+from benchmarks.results import build_report, write_report
+from benchmarks.translate_bench import run_translate_benchmark
+from benchmarks.export_bench import EXPORT_PATHS, SIZE_DISTRIBUTIONS, SIZE_FIXED, run_export_benchmark
+from benchmarks.startup_bench import run_startup_benchmark
 from utils import (
     split_content, 
+    split_content_by_size,
     combine_content, 
     load_translated_titles, 
     get_translated_title,
-    validate_chapter_range
+    validate_chapter_range,
+    parse_chapter_range,
 )
+# The trawlers (requests, BeautifulSoup) and the v1 exporter (ebooklib) are
+# imported by the commands using them, so the other commands start quickly.
+# benchmark-startup checks that none of these load with the CLI.
 
 # OPENAI_KEY = hidden_file.OPENAI_KEY
 # OPENAI_USERNAME = hidden_file.OPENAI_USERNAME
@@ -26,6 +51,9 @@ BOOK_TITLE = "nshba"
 
 logger = logging.getLogger(__name__)
 
+# Codec for newly written chapters, set by the --compression global option
+COMPRESSION = CODEC_NONE
+
 # Create Typer app
 app = typer.Typer()
 
@@ -36,31 +64,148 @@ def setup_logging(debug=False):
         level=log_level,
         format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 
+def _open_book(book_id: str) -> TextReaderWriter:
+    """Open a book's storage, compressing new chapters with the global codec"""
+    return open_reader_writer(book_id, compression=COMPRESSION)
+
+
 @app.command()
-def export_epub(book_id: str, use_v1: bool = False):
+def export_epub(
+    book_id: str,
+    use_v1: bool = False,
+    stream: bool = typer.Option(
+        False, "--stream", help="Stream chapters into the EPUB one at a time, using constant memory"
+    ),
+    incremental: bool = typer.Option(
+        False, "--incremental", help="Reuse chapters unchanged since the last export (implies --stream)"
+    ),
+    compression_level: int = typer.Option(
+        6, "--compression-level", min=0, max=9, help="Deflate level for the EPUB archive"
+    ),
+    workers: Optional[int] = typer.Option(
+        None, "--workers", help="Processes rendering chapters (default: CPU count)"
+    ),
+    volume_size: Optional[int] = typer.Option(
+        None, "--volume-size", min=1, help="Split the book into EPUBs of this many chapters"
+    ),
+    chapters: Optional[str] = typer.Option(
+        None,
+        "--chapters",
+        help="Only export these chapters, e.g. 1-500; several ranges (1-500,501-1000) make one EPUB each",
+    ),
+    toc_group: str = typer.Option(
+        TOC_GROUP_NONE,
+        "--toc-group",
+        help="Nest the table of contents by hundreds of chapters or by volume markers in titles: "
+        + ", ".join(TOC_GROUPS),
+    ),
+    reproducible: bool = typer.Option(
+        False,
+        "--reproducible",
+        help="Build byte-identical EPUBs from identical inputs and skip the export when nothing changed",
+    ),
+    cover_max_size: str = typer.Option(
+        "1600x2400", "--cover-max-size", help="Downscale the cover to fit WIDTHxHEIGHT"
+    ),
+    cover_quality: int = typer.Option(
+        DEFAULT_QUALITY, "--cover-quality", min=1, max=95, help="JPEG quality of the re-encoded cover"
+    ),
+):
     """Export a book to EPUB format"""
     # Regex for chapter numbering
     order_key = "Chapter (\d+)"
 
-    text_reader = TextReaderWriter(book_id)
-    
-    # Select the appropriate exporter based on the use_v1 flag
-    epub_exporter = EpubExporter(book_id) if use_v1 else EpubExporterV2(book_id)
-    
-    # Get content
-    chapter_paths = text_reader.get_book_titles(order_key=order_key)
-    logger.info("Retrieved chapter titles")
+    if toc_group not in TOC_GROUPS:
+        raise typer.BadParameter(f"--toc-group must be one of {', '.join(TOC_GROUPS)}")
+    try:
+        max_size = parse_max_size(cover_max_size)
+    except ValueError as e:
+        raise typer.BadParameter(str(e))
 
-    content_chapters = {}
-    for path in chapter_paths:
-        title, content = text_reader.get_chapter_content(path)
-        content_chapters[title] = content
-    logger.info(f"Retrieved content for {len(chapter_paths)} chapters")
+    text_reader = _open_book(book_id)
+
+    if use_v1 and (stream or incremental or reproducible or volume_size or chapters):
+        raise typer.BadParameter(
+            "--stream, --incremental, --reproducible, --volume-size and --chapters "
+            "are not supported with --use-v1"
+        )
+
+    if volume_size or chapters:
+        try:
+            chapter_ranges = (
+                [parse_chapter_range(part.strip()) for part in chapters.split(",")]
+                if chapters
+                else None
+            )
+        except ValueError as e:
+            raise typer.BadParameter(str(e))
+
+        # Plan volumes from the chapter filenames alone, without reading any chapter
+        chapter_numbers = [
+            num
+            for num in (
+                text_reader.get_chapter_number(title, order_key)
+                for title in text_reader.get_book_titles(order_key)
+            )
+            if num is not None
+        ]
+        volumes = plan_volumes(chapter_numbers, volume_size, chapter_ranges)
+        if not volumes:
+            logger.error("No chapters found in the requested range")
+            raise typer.Exit(code=1)
+
+        logger.info(f"Exporting {len(volumes)} volume(s)...")
+        exported = export_volumes(
+            book_id,
+            volumes,
+            order_key,
+            stream=stream,
+            compresslevel=compression_level,
+            workers=workers,
+            incremental=incremental,
+            toc_group=toc_group,
+            reproducible=reproducible,
+            cover_max_size=max_size,
+            cover_quality=cover_quality,
+        )
+        if exported < len(volumes):
+            logger.error(f"{len(volumes) - exported} of {len(volumes)} volumes failed to export")
+            raise typer.Exit(code=1)
+        return
+
+    if not use_v1:
+        exported = export_volume(
+            book_id,
+            None,
+            order_key,
+            stream=stream,
+            compresslevel=compression_level,
+            workers=workers,
+            incremental=incremental,
+            toc_group=toc_group,
+            reproducible=reproducible,
+            cover_max_size=max_size,
+            cover_quality=cover_quality,
+        )
+        if not exported:
+            logger.error("EPUB export failed")
+            raise typer.Exit(code=1)
+        return
+
+    from exporters import EpubExporter
+
+    epub_exporter = EpubExporter(book_id)
 
     # Get cover image and book info
     cover_image, book_info = text_reader.get_info_and_cover()
     logger.info("Retrieved cover image and book info")
 
+    # Get content
+    content_chapters = {}
+    for title, content in text_reader.iter_chapters(order_key=order_key):
+        content_chapters[title] = content
+    logger.info(f"Retrieved content for {len(content_chapters)} chapters")
+
     logger.info("Creating EPUB...")
     # Create epub
     epub_exporter.export_epub(
@@ -69,10 +214,58 @@ def export_epub(book_id: str, use_v1: bool = False):
         book_content=content_chapters,
     )
 
+def _load_cleaner(clean_rules: Optional[str]) -> Optional[ChapterCleaner]:
+    """Build a chapter cleaner from a rules file, None to use the site's rules"""
+    if clean_rules is None:
+        return None
+    try:
+        return ChapterCleaner(load_rules(clean_rules))
+    except (OSError, ValueError) as e:
+        raise typer.BadParameter(str(e))
+
+
+def _log_cleaning_stats(cleaner: ChapterCleaner) -> None:
+    """Log what the download cleaning rules removed"""
+    if cleaner.rules:
+        for line in cleaner.stats.report():
+            logger.info(line)
+
+
+@app.command()
+def import_pdf(
+    pdf_path: str,
+    book_id: str,
+    heading: str = typer.Option(
+        DEFAULT_HEADING_PATTERN, "--heading", help="Regex matching a chapter heading line"
+    ),
+    workers: Optional[int] = typer.Option(None, "--workers", help="Processes, defaults to the CPU count"),
+    text_file: Optional[str] = typer.Option(
+        None, "--text-file", help="Also write the full extracted text to this file"
+    ),
+):
+    """Import a novel from a PDF, one chapter per heading"""
+    try:
+        re.compile(heading)
+    except re.error as e:
+        raise typer.BadParameter(f"Invalid --heading regex: {str(e)}")
+    if workers is not None and workers < 1:
+        raise typer.BadParameter("--workers must be at least 1")
+
+    import_pdf_chapters(
+        pdf_path,
+        book_id,
+        _open_book(book_id),
+        heading_pattern=heading,
+        workers=workers,
+        text_file=text_file,
+    )
+
 
 @app.command()
 def get_chapter(book_id: str, chapter_num: str):
     """Get a single chapter from a book"""
+    from trawlers import UukanshuNovelTrawler
+
     uukanshu_trawler = UukanshuNovelTrawler()
     title, content = uukanshu_trawler.get_chapter(
         book_id=book_id, chapter_num=chapter_num
@@ -85,11 +278,16 @@ def get_chapter(book_id: str, chapter_num: str):
 def get_and_save_book(
     book_id: str, 
     starting_chapter_num: Optional[str] = None, 
-    ending_chapter_num: Optional[str] = None
+    ending_chapter_num: Optional[str] = None,
+    clean_rules: Optional[str] = typer.Option(
+        None, "--clean-rules", help="Rules file replacing the site's default cleaning rules"
+    ),
 ):
     """Download and save a book from Uukanshu"""
-    uukanshu_trawler = UukanshuNovelTrawler()
-    text_writer = TextReaderWriter(book_id)
+    from trawlers import UukanshuNovelTrawler
+
+    uukanshu_trawler = UukanshuNovelTrawler(cleaner=_load_cleaner(clean_rules))
+    text_writer = _open_book(book_id)
 
     chapter_titles = uukanshu_trawler.get_chapter_titles(book_id)
     validate_chapter_range(chapter_titles, starting_chapter_num, ending_chapter_num)
@@ -99,27 +297,36 @@ def get_and_save_book(
         int(ending_chapter_num) if ending_chapter_num else int(list(chapter_titles)[-1])
     )
 
-    for chapter_num in range(start, end + 1):
-        logger.info(f"Retrieving content for chapter {chapter_num}...")
-        title, content = uukanshu_trawler.get_chapter(
-            book_id=book_id, chapter_num=str(chapter_num)
-        )
-        logger.info(f"Retrieved content for title: {title}")
+    # Chapters are written in the background so fetching never waits on disk
+    with BufferedChapterWriter(text_writer) as chapter_writer:
+        for chapter_num in range(start, end + 1):
+            logger.info(f"Retrieving content for chapter {chapter_num}...")
+            title, content = uukanshu_trawler.get_chapter(
+                book_id=book_id, chapter_num=str(chapter_num)
+            )
+            logger.info(f"Retrieved content for title: {title}")
 
-        text_writer.write_chapter_to_file(
-            book_title=book_id, chapter_title=title, content=content
-        )
+            chapter_writer.write_chapter(
+                book_title=book_id, chapter_title=title, content=content
+            )
+
+    _log_cleaning_stats(uukanshu_trawler.cleaner)
 
 
 @app.command()
 def get_and_save_book_novelfull(
     book_id: str, 
     starting_chapter_num: Optional[str] = None, 
-    ending_chapter_num: Optional[str] = None
+    ending_chapter_num: Optional[str] = None,
+    clean_rules: Optional[str] = typer.Option(
+        None, "--clean-rules", help="Rules file replacing the site's default cleaning rules"
+    ),
 ):
     """Download and save a book from NovelFull"""
-    novelfull_trawler = NovelFullTrawler()
-    text_writer = TextReaderWriter(book_id)
+    from trawlers import NovelFullTrawler
+
+    novelfull_trawler = NovelFullTrawler(cleaner=_load_cleaner(clean_rules))
+    text_writer = _open_book(book_id)
 
     # Download book cover
     book_cover = novelfull_trawler.get_book_cover(book_id)
@@ -127,6 +334,8 @@ def get_and_save_book_novelfull(
         logger.info("Unable to download book cover")
     else:
         text_writer.save_book_cover(book_title=book_id, image_bytes=book_cover)
+        # Optimize the cover now so exports find it cached
+        text_writer.get_optimized_cover()
 
     # Download book info
     book_info = novelfull_trawler.get_book_info(book_id)
@@ -141,23 +350,29 @@ def get_and_save_book_novelfull(
         int(ending_chapter_num) if ending_chapter_num else int(list(chapter_titles)[-1])
     )
 
-    for chapter_num in range(start, end + 1):
-        logger.info(f"Retrieving content for chapter {chapter_num}...")
-        title, content = novelfull_trawler.get_chapter(
-            book_id=book_id, chapter_num=str(chapter_num)
-        )
-        logger.info(f"Retrieved content for title: {title}")
+    # Chapters are written in the background so fetching never waits on disk
+    with BufferedChapterWriter(text_writer) as chapter_writer:
+        for chapter_num in range(start, end + 1):
+            logger.info(f"Retrieving content for chapter {chapter_num}...")
+            title, content = novelfull_trawler.get_chapter(
+                book_id=book_id, chapter_num=str(chapter_num)
+            )
+            logger.info(f"Retrieved content for title: {title}")
 
-        text_writer.write_chapter_to_file(
-            book_title=book_id, chapter_title=title, content=content
-        )
+            chapter_writer.write_chapter(
+                book_title=book_id, chapter_title=title, content=content
+            )
+
+    _log_cleaning_stats(novelfull_trawler.cleaner)
 
 
 @app.command()
 def save_chapter(book_id: str, chapter_num: str):
     """Save a single chapter to a file"""
+    from trawlers import UukanshuNovelTrawler
+
     uukanshu_trawler = UukanshuNovelTrawler()
-    text_writer = TextReaderWriter(book_id)
+    text_writer = _open_book(book_id)
 
     title, content = uukanshu_trawler.get_chapter(
         book_id=book_id, chapter_num=chapter_num
@@ -170,24 +385,42 @@ def save_chapter(book_id: str, chapter_num: str):
 @app.command()
 def get_chapter_titles(book_id: str):
     """List all chapter titles for a book"""
+    from trawlers import UukanshuNovelTrawler
+
     uukanshu_trawler = UukanshuNovelTrawler()
     titles = uukanshu_trawler.get_chapter_titles(book_id)
     for num, info in titles.items():
         logger.info(f"{num}: {info['chinese_title']}")
 
 
+def _get_novelhi_translator() -> BaseTranslator:
+    """Use the warm translation daemon if one is running, else start NovelHi locally"""
+    daemon_translator = connect_to_daemon()
+    if daemon_translator is not None:
+        return daemon_translator
+    return NovelHiTranslator()
+
+
 @app.command()
-def translate_chapter(book_id: str, chapter_num: str):
+def translate_chapter(
+    book_id: str,
+    chapter_num: str,
+    tuning_file: str = ChunkSizeTuner.DEFAULT_STATE_FILE,
+):
     """Translate a single chapter"""
-    text_rw = TextReaderWriter(book_id)
+    text_rw = _open_book(book_id)
     chinese_title, chinese_content = text_rw.get_file_content(
         book_title=book_id, chapter_num=chapter_num, is_downloaded=True
     )
     logger.info(f"Retrieved Chinese content ({len(chinese_content)} chars)")
     
-    novelhi_translator = NovelHiTranslator()
+    novelhi_translator = _get_novelhi_translator()
+    tuner = ChunkSizeTuner("novelhi", state_file=tuning_file)
     english_title = novelhi_translator.translate_text(chinese_title).strip()
-    english_content = novelhi_translator.translate_text(chinese_content)
+    english_content = translate_with_tuner(
+        novelhi_translator.translate_text, chinese_content, tuner
+    )
+    tuner.save()
     
     logger.info("Translated to English, saving to file")
     text_rw.write_chapter_to_file(
@@ -199,68 +432,559 @@ def translate_chapter(book_id: str, chapter_num: str):
     logger.info("Translation complete")
 
 
+def _translate_chapter_to_file(
+    text_rw: TextReaderWriter,
+    translator: BaseTranslator,
+    tuner: ChunkSizeTuner,
+    book_id: str,
+    chapter_num: str,
+    translated_titles: Optional[Dict[str, str]] = None,
+) -> None:
+    """Translate a downloaded chapter and save it to the translated dir"""
+    logger.info(f"Processing chapter: {chapter_num}...")
+    chinese_title, chinese_content = text_rw.get_file_content(
+        book_title=book_id, chapter_num=chapter_num, is_downloaded=True
+    )
+    logger.info(f"Retrieved Chinese content ({len(chinese_content)} chars)")
+
+    # Get translated title
+    if translated_titles:
+        english_title = get_translated_title(chapter_num, translated_titles)
+    else:
+        english_title = f"{chapter_num}_{translator.translate_text(chinese_title).strip()}"
+
+    logger.info(f"Using English title: {english_title}")
+
+    # Translate content in chunks sized by the tuner
+    english_content = translate_with_tuner(
+        translator.translate_text, chinese_content, tuner
+    )
+
+    logger.info("Translated to English, saving to file")
+    text_rw.write_chapter_to_file(
+        book_title=book_id,
+        chapter_title=english_title,
+        content=english_content,
+        is_downloaded=False,
+    )
+    logger.info(f"Translation for chapter {chapter_num} complete")
+
+    # Persist learned chunk size after every chapter so interrupted runs keep it
+    tuner.save()
+
+
+def _run_translation_worker(
+    job_queue: TranslationJobQueue,
+    translator: BaseTranslator,
+    tuner: ChunkSizeTuner,
+    book_id: Optional[str] = None,
+    translated_titles: Optional[Dict[str, str]] = None,
+    workers: int = 1,
+    wait: bool = False,
+    poll_interval: float = 10.0,
+    on_chapter_done: Optional[Callable[[TranslationJob, float], None]] = None,
+    chapter_ranges: Optional[List[range]] = None,
+) -> int:
+    """
+    Translate queued chapters, always claiming the highest-priority job next.
+
+    on_chapter_done, if given, is called with each finished job and the
+    seconds it took from claim to saved translation. chapter_ranges, if given,
+    limits the claimed jobs to those chapters.
+
+    If the run is interrupted (Ctrl-C or SIGTERM), the chapters it claimed
+    but didn't finish are put back in the queue before the interruption
+    propagates, so the next run picks them up again.
+
+    Returns the number of jobs that failed.
+    """
+    text_rws: Dict[str, TextReaderWriter] = {}
+    failures = []
+    # Jobs this run claimed and hasn't finished, by id
+    claimed: Dict[int, TranslationJob] = {}
+    claimed_lock = threading.Lock()
+    stop = threading.Event()
+
+    def work() -> None:
+        while not stop.is_set():
+            job = job_queue.claim(book_id, chapter_ranges)
+            if job is None:
+                if not wait:
+                    return
+                stop.wait(poll_interval)
+                continue
+
+            with claimed_lock:
+                claimed[job.id] = job
+            logger.info(
+                f"Claimed {job.book_id} chapter {job.chapter_num} (priority {job.priority})"
+            )
+            text_rw = text_rws.setdefault(job.book_id, _open_book(job.book_id))
+            start = time.perf_counter()
+            try:
+                _translate_chapter_to_file(
+                    text_rw, translator, tuner, job.book_id, job.chapter_num, translated_titles
+                )
+                job_queue.complete(job)
+                CHAPTERS_TRANSLATED.inc(outcome="ok")
+                if on_chapter_done:
+                    on_chapter_done(job, time.perf_counter() - start)
+            except Exception as e:
+                logger.error(f"Failed to translate {job.book_id} chapter {job.chapter_num}: {str(e)}")
+                job_queue.fail(job, str(e))
+                CHAPTERS_TRANSLATED.inc(outcome="failed")
+                failures.append(job)
+            with claimed_lock:
+                claimed.pop(job.id, None)
+
+    def release_claimed() -> None:
+        stop.set()
+        with claimed_lock:
+            unfinished = list(claimed.values())
+            claimed.clear()
+        for job in unfinished:
+            job_queue.release(job)
+        if unfinished:
+            logger.warning(
+                f"Interrupted, returned {len(unfinished)} unfinished chapters to the queue: "
+                + ", ".join(job.chapter_num for job in unfinished)
+            )
+
+    def interrupt(signum, frame) -> None:
+        raise KeyboardInterrupt
+
+    # SIGTERM would otherwise end the process without running the cleanup below
+    previous_handler = None
+    if threading.current_thread() is threading.main_thread():
+        previous_handler = signal.signal(signal.SIGTERM, interrupt)
+    try:
+        if workers > 1:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                futures = [executor.submit(work) for _ in range(workers)]
+                try:
+                    for future in futures:
+                        future.result()
+                finally:
+                    # Stop claiming new chapters, and let the executor wait for
+                    # those in progress before any unfinished ones are released
+                    stop.set()
+        else:
+            work()
+    finally:
+        release_claimed()
+        if previous_handler is not None:
+            signal.signal(signal.SIGTERM, previous_handler)
+
+    for text_rw in text_rws.values():
+        text_rw.save_chapter_index()
+
+    logger.info(f"Chunk tuning summary: {tuner.summary()}")
+    if isinstance(translator, SingleFlightTranslator):
+        logger.info(f"Single-flight summary: {translator.stats()}")
+    return len(failures)
+
+
 @app.command()
 def translate_chapters(
     book_id: str,
     starting_chapter_num: str, 
     ending_chapter_num: str,
-    titles_file: Optional[str] = None
+    titles_file: Optional[str] = None,
+    tuning_file: str = ChunkSizeTuner.DEFAULT_STATE_FILE,
+    workers: int = 1,
+    urgent: Optional[str] = None,
+    newest_first: bool = False,
+    queue_db: str = TranslationJobQueue.DEFAULT_DB_PATH,
 ):
     """Translate a range of chapters"""
-    text_rw = TextReaderWriter(book_id)
-    novelhi_translator = NovelHiTranslator()
+    job_queue = TranslationJobQueue(queue_db)
+    # Chapters left running by a killed run would otherwise never be retried
+    job_queue.requeue_stale()
+    chapter_nums = range(int(starting_chapter_num), int(ending_chapter_num) + 1)
+    job_queue.enqueue(book_id, chapter_nums, newest_first=newest_first)
+    # Only translate what this command asked for, not every pending chapter of the book
+    chapter_ranges = [chapter_nums]
+    if urgent:
+        urgent_nums = parse_chapter_range(urgent)
+        job_queue.enqueue(book_id, urgent_nums, priority=TranslationJobQueue.PRIORITY_URGENT)
+        chapter_ranges.append(urgent_nums)
+
+    # Identical concurrent requests (e.g. repeated titles) share one call
+    novelhi_translator = SingleFlightTranslator(_get_novelhi_translator())
+    tuner = ChunkSizeTuner("novelhi", state_file=tuning_file)
     
     # Load translated titles if provided
     translated_titles = {}
     if titles_file:
         translated_titles = load_translated_titles(titles_file)
-    
-    for chapter_num in range(int(starting_chapter_num), int(ending_chapter_num) + 1):
-        logger.info(f"Processing chapter: {chapter_num}...")
-        chinese_title, chinese_content = text_rw.get_file_content(
-            book_title=book_id, chapter_num=str(chapter_num), is_downloaded=True
+
+    failures = _run_translation_worker(
+        job_queue,
+        novelhi_translator,
+        tuner,
+        book_id=book_id,
+        translated_titles=translated_titles,
+        workers=workers,
+        chapter_ranges=chapter_ranges,
+    )
+    if failures:
+        logger.error(f"{failures} chapters failed to translate, see queue-status")
+        raise typer.Exit(code=1)
+
+
+@app.command()
+def queue_chapters(
+    book_id: str,
+    chapter_range: str,
+    urgent: bool = False,
+    priority: int = TranslationJobQueue.PRIORITY_NORMAL,
+    newest_first: bool = False,
+    queue_db: str = TranslationJobQueue.DEFAULT_DB_PATH,
+):
+    """Add a range of chapters (e.g. 5120-5130) to the translation queue"""
+    job_queue = TranslationJobQueue(queue_db)
+    if urgent:
+        priority = max(priority, TranslationJobQueue.PRIORITY_URGENT)
+    job_queue.enqueue(
+        book_id, parse_chapter_range(chapter_range), priority=priority, newest_first=newest_first
+    )
+
+
+@app.command()
+def translate_worker(
+    book_id: Optional[str] = None,
+    titles_file: Optional[str] = None,
+    tuning_file: str = ChunkSizeTuner.DEFAULT_STATE_FILE,
+    workers: int = 1,
+    wait: bool = True,
+    poll_interval: float = 10.0,
+    queue_db: str = TranslationJobQueue.DEFAULT_DB_PATH,
+):
+    """Long-running worker translating queued chapters by priority"""
+    job_queue = TranslationJobQueue(queue_db)
+    job_queue.requeue_stale()
+
+    novelhi_translator = SingleFlightTranslator(_get_novelhi_translator())
+    tuner = ChunkSizeTuner("novelhi", state_file=tuning_file)
+    translated_titles = load_translated_titles(titles_file) if titles_file else {}
+
+    _run_translation_worker(
+        job_queue,
+        novelhi_translator,
+        tuner,
+        book_id=book_id,
+        translated_titles=translated_titles,
+        workers=workers,
+        wait=wait,
+        poll_interval=poll_interval,
+    )
+
+
+@app.command()
+def queue_status(
+    book_id: Optional[str] = None,
+    queue_db: str = TranslationJobQueue.DEFAULT_DB_PATH,
+):
+    """Show translation queue counts and failed chapters"""
+    job_queue = TranslationJobQueue(queue_db)
+    for status, count in sorted(job_queue.counts(book_id).items()):
+        logger.info(f"{status}: {count}")
+    for failed_book_id, chapter_num, error in job_queue.failed_jobs(book_id):
+        logger.info(f"failed {failed_book_id} chapter {chapter_num}: {error}")
+
+
+@app.command()
+def serve(host: str = DEFAULT_HOST, port: int = DEFAULT_PORT):
+    """Run a daemon keeping a warm NovelHi session for the translate commands"""
+    # Imported here so only the commands driving a browser load Selenium
+    from browsers.pool import get_default_pool
+
+    # Start every pool slot now rather than on the first request that needs one
+    get_default_pool().prewarm()
+    translator = SingleFlightTranslator(NovelHiTranslator())
+    TranslationDaemon(translator, host=host, port=port).serve_forever()
+
+
+@app.command()
+def migrate_storage(book_id: str, to: str = STORAGE_SQLITE):
+    """Convert a book between text files and the single-file packed store"""
+    if to not in (STORAGE_SQLITE, STORAGE_FILES):
+        raise typer.BadParameter(f"--to must be {STORAGE_SQLITE} or {STORAGE_FILES}")
+    try:
+        migrate_book(book_id, to)
+    except FileNotFoundError as e:
+        raise typer.BadParameter(str(e))
+
+
+@app.command()
+def recompress_book(book_id: str, to: str = CODEC_ZSTD):
+    """Rewrite all chapters of a book with a compression codec (none, gzip, zstd)"""
+    text_rw = TextReaderWriter(book_id)
+    total_before = total_after = 0
+    for is_downloaded in (True, False):
+        try:
+            before, after = text_rw.recompress_chapters(to, is_downloaded=is_downloaded)
+        except FileNotFoundError:
+            continue
+        total_before += before
+        total_after += after
+
+    saved = total_before - total_after
+    percent = saved / total_before * 100 if total_before else 0
+    logger.info(
+        f"Space: {total_before / 1024 / 1024:.2f} MB -> {total_after / 1024 / 1024:.2f} MB "
+        f"(saved {saved / 1024 / 1024:.2f} MB, {percent:.1f}%)"
+    )
+
+
+@app.command()
+def clean_book(
+    book_id: str,
+    rules: str = typer.Option(..., "--rules", help="Rules file, one literal or re:regex per line"),
+    translated: bool = typer.Option(False, "--translated", help="Clean translated chapters"),
+    dry_run: bool = typer.Option(False, "--dry-run", help="Only report what would change"),
+    workers: Optional[int] = typer.Option(None, "--workers", help="Processes, defaults to the CPU count"),
+):
+    """Remove ads and watermarks matching a rules file from every chapter of a book"""
+    try:
+        cleaning_rules = load_rules(rules)
+    except (OSError, ValueError) as e:
+        raise typer.BadParameter(str(e))
+    if not cleaning_rules:
+        raise typer.BadParameter(f"No rules found in {rules}")
+    if workers is not None and workers < 1:
+        raise typer.BadParameter("--workers must be at least 1")
+
+    try:
+        stats = clean_book_chapters(
+            book_id,
+            cleaning_rules,
+            is_downloaded=not translated,
+            dry_run=dry_run,
+            workers=workers,
         )
-        logger.info(f"Retrieved Chinese content ({len(chinese_content)} chars)")
+    except FileNotFoundError as e:
+        logger.error(str(e))
+        raise typer.Exit(code=1)
+    for line in stats.report():
+        logger.info(line)
 
-        # Split content for translation
-        contents = split_content(chinese_content)
 
-        # Get translated title
-        if titles_file:
-            english_title = get_translated_title(str(chapter_num), translated_titles)
-        else:
-            english_title = f"{chapter_num}_{novelhi_translator.translate_text(chinese_title).strip()}"
-        
-        logger.info(f"Using English title: {english_title}")
+@app.command()
+def benchmark_trawlers(
+    site: Optional[str] = typer.Option(None, "--site", help="uukanshu or novelfull, defaults to both"),
+    chapters: int = typer.Option(200, "--chapters", help="Chapters in the synthetic book"),
+    paragraphs: int = typer.Option(40, "--paragraphs", help="Paragraphs per synthetic chapter"),
+    latency_ms: float = typer.Option(50.0, "--latency-ms", help="Latency added to every response"),
+    jitter_ms: float = typer.Option(10.0, "--jitter-ms", help="Random +/- variation of the latency"),
+    error_rate: float = typer.Option(0.0, "--error-rate", help="Fraction of responses that are 503 errors"),
+    seed: int = typer.Option(0, "--seed", help="Seed for synthetic content, jitter and errors"),
+    fixtures_dir: Optional[str] = typer.Option(
+        None, "--fixtures-dir", help="Directory of recorded pages served instead of synthetic ones"
+    ),
+    book_id: str = typer.Option("1000", "--book-id", help="Book id of the served book"),
+    max_retries: int = typer.Option(3, "--max-retries", help="Retries per failed chapter"),
+    output: str = typer.Option("benchmark-trawlers.json", "--output", help="JSON results file"),
+    label: Optional[str] = typer.Option(None, "--label", help="Label stored with the results"),
+):
+    """Benchmark full-book downloads against a local fixture server"""
+    from benchmarks.trawler_bench import run_trawler_benchmark
 
-        # Translate content in chunks
-        translated_contents = []
-        for content in contents:
-            logger.info(f"Translating content chunk ({len(content)} chars)")
-            translated_contents.append(novelhi_translator.translate_text(content))
-        
-        english_content = combine_content(translated_contents)
-
-        logger.info("Translated to English, saving to file")
-        text_rw.write_chapter_to_file(
-            book_title=book_id,
-            chapter_title=english_title,
-            content=english_content,
-            is_downloaded=False,
+    if site is not None and site not in SITES:
+        raise typer.BadParameter(f"--site must be one of {', '.join(SITES)}")
+    if chapters < 1:
+        raise typer.BadParameter("--chapters must be at least 1")
+    if not 0 <= error_rate < 1:
+        raise typer.BadParameter("--error-rate must be between 0 and 1")
+
+    results = {}
+    configs = {}
+    for benchmark_site in [site] if site else SITES:
+        config = FixtureConfig(
+            site=benchmark_site,
+            book_id=book_id,
+            chapters=chapters,
+            paragraphs=paragraphs,
+            latency_ms=latency_ms,
+            jitter_ms=jitter_ms,
+            error_rate=error_rate,
+            seed=seed,
+            fixtures_dir=fixtures_dir,
         )
-        logger.info(f"Translation for chapter {chapter_num} complete")
+        configs[benchmark_site] = config._asdict()
+        results[benchmark_site] = run_trawler_benchmark(config, max_retries=max_retries)
+
+    write_report(
+        build_report("trawlers", {"sites": configs, "max_retries": max_retries}, results, label),
+        output,
+    )
 
 
 @app.command()
-def test_split(book_id: str, chapter_num: str):
+def benchmark_translate(
+    chapters: int = typer.Option(100, "--chapters", help="Chapters in the synthetic book"),
+    chapter_chars: int = typer.Option(3000, "--chapter-chars", help="Characters per chapter"),
+    workers: int = typer.Option(1, "--workers", help="Chapters translated concurrently"),
+    latency_ms: float = typer.Option(200.0, "--latency-ms", help="Latency of every translation request"),
+    chars_per_second: Optional[float] = typer.Option(
+        None, "--chars-per-second", help="Throughput limit of the simulated backend"
+    ),
+    failure_rate: float = typer.Option(0.0, "--failure-rate", help="Fraction of requests that fail"),
+    truncation_rate: float = typer.Option(
+        0.0, "--truncation-rate", help="Fraction of requests returning truncated text"
+    ),
+    initial_chars: int = typer.Option(2000, "--initial-chars", help="Starting chunk size"),
+    seed: int = typer.Option(0, "--seed", help="Seed for the text, failures and truncations"),
+    output: str = typer.Option("benchmark-translate.json", "--output", help="JSON results file"),
+    label: Optional[str] = typer.Option(None, "--label", help="Label stored with the results"),
+):
+    """Benchmark the translate path offline with a fake translator"""
+    if chapters < 1 or chapter_chars < 1:
+        raise typer.BadParameter("--chapters and --chapter-chars must be at least 1")
+    if workers < 1:
+        raise typer.BadParameter("--workers must be at least 1")
+    if failure_rate < 0 or truncation_rate < 0 or failure_rate + truncation_rate >= 1:
+        raise typer.BadParameter("--failure-rate plus --truncation-rate must be between 0 and 1")
+
+    translator = FakeTranslator(
+        latency=latency_ms / 1000,
+        chars_per_second=chars_per_second,
+        failure_rate=failure_rate,
+        truncation_rate=truncation_rate,
+        seed=seed,
+    )
+    results = run_translate_benchmark(
+        _run_translation_worker,
+        translator,
+        chapters=chapters,
+        chapter_chars=chapter_chars,
+        workers=workers,
+        initial_chars=initial_chars,
+        seed=seed,
+    )
+    config = {
+        "chapters": chapters,
+        "chapter_chars": chapter_chars,
+        "workers": workers,
+        "latency_ms": latency_ms,
+        "chars_per_second": chars_per_second,
+        "failure_rate": failure_rate,
+        "truncation_rate": truncation_rate,
+        "initial_chars": initial_chars,
+        "seed": seed,
+    }
+    write_report(build_report("translate", config, results, label), output)
+
+
+@app.command()
+def benchmark_export(
+    chapters: str = typer.Option("100,1000", "--chapters", help="Comma-separated chapter counts"),
+    chapter_chars: int = typer.Option(5000, "--chapter-chars", help="Mean characters per chapter"),
+    distribution: str = typer.Option(
+        SIZE_FIXED, "--distribution", help="Chapter sizes: fixed, uniform or lognormal"
+    ),
+    cover_size: str = typer.Option("1600x2400", "--cover-size", help="Cover size, WIDTHxHEIGHT"),
+    paths: str = typer.Option(
+        ",".join(EXPORT_PATHS), "--paths", help="Comma-separated export paths: v1, v2, stream, incremental"
+    ),
+    compression_level: int = typer.Option(6, "--compression-level", help="Deflate level (0-9)"),
+    workers: Optional[int] = typer.Option(None, "--workers", help="Rendering processes for v2"),
+    phases: bool = typer.Option(True, "--phases/--no-phases", help="Add a profiled run per path for the phase split"),
+    seed: int = typer.Option(0, "--seed", help="Seed for the synthetic books"),
+    output: str = typer.Option("benchmark-export.json", "--output", help="JSON results file"),
+    label: Optional[str] = typer.Option(None, "--label", help="Label stored with the results"),
+):
+    """Benchmark the EPUB export paths on synthetic books of increasing size"""
+    try:
+        chapter_counts = [int(count) for count in chapters.split(",")]
+    except ValueError:
+        raise typer.BadParameter("--chapters must be comma-separated numbers, e.g. 100,1000,10000")
+    if any(count < 1 for count in chapter_counts):
+        raise typer.BadParameter("--chapters must be at least 1")
+    if distribution not in SIZE_DISTRIBUTIONS:
+        raise typer.BadParameter(f"--distribution must be one of {', '.join(SIZE_DISTRIBUTIONS)}")
+    export_paths = tuple(path.strip() for path in paths.split(","))
+    unknown = [path for path in export_paths if path not in EXPORT_PATHS]
+    if unknown:
+        raise typer.BadParameter(f"Unknown export paths: {', '.join(unknown)}")
+    try:
+        cover_dimensions = parse_max_size(cover_size)
+    except ValueError as e:
+        raise typer.BadParameter(str(e))
+
+    results = {
+        str(count): run_export_benchmark(
+            count,
+            chapter_chars=chapter_chars,
+            distribution=distribution,
+            cover_size=cover_dimensions,
+            paths=export_paths,
+            compresslevel=compression_level,
+            workers=workers,
+            phases=phases,
+            seed=seed,
+        )
+        for count in chapter_counts
+    }
+    config = {
+        "chapters": chapter_counts,
+        "chapter_chars": chapter_chars,
+        "distribution": distribution,
+        "cover_size": list(cover_dimensions),
+        "paths": list(export_paths),
+        "compression_level": compression_level,
+        "workers": workers,
+        "phases": phases,
+        "seed": seed,
+    }
+    write_report(build_report("export", config, results, label), output)
+
+
+@app.command()
+def benchmark_startup(
+    runs: int = typer.Option(10, "--runs", min=1, help="Fresh interpreters per measurement"),
+    max_import_ms: Optional[float] = typer.Option(
+        None, "--max-import-ms", help="Fail if the median time to import main exceeds this"
+    ),
+    max_help_ms: Optional[float] = typer.Option(
+        None, "--max-help-ms", help="Fail if the median time of a --help process exceeds this"
+    ),
+    output: str = typer.Option("benchmark-startup.json", "--output", help="JSON results file"),
+    label: Optional[str] = typer.Option(None, "--label", help="Label stored with the results"),
+):
+    """Measure CLI startup and fail if it regressed"""
+    results = run_startup_benchmark(runs)
+    config = {"runs": runs, "max_import_ms": max_import_ms, "max_help_ms": max_help_ms}
+    write_report(build_report("startup", config, results, label), output)
+
+    regressions = []
+    if results["heavy_modules_loaded"]:
+        regressions.append(f"import main loads {', '.join(results['heavy_modules_loaded'])}")
+    import_ms = results["import_main"]["p50_ms"]
+    if max_import_ms is not None and import_ms > max_import_ms:
+        regressions.append(f"import main takes {import_ms:.0f} ms, over {max_import_ms:.0f} ms")
+    help_ms = results["help_process"]["p50_ms"]
+    if max_help_ms is not None and help_ms > max_help_ms:
+        regressions.append(f"--help takes {help_ms:.0f} ms, over {max_help_ms:.0f} ms")
+    for regression in regressions:
+        logger.error(f"Startup regression: {regression}")
+    if regressions:
+        raise typer.Exit(code=1)
+
+
+@app.command()
+def test_split(book_id: str, chapter_num: str, chunk_size: Optional[int] = None):
     """Test the content splitting function"""
-    text_rw = TextReaderWriter(book_id)
+    text_rw = _open_book(book_id)
     chinese_title, chinese_content = text_rw.get_file_content(
         book_title=book_id, chapter_num=chapter_num, is_downloaded=True
     )
     logger.info(f"Retrieved Chinese content ({len(chinese_content)} chars)")
     
-    split_contents = split_content(chinese_content)
+    if chunk_size:
+        split_contents = split_content_by_size(chinese_content, chunk_size)
+    else:
+        split_contents = split_content(chinese_content)
     logger.info(f"Split into {len(split_contents)} chunks")
     
     combined_content = combine_content(split_contents)
@@ -275,7 +999,7 @@ def test_split(book_id: str, chapter_num: str):
 @app.command()
 def get_titles():
     """Copy all book titles to clipboard"""
-    text_rw = TextReaderWriter(BOOK_TITLE)
+    text_rw = _open_book(BOOK_TITLE)
     order_key = "Chapter (\d+)"
     titles = text_rw.get_book_titles(order_key=order_key)
     titles_text = "\n".join(titles)
@@ -311,9 +1035,72 @@ def transform_translated_titles(filepath: str = "nshba_translated_titles.txt"):
 
 # Global debug option via callback
 @app.callback()
-def main(debug: bool = typer.Option(False, "--debug", "-d", help="Enable debug mode")):
+def main(
+    ctx: typer.Context,
+    debug: bool = typer.Option(False, "--debug", "-d", help="Enable debug mode"),
+    compression: str = typer.Option(
+        CODEC_NONE, "--compression", help="Store new chapters as none, gzip or zstd"
+    ),
+    profile: bool = typer.Option(
+        False, "--profile", help="Time the fetch, parse, clean, read, write, translate, render "
+        "and compress stages and log a summary when the command ends"
+    ),
+    profile_output: Optional[str] = typer.Option(
+        None, "--profile-output", help="Also write a profile of the command to this file"
+    ),
+    profile_mode: str = typer.Option(
+        PROFILER_CPROFILE, "--profile-mode",
+        help="Profile written to --profile-output: cprofile (pstats dump of the main thread) "
+        "or sample (collapsed stacks of all threads, for flame graphs)"
+    ),
+    metrics_file: Optional[str] = typer.Option(
+        None, "--metrics-file",
+        help="Write throughput metrics in the Prometheus text format to this file, "
+        "every 15 seconds and when the command ends"
+    ),
+    metrics_port: Optional[int] = typer.Option(
+        None, "--metrics-port", help="Serve throughput metrics on http://127.0.0.1:PORT/metrics while running"
+    ),
+):
     """CLI tool for downloading and translating novels"""
+    global COMPRESSION
     setup_logging(debug)
+    try:
+        check_codec(compression)
+    except (ValueError, ImportError) as e:
+        raise typer.BadParameter(str(e))
+    COMPRESSION = compression
+    if profile_mode not in PROFILERS:
+        raise typer.BadParameter(f"--profile-mode must be one of {', '.join(PROFILERS)}")
+    if profile or profile_output:
+        profiling.enable()
+        profiler = start_profiler(profile_mode) if profile_output else None
+        ctx.call_on_close(lambda: _finish_profile(profiler, profile_output))
+    if metrics_file:
+        metrics_writer = MetricsFileWriter(metrics_file)
+        metrics_writer.start()
+        ctx.call_on_close(metrics_writer.stop)
+    if metrics_port is not None:
+        try:
+            metrics_server = MetricsServer(port=metrics_port)
+        except OSError as e:
+            raise typer.BadParameter(f"Unable to serve metrics on port {metrics_port}: {str(e)}")
+        metrics_server.start()
+        ctx.call_on_close(metrics_server.stop)
+
+
+def _finish_profile(profiler, profile_output: Optional[str]) -> None:
+    """Stop the --profile-output profiler and log the stage summary."""
+    if profiler is not None:
+        stop_profiler(profiler, profile_output)
+    profiling.disable()
+    lines = profiling.report()
+    if len(lines) == 1:
+        logger.info("Profile: no stage was timed")
+        return
+    logger.info("Profile by stage:")
+    for line in lines:
+        logger.info(line)
 
 
 if __name__ == "__main__":
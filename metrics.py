@@ -0,0 +1,409 @@
+"""
+Pipeline throughput counters and histograms in the Prometheus text format.
+
+The download, translate and export paths count chapters, bytes, HTTP status
+codes, translated chunks and characters, cache hits and retries, and time
+every HTTP and translation request. Recording is always on and costs a lock
+and a dictionary update. The global --metrics-file and --metrics-port options
+expose the values to a local Prometheus scraper (or node_exporter's textfile
+collector), either as a file rewritten during and after the run, or over
+localhost HTTP while the command runs.
+"""
+import os
+import math
+import logging
+import threading
+from abc import ABC, abstractmethod
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Sequence, Tuple
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 9464
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds between rewrites of the --metrics-file during a run
+WRITE_INTERVAL = 15.0
+
+# Bucket upper bounds in seconds
+REQUEST_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+EXPORT_BUCKETS = (0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+
+_lock = threading.Lock()
+_registry: Dict[str, "_Metric"] = {}
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str, quotes: bool = True) -> str:
+    # Help text escapes backslashes and newlines, label values also quotes
+    value = value.replace("\\", "\\\\").replace("\n", "\\n")
+    return value.replace('"', '\\"') if quotes else value
+
+
+def _format_labels(pairs: Sequence[Tuple[str, str]]) -> str:
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class _Metric(ABC):
+    """A metric family: one value per combination of label values."""
+
+    TYPE = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], object] = {}
+
+    def _key(self, labels: Dict[str, object]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(
+                f"{self.name} takes labels ({', '.join(self.labelnames)}), got ({', '.join(labels)})"
+            )
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        """Return the exposition lines of the family."""
+        lines = [
+            f"# HELP {self.name} {_escape(self.documentation, quotes=False)}",
+            f"# TYPE {self.name} {self.TYPE}",
+        ]
+        with _lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            lines.extend(self._render_sample(list(zip(self.labelnames, key)), value))
+        return lines
+
+    @abstractmethod
+    def _render_sample(self, labels: List[Tuple[str, str]], value) -> List[str]:
+        """Return the exposition lines of one sample."""
+        pass
+
+
+class Counter(_Metric):
+    """A value that only goes up, such as chapters fetched."""
+
+    TYPE = "counter"
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        """
+        Add to the counter.
+
+        Args:
+            amount: Non-negative amount to add
+            **labels: A value for each of the counter's label names
+        """
+        key = self._key(labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        """Return the current value for the given labels."""
+        key = self._key(labels)
+        with _lock:
+            return self._values.get(key, 0.0)
+
+    def _render_sample(self, labels: List[Tuple[str, str]], value) -> List[str]:
+        return [f"{self.name}{_format_labels(labels)} {_format_value(value)}"]
+
+
+class Histogram(_Metric):
+    """Observations, such as request latencies, counted into buckets."""
+
+    TYPE = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = REQUEST_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value: float, **labels) -> None:
+        """
+        Record an observation.
+
+        Args:
+            value: Observed value, e.g. seconds
+            **labels: A value for each of the histogram's label names
+        """
+        key = self._key(labels)
+        with _lock:
+            # Bucket counts, then sum and count
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+                    break
+            state[-2] += value
+            state[-1] += 1
+
+    def _render_sample(self, labels: List[Tuple[str, str]], value) -> List[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, value):
+            cumulative += count
+            bucket_labels = _format_labels(labels + [("le", _format_value(bound))])
+            lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+        lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(value[-2])}")
+        lines.append(f"{self.name}_count{_format_labels(labels)} {value[-1]}")
+        return lines
+
+
+def _register(metric: _Metric) -> _Metric:
+    with _lock:
+        if metric.name in _registry:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        _registry[metric.name] = metric
+    return metric
+
+
+def counter(name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+    """Create and register a counter."""
+    return _register(Counter(name, documentation, labelnames))
+
+
+def histogram(
+    name: str,
+    documentation: str,
+    labelnames: Sequence[str] = (),
+    buckets: Sequence[float] = REQUEST_BUCKETS,
+) -> Histogram:
+    """Create and register a histogram."""
+    return _register(Histogram(name, documentation, labelnames, buckets))
+
+
+# Download
+CHAPTERS_FETCHED = counter("novel_chapters_fetched_total", "Chapters downloaded", ("site",))
+DOWNLOADED_BYTES = counter(
+    "novel_downloaded_bytes_total", "Bytes of HTTP response bodies downloaded", ("site",)
+)
+HTTP_RESPONSES = counter(
+    "novel_http_responses_total",
+    "HTTP responses by status code, status=error for requests without a response",
+    ("site", "status"),
+)
+HTTP_REQUEST_SECONDS = histogram(
+    "novel_http_request_duration_seconds", "Latency of HTTP requests to novel sites", ("site",)
+)
+
+# Translate
+TRANSLATION_CHUNKS = counter(
+    "novel_translation_chunks_total",
+    "Chunk translation attempts by outcome (ok, truncated or failed)",
+    ("backend", "outcome"),
+)
+TRANSLATED_CHARS = counter(
+    "novel_translated_chars_total", "Source characters translated successfully", ("backend",)
+)
+TRANSLATION_RETRIES = counter(
+    "novel_translation_retries_total",
+    "Chunks retried after a failed or truncated attempt",
+    ("backend",),
+)
+TRANSLATION_REQUEST_SECONDS = histogram(
+    "novel_translation_request_duration_seconds", "Latency of chunk translation requests", ("backend",)
+)
+CHAPTERS_TRANSLATED = counter(
+    "novel_chapters_translated_total", "Queued chapters translated, by outcome (ok or failed)", ("outcome",)
+)
+
+# Export
+EXPORTS = counter(
+    "novel_exports_total", "EPUB exports by outcome (written, up_to_date or failed)", ("outcome",)
+)
+CHAPTERS_EXPORTED = counter("novel_chapters_exported_total", "Chapters read into EPUB exports")
+EXPORT_BYTES = counter("novel_export_bytes_total", "Bytes of EPUB files written")
+EXPORT_SECONDS = histogram(
+    "novel_export_duration_seconds", "Time to build an EPUB volume", buckets=EXPORT_BUCKETS
+)
+
+# Work avoided by coalescing or caching: cache=single_flight (translation
+# requests joining an identical in-flight one), export_chapter (chapters
+# reused by incremental exports) or export (exports skipped as up to date)
+CACHE_HITS = counter("novel_cache_hits_total", "Work avoided by a cache", ("cache",))
+
+
+def render() -> str:
+    """
+    Render every registered metric.
+
+    Returns:
+        The metrics in the Prometheus text exposition format
+    """
+    with _lock:
+        metrics = list(_registry.values())
+    lines = []
+    for metric in metrics:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def write_metrics(path: str) -> None:
+    """
+    Write the metrics to a file, atomically so scrapers never see a partial file.
+
+    Args:
+        path: Output file, e.g. a *.prom file in a textfile collector directory
+    """
+    output_dir = os.path.dirname(path)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(render())
+    os.replace(tmp_path, path)
+
+
+def reset() -> None:
+    """Forget all recorded values."""
+    with _lock:
+        for metric in _registry.values():
+            metric._values.clear()
+
+
+def snapshot() -> Dict[str, Dict]:
+    """
+    Copy the recorded values, e.g. to send them from a worker process.
+
+    Returns:
+        Dictionary of metric name -> label values -> value
+    """
+    with _lock:
+        return {
+            name: {
+                key: list(value) if isinstance(value, list) else value
+                for key, value in metric._values.items()
+            }
+            for name, metric in _registry.items()
+            if metric._values
+        }
+
+
+def merge(values: Dict[str, Dict]) -> None:
+    """
+    Add values from snapshot() of another process to this process' metrics.
+
+    Args:
+        values: Snapshot to add
+    """
+    with _lock:
+        for name, samples in values.items():
+            metric = _registry[name]
+            for key, value in samples.items():
+                if isinstance(value, list):
+                    current = metric._values.setdefault(key, [0] * len(value))
+                    for i, part in enumerate(value):
+                        current[i] += part
+                else:
+                    metric._values[key] = metric._values.get(key, 0.0) + value
+
+
+class MetricsFileWriter:
+    """
+    Rewrites a metrics file at a fixed interval, and once more when stopped.
+    """
+
+    def __init__(self, path: str, interval: float = WRITE_INTERVAL) -> None:
+        """
+        Initialize the writer.
+
+        Args:
+            path: Metrics file to keep up to date
+            interval: Seconds between rewrites
+        """
+        self.path = path
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="metrics-writer", daemon=True)
+
+    def start(self) -> None:
+        """Start rewriting the file in the background."""
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the background thread and write the final values."""
+        self._stop.set()
+        self._thread.join()
+        write_metrics(self.path)
+        logger.info(f"Metrics written to {self.path}")
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                write_metrics(self.path)
+            except OSError as e:
+                logger.warning(f"Unable to write metrics to {self.path}: {str(e)}")
+
+
+class MetricsServer:
+    """
+    Localhost HTTP endpoint for a Prometheus scraper, served from a background thread.
+
+    Endpoints:
+        GET /metrics: the metrics in the Prometheus text format
+    """
+
+    def __init__(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT) -> None:
+        """
+        Initialize the server.
+
+        Args:
+            host: Interface to bind, localhost by default
+            port: Port to listen on, 0 for any free port
+        """
+        self.server = ThreadingHTTPServer((host, port), self._make_handler())
+        self.server.daemon_threads = True
+        self._thread = threading.Thread(
+            target=self.server.serve_forever, name="metrics-server", daemon=True
+        )
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/metrics"
+
+    def start(self) -> None:
+        """Start serving in the background."""
+        self._thread.start()
+        logger.info(f"Serving metrics on {self.url}")
+
+    def stop(self) -> None:
+        """Stop serving and close the socket."""
+        self.server.shutdown()
+        self.server.server_close()
+        self._thread.join()
+
+    def _make_handler(self):
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?", 1)[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                data = render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                logger.debug(format % args)
+
+        return Handler
@@ -0,0 +1,542 @@
+"""
+Single-file packed book storage.
+
+SqliteReaderWriter stores every chapter of a book, plus its cover and info, in
+one SQLite database instead of thousands of small .txt files. It exposes the
+same API as TextReaderWriter so the rest of the tool works with either backend.
+"""
+import json
+import os
+import sqlite3
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from base import TextReaderWriter
+from profiling import STAGE_READ, STAGE_WRITE, timed
+from compression import CODEC_NONE
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+PACKED_DIR = "packed_books"
+STORAGE_FILES = "files"
+STORAGE_SQLITE = "sqlite"
+
+
+class SqliteReaderWriter(TextReaderWriter):
+    """
+    Reads and writes a book's chapters, cover and metadata in one SQLite file.
+
+    Chapters keep the filenames they would have on disk (e.g. "12_Title.txt")
+    so chapter paths are interchangeable with the file backend.
+    """
+
+    def __init__(self, book_title: str, db_path: Optional[str] = None):
+        """
+        Open (or create) the packed store for a book.
+
+        Args:
+            book_title: Title of the book
+            db_path: Path to the database, defaults to packed_books/<book_title>.sqlite
+        """
+        super().__init__(book_title)
+        self.db_path = db_path or get_packed_path(book_title)
+        db_dir = os.path.dirname(self.db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+
+        self._lock = threading.RLock()
+        self._in_batch = False
+        self._conn = sqlite3.connect(
+            self.db_path, isolation_level=None, check_same_thread=False
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS chapters (
+                is_downloaded INTEGER NOT NULL,
+                filename TEXT NOT NULL,
+                chapter_num TEXT NOT NULL,
+                content TEXT NOT NULL,
+                PRIMARY KEY (is_downloaded, filename)
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS chapters_by_num ON chapters (is_downloaded, chapter_num)"
+        )
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS assets (
+                is_downloaded INTEGER NOT NULL,
+                name TEXT NOT NULL,
+                data BLOB NOT NULL,
+                PRIMARY KEY (is_downloaded, name)
+            )
+            """
+        )
+
+    @contextmanager
+    def batch(self):
+        """Group writes into a single transaction, committed on exit."""
+        with self._lock:
+            if self._in_batch:
+                yield
+                return
+            self._conn.execute("BEGIN")
+            self._in_batch = True
+            try:
+                yield
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            finally:
+                self._in_batch = False
+
+    def close(self) -> None:
+        """Close the database connection."""
+        with self._lock:
+            self._conn.close()
+
+    @timed(STAGE_WRITE)
+    def write_chapter_to_file(
+        self,
+        book_title: str,
+        chapter_title: str,
+        content: str,
+        is_downloaded: bool = True,
+    ) -> None:
+        """
+        Write chapter content to the packed store.
+
+        Args:
+            book_title: Title of the book
+            chapter_title: Title of the chapter
+            content: Chapter content to write
+            is_downloaded: Whether to write to downloaded (True) or translated (False) chapters
+
+        Raises:
+            IOError: If the chapter could not be written, rolling back any batch it is part of
+        """
+        self._check_book_title(book_title)
+        chapter_title = self._format_chapter_special_char(chapter_title)
+        filename = f"{chapter_title}.txt"
+        try:
+            with self._lock:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO chapters VALUES (?, ?, ?, ?)",
+                    (int(is_downloaded), filename, filename.split("_")[0], content),
+                )
+            logger.info(f"Saved {chapter_title}")
+        except sqlite3.Error as e:
+            logger.error(f"Error saving chapter {chapter_title}: {str(e)}")
+            raise IOError(f"Unable to write chapter {chapter_title}: {str(e)}") from e
+
+    def write_chapters(
+        self,
+        chapters: List[Tuple[str, str, str, bool]],
+        fsync: bool = True,
+    ) -> None:
+        """
+        Write a batch of chapters in a single transaction.
+
+        Args:
+            chapters: List of (book_title, chapter_title, content, is_downloaded)
+            fsync: Unused, SQLite makes every committed transaction durable
+
+        Raises:
+            IOError: If any chapter could not be written, in which case none are
+        """
+        with self.batch():
+            for book_title, chapter_title, content, is_downloaded in chapters:
+                self.write_chapter_to_file(book_title, chapter_title, content, is_downloaded)
+
+    def save_book_cover(
+        self,
+        book_title: str,
+        image_bytes: bytes,
+        is_downloaded: bool = True,
+    ) -> bool:
+        """
+        Save book cover image.
+
+        Args:
+            book_title: Title of the book
+            image_bytes: Cover image as bytes
+            is_downloaded: Whether to write to downloaded (True) or translated (False) assets
+
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        self._check_book_title(book_title)
+        if self._save_asset(self.COVER_IMAGE_FILENAME, image_bytes, is_downloaded):
+            logger.info("Saved cover image")
+            return True
+        return False
+
+    def save_book_info(
+        self,
+        book_title: str,
+        book_info: Dict,
+        is_downloaded: bool = True,
+    ) -> bool:
+        """
+        Save book information as JSON.
+
+        Args:
+            book_title: Title of the book
+            book_info: Dictionary of book metadata
+            is_downloaded: Whether to write to downloaded (True) or translated (False) assets
+
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        self._check_book_title(book_title)
+        data = json.dumps(book_info, ensure_ascii=False, indent=2).encode("utf-8")
+        if self._save_asset(self.BOOK_INFO_FILENAME, data, is_downloaded):
+            logger.info("Saved book info")
+            return True
+        return False
+
+    def get_book_titles(
+        self,
+        order_key: Optional[str] = None,
+        is_downloaded: bool = True,
+    ) -> List[str]:
+        """
+        Get all chapter filenames for a book.
+
+        Args:
+            order_key: Optional regex pattern to extract chapter numbers for ordering
+            is_downloaded: Whether to list downloaded (True) or translated (False) chapters
+
+        Returns:
+            List of chapter filenames
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT filename FROM chapters WHERE is_downloaded = ?",
+                (int(is_downloaded),),
+            ).fetchall()
+        return self._order_chapter_titles([row[0] for row in rows], order_key)
+
+    @timed(STAGE_READ)
+    def get_chapter_content(
+        self,
+        chapter_path: str,
+        is_downloaded: bool = True,
+    ) -> Tuple[str, str]:
+        """
+        Get chapter content by chapter filename.
+
+        Args:
+            chapter_path: Chapter filename as returned by get_book_titles
+            is_downloaded: Whether to read downloaded (True) or translated (False) chapters
+
+        Returns:
+            Tuple of (chapter_title, content)
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT content FROM chapters WHERE is_downloaded = ? AND filename = ?",
+                (int(is_downloaded), chapter_path),
+            ).fetchone()
+        if row is None:
+            logger.error(f"Error reading chapter {chapter_path}: not found in {self.db_path}")
+            return self._strip_chapter_extension(chapter_path), ""
+        return self._strip_chapter_extension(chapter_path), row[0]
+
+    def iter_chapters(
+        self,
+        is_downloaded: bool = True,
+        order_key: Optional[str] = None,
+        chapter_range: Optional[range] = None,
+    ) -> Iterator[Tuple[str, str]]:
+        """
+        Iterate over (chapter_title, content) in chapter order.
+
+        Unordered iteration streams the database sequentially in a single query.
+
+        Args:
+            is_downloaded: Whether to read downloaded (True) or translated (False) chapters
+            order_key: Optional regex pattern to extract chapter numbers for ordering
+            chapter_range: Optional chapter numbers to restrict to, matched with order_key
+        """
+        if order_key or chapter_range is not None:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT filename FROM chapters WHERE is_downloaded = ?",
+                    (int(is_downloaded),),
+                ).fetchall()
+            filenames = self._order_chapter_titles(
+                [row[0] for row in rows], order_key, chapter_range
+            )
+            for filename in filenames:
+                yield self.get_chapter_content(filename, is_downloaded)
+            return
+
+        # A separate connection lets the cursor stream without holding the write lock
+        conn = sqlite3.connect(self.db_path)
+        try:
+            cursor = conn.execute(
+                "SELECT filename, content FROM chapters WHERE is_downloaded = ? ORDER BY rowid",
+                (int(is_downloaded),),
+            )
+            for filename, content in cursor:
+                yield self._strip_chapter_extension(filename), content
+        finally:
+            conn.close()
+
+    def get_source_manifest(
+        self,
+        is_downloaded: bool = True,
+        order_key: Optional[str] = None,
+        chapter_range: Optional[range] = None,
+    ) -> List[Tuple[str, int, int]]:
+        """
+        List what an export of the book is built from, without reading any chapter.
+
+        Rows have no modification time of their own, so every entry carries the
+        time the database was last written.
+
+        Args:
+            is_downloaded: Whether to list downloaded (True) or translated (False) chapters
+            order_key: Optional regex pattern to extract chapter numbers for ordering
+            chapter_range: Optional chapter numbers to restrict to, matched with order_key
+
+        Returns:
+            List of (name, size, mtime_ns) for the chapters in order, followed by
+            the cover image and book info if present
+        """
+        mtime_ns = max(
+            os.stat(path).st_mtime_ns
+            for path in (self.db_path, f"{self.db_path}-wal")
+            if os.path.exists(path)
+        )
+        with self._lock:
+            chapter_sizes = dict(
+                self._conn.execute(
+                    "SELECT filename, length(CAST(content AS BLOB)) FROM chapters WHERE is_downloaded = ?",
+                    (int(is_downloaded),),
+                ).fetchall()
+            )
+            asset_sizes = dict(
+                self._conn.execute(
+                    "SELECT name, length(data) FROM assets WHERE is_downloaded = ?",
+                    (int(is_downloaded),),
+                ).fetchall()
+            )
+
+        names = self._order_chapter_titles(list(chapter_sizes), order_key, chapter_range)
+        manifest = [(name, chapter_sizes[name], mtime_ns) for name in names]
+        for name in (self.COVER_IMAGE_FILENAME, self.BOOK_INFO_FILENAME):
+            if name in asset_sizes:
+                manifest.append((name, asset_sizes[name], mtime_ns))
+        return manifest
+
+    def get_info_and_cover(
+        self,
+        is_downloaded: bool = True,
+    ) -> Tuple[Optional[bytes], Dict]:
+        """
+        Get book cover image and info.
+
+        Args:
+            is_downloaded: Whether to read downloaded (True) or translated (False) assets
+
+        Returns:
+            Tuple of (cover_image_bytes, book_info_dict)
+        """
+        cover_image_content = self._get_asset(self.COVER_IMAGE_FILENAME, is_downloaded)
+        if cover_image_content is None:
+            logger.error(f"Cover image not found in {self.db_path}")
+
+        book_info = {}
+        book_info_data = self._get_asset(self.BOOK_INFO_FILENAME, is_downloaded)
+        if book_info_data is None:
+            logger.error(f"Book info not found in {self.db_path}")
+        else:
+            try:
+                book_info = json.loads(book_info_data)
+            except json.JSONDecodeError:
+                logger.error(f"Invalid JSON in book info stored in {self.db_path}")
+
+        return cover_image_content, book_info
+
+    def get_file_content(
+        self,
+        book_title: str,
+        chapter_num: str,
+        is_downloaded: bool = True,
+    ) -> Tuple[str, str]:
+        """
+        Get content of a chapter by chapter number.
+
+        Args:
+            book_title: Title of the book
+            chapter_num: Chapter number to retrieve
+            is_downloaded: Whether to read downloaded (True) or translated (False) chapters
+
+        Returns:
+            Tuple of (chapter_title, content)
+        """
+        filename = self.find_chapter_file(book_title, chapter_num, is_downloaded)
+        if not filename:
+            raise ValueError(f"Chapter number {chapter_num} not found in {self.db_path}")
+        return self.get_chapter_content(filename, is_downloaded)
+
+    def find_chapter_file(
+        self,
+        book_title: str,
+        chapter_num: str,
+        is_downloaded: bool = True,
+    ) -> Optional[str]:
+        """
+        Look up the chapter filename for a chapter number.
+
+        Args:
+            book_title: Title of the book
+            chapter_num: Chapter number to find
+            is_downloaded: Whether to look in downloaded (True) or translated (False) chapters
+
+        Returns:
+            Chapter filename or None if not found
+
+        Raises:
+            ValueError: If several chapters share the chapter number
+        """
+        self._check_book_title(book_title)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT filename FROM chapters WHERE is_downloaded = ? AND chapter_num = ? "
+                "ORDER BY filename",
+                (int(is_downloaded), chapter_num),
+            ).fetchall()
+        if len(rows) > 1:
+            raise ValueError(
+                f"Chapter number {chapter_num} is used by several chapters: "
+                f"{', '.join(row[0] for row in rows)}"
+            )
+        return rows[0][0] if rows else None
+
+    def save_chapter_index(self) -> None:
+        """The database indexes chapters itself, nothing to persist."""
+        pass
+
+    def _save_asset(self, name: str, data: bytes, is_downloaded: bool) -> bool:
+        try:
+            with self._lock:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO assets VALUES (?, ?, ?)",
+                    (int(is_downloaded), name, data),
+                )
+            return True
+        except sqlite3.Error as e:
+            logger.error(f"Error saving {name}: {str(e)}")
+            return False
+
+    def _get_asset(self, name: str, is_downloaded: bool) -> Optional[bytes]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data FROM assets WHERE is_downloaded = ? AND name = ?",
+                (int(is_downloaded), name),
+            ).fetchone()
+        return row[0] if row else None
+
+    def _check_book_title(self, book_title: str) -> None:
+        if book_title != self.book_title:
+            raise ValueError(
+                f"Packed store for {self.book_title} cannot hold book {book_title}"
+            )
+
+
+def get_packed_path(book_title: str) -> str:
+    """Return the default packed store path for a book."""
+    return f"{PACKED_DIR}/{book_title}.sqlite"
+
+
+def open_reader_writer(book_title: str, compression: str = CODEC_NONE) -> TextReaderWriter:
+    """
+    Open the storage backend for a book.
+
+    Books that have a packed store use it, all others use text files.
+
+    Args:
+        book_title: Title of the book
+        compression: Codec for chapters newly written as text files
+
+    Returns:
+        SqliteReaderWriter or TextReaderWriter
+    """
+    if os.path.exists(get_packed_path(book_title)):
+        return SqliteReaderWriter(book_title)
+    return TextReaderWriter(book_title, compression=compression)
+
+
+def migrate_book(book_title: str, to: str) -> int:
+    """
+    Convert a book between the text file and packed storage backends.
+
+    Both downloaded and translated chapters, the cover and the book info are
+    copied. Text files are left in place after packing them. After unpacking,
+    the packed store is renamed to <book_title>.sqlite.migrated so it no longer
+    takes precedence over the text files, and kept as a backup.
+
+    Args:
+        book_title: Title of the book
+        to: Target backend, "sqlite" or "files"
+
+    Returns:
+        Number of chapters migrated
+
+    Raises:
+        ValueError: If the target backend is unknown
+        FileNotFoundError: If the book has no chapters in the source backend
+    """
+    packed_path = get_packed_path(book_title)
+    if to == STORAGE_SQLITE:
+        source = TextReaderWriter(book_title)
+        if not any(
+            os.path.isdir(os.path.join(base_dir, book_title))
+            for base_dir in (source.downloaded_dir, source.translated_dir)
+        ):
+            raise FileNotFoundError(f"No text files found for {book_title}")
+        target = SqliteReaderWriter(book_title)
+    elif to == STORAGE_FILES:
+        # Opening a missing store would create an empty one that hides the text files
+        if not os.path.exists(packed_path):
+            raise FileNotFoundError(f"No packed store found for {book_title} at {packed_path}")
+        source, target = SqliteReaderWriter(book_title), TextReaderWriter(book_title)
+    else:
+        raise ValueError(f"Unknown storage backend: {to}")
+
+    migrated = 0
+    with target.batch():
+        for is_downloaded in (True, False):
+            try:
+                chapters = source.iter_chapters(is_downloaded)
+                for chapter_title, content in chapters:
+                    target.write_chapter_to_file(
+                        book_title, chapter_title, content, is_downloaded=is_downloaded
+                    )
+                    migrated += 1
+            except FileNotFoundError:
+                continue
+
+            cover_image, book_info = source.get_info_and_cover(is_downloaded)
+            if cover_image:
+                target.save_book_cover(book_title, cover_image, is_downloaded)
+            if book_info:
+                target.save_book_info(book_title, book_info, is_downloaded)
+
+    logger.info(f"Migrated {migrated} chapters of {book_title} to {to} storage")
+    if to == STORAGE_FILES:
+        target.save_chapter_index()
+        source.close()
+        backup_path = f"{packed_path}.migrated"
+        os.replace(packed_path, backup_path)
+        logger.info(f"Moved {packed_path} to {backup_path}, the book now uses text files")
+    return migrated
@@ -1,92 +1,218 @@
-# importing required modules
-from PyPDF2 import PdfReader
-from ebooklib import epub
-
-
-BOOK_TITLE = "Overgeared_Novel"
-TEXT_FILE = f"{BOOK_TITLE}.txt"
-# creating a pdf reader object
-reader = PdfReader(f"{BOOK_TITLE}.pdf")
-
-# printing number of pages in pdf file
-num_pages = len(reader.pages)
-print(num_pages)
-
-# getting a specific page from the pdf file
-page = reader.pages[0]
-
-full_text = ""
-for i in range(num_pages):
-    full_text += reader.pages[i].extract_text()
-
-print(full_text[:100])
-with open(TEXT_FILE, "w") as file:
-    file.write(full_text)
-    file.close()
-
-
-# def create_epub(cover_page, list_of_links, window, lbl_numOfChapters, lbl_coverPage):
-#     book = epub.EpubBook()
-
-#     # set metadata
-#     book.set_identifier('id123456789')
-#     book.set_title(selected_novel + ' - EPUB generator by AkaHitsuji')
-#     book.set_language('en')
-
-#     book.set_cover("cover_page.jpg", open('cover_page.jpg', 'rb').read())
-#     print("Cover page set for ePub")
-
-#     list_of_epub_chapters = []
-#     print('THIS IS THE LIST OF LINKS\n\n',list_of_links)
-#     array_length = len(list_of_links)-2
-#     chapter_number = 1
-#     for i in range(array_length):
-#         chapter_title = list_of_links[i].split("/")[3]
-#         download_chapter('https://www.wuxiaworld.com' + list_of_links[i], chapter_title + '.html')
-#         clean_chapter(chapter_title + '.html', chapter_title + '.xhtml')
-#         chapter_content = open(chapter_title + '.xhtml', "r", encoding="utf8")
-#         chapter_content = BeautifulSoup(chapter_content, 'html.parser')
-#         chapter_content = chapter_content.get_text()
-#         chapter_content = "<br />".join(chapter_content.split("\n"))
-#         print("Chapter",chapter_number,"downloaded")
-#         remove_file(chapter_title + '.xhtml')
-
-#         # create chapter
-#         epub_chapter = epub.EpubHtml(title=list_of_chapters[i], file_name=chapter_title + '.xhtml', lang='hr')
-#         epub_chapter.content = '<head>\n<title>' + list_of_chapters[i] + '</title>\n</head>\n<body>\n<strong>' + list_of_chapters[i] + '</strong>\n<p>' + chapter_content + '</p>\n</body>\n</html>'
-
-#         # update tkinter to display progress
-#         lbl_numOfChapters.configure(text=str(chapter_number)+"/"+str(array_length)+" chapters downloaded")
-#         window.update()
-
-#         # add chapter
-#         book.add_item(epub_chapter)
-#         list_of_epub_chapters.append(epub_chapter)
-
-#         chapter_number+=1
-#         # for testing: set limit on test printing
-#         # if chapter_number==5:
-#         #     break
-
-#     # define Table Of Contents
-#     for epub_chapter in list_of_epub_chapters:
-#         book.toc.append(epub_chapter)
-
-#     # add default NCX and Nav file
-#     book.add_item(epub.EpubNcx())
-#     book.add_item(epub.EpubNav())
-
-#     # define CSS style
-#     style = 'BODY {color: white;}'
-#     nav_css = epub.EpubItem(uid="style_nav", file_name="style/nav.css", media_type="text/css", content=style)
-
-#     # add CSS file
-#     book.add_item(nav_css)
-
-#     # basic spine
-#     book.spine = ['nav']
-#     for epub_chapter in list_of_epub_chapters:
-#         book.spine.append(epub_chapter)
-
-#     # write to the file
-#     epub.write_epub(selected_novel + ' - EPUB generator by AkaHitsuji.epub', book)
+"""
+Import a novel from a PDF into book storage.
+
+Page text is extracted on a process pool, in batches of consecutive pages, and
+consumed in page order with only a few batches in flight, so memory stays
+bounded however long the PDF is. The text is split into chapters at lines
+matching a heading pattern, and each chapter is written through the storage
+backend as soon as the next heading is found. The imported book can then be
+translated and exported like a downloaded one.
+"""
+import os
+import re
+import logging
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Iterator, List, Optional, TextIO, Tuple
+
+from base import TextReaderWriter
+from chapter_writer import BufferedChapterWriter
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# "Chapter 12: Title" or "第十二章 Title" on a line of its own
+DEFAULT_HEADING_PATTERN = r"^\s*(?:Chapter\s+\d+\b.*|第[0-9零一二三四五六七八九十百千万两]+章.*)$"
+
+# Title of any text found before the first heading
+FRONT_MATTER_TITLE = "Chapter 0 Front Matter"
+
+# Pages extracted per task
+DEFAULT_BATCH_SIZE = 16
+
+# Per-process state for extraction workers, a PyPDF2 PdfReader
+_worker_reader = None
+
+
+def _init_worker(pdf_path: str) -> None:
+    global _worker_reader
+    from PyPDF2 import PdfReader
+
+    _worker_reader = PdfReader(pdf_path)
+
+
+def _extract_pages(start: int, stop: int) -> List[str]:
+    """Extract the text of pages [start, stop). Runs in a worker process."""
+    texts = []
+    for page_num in range(start, stop):
+        try:
+            texts.append(_worker_reader.pages[page_num].extract_text() or "")
+        except Exception as e:
+            logger.warning(f"Unable to extract page {page_num + 1}: {str(e)}")
+            texts.append("")
+    return texts
+
+
+def get_page_count(pdf_path: str) -> int:
+    """Return the number of pages in a PDF."""
+    # Imported here so the CLI only loads PyPDF2 for import-pdf
+    from PyPDF2 import PdfReader
+
+    return len(PdfReader(pdf_path).pages)
+
+
+def iter_page_texts(
+    pdf_path: str,
+    workers: Optional[int] = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> Iterator[str]:
+    """
+    Extract the text of every page of a PDF, in page order.
+
+    Batches of pages are extracted in parallel, with at most two batches per
+    worker in flight, so a slow consumer doesn't let extracted text pile up.
+
+    Args:
+        pdf_path: Path of the PDF
+        workers: Number of processes, defaults to the CPU count
+        batch_size: Number of pages extracted per task
+
+    Yields:
+        Text of each page
+    """
+    num_pages = get_page_count(pdf_path)
+    workers = workers or os.cpu_count() or 1
+    batches = iter(range(0, num_pages, batch_size))
+    logger.info(f"Extracting {num_pages} pages with {workers} processes...")
+
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker, initargs=(pdf_path,)
+    ) as executor:
+        in_flight = deque()
+
+        def submit_next() -> None:
+            start = next(batches, None)
+            if start is not None:
+                in_flight.append(
+                    executor.submit(_extract_pages, start, min(start + batch_size, num_pages))
+                )
+
+        for _ in range(workers * 2):
+            submit_next()
+
+        pages_done = 0
+        while in_flight:
+            texts = in_flight.popleft().result()
+            submit_next()
+            for text in texts:
+                yield text
+            pages_done += len(texts)
+            logger.debug(f"Extracted {pages_done}/{num_pages} pages")
+
+
+def split_chapters(
+    lines: Iterable[str],
+    heading_pattern: str = DEFAULT_HEADING_PATTERN,
+) -> Iterator[Tuple[str, str]]:
+    """
+    Split lines of text into chapters at heading lines.
+
+    Chapters without any text, such as entries of a table of contents, are
+    skipped. Text before the first heading becomes FRONT_MATTER_TITLE. A
+    heading repeating the current chapter's, such as a running page header,
+    continues that chapter. Titles are prefixed with a running chapter number,
+    "<num>_<heading>" like downloaded chapters, front matter being chapter 0,
+    so chapters can be looked up by number and repeated headings don't
+    overwrite each other.
+
+    Args:
+        lines: Lines of the book, without line endings
+        heading_pattern: Regex matching a whole chapter heading line
+
+    Yields:
+        Tuples of (chapter title, chapter content)
+    """
+    heading_regex = re.compile(heading_pattern)
+    heading = FRONT_MATTER_TITLE
+    content_lines: List[str] = []
+    is_front_matter = True
+    chapter_num = 0
+    seen_headings = set()
+
+    def finish_chapter() -> Iterator[Tuple[str, str]]:
+        nonlocal chapter_num
+        content = "\n".join(content_lines).strip()
+        if not content:
+            return
+        # Numbered as written, so skipped table of contents entries leave no gaps
+        if not is_front_matter:
+            chapter_num += 1
+        if heading in seen_headings:
+            logger.warning(f"Duplicate chapter heading {heading!r}, writing it as chapter {chapter_num}")
+        seen_headings.add(heading)
+        yield f"{chapter_num}_{heading}", content
+
+    for line in lines:
+        if heading_regex.match(line):
+            next_heading = " ".join(line.split())
+            if next_heading == heading:
+                continue
+            yield from finish_chapter()
+            heading = next_heading
+            content_lines = []
+            is_front_matter = False
+        else:
+            content_lines.append(line)
+
+    yield from finish_chapter()
+
+
+def import_pdf(
+    pdf_path: str,
+    book_title: str,
+    reader_writer: TextReaderWriter,
+    heading_pattern: str = DEFAULT_HEADING_PATTERN,
+    workers: Optional[int] = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    text_file: Optional[str] = None,
+) -> int:
+    """
+    Import a PDF as the downloaded chapters of a book.
+
+    Args:
+        pdf_path: Path of the PDF
+        book_title: Title of the book to write the chapters to
+        reader_writer: Storage backend the chapters are written to
+        heading_pattern: Regex matching a whole chapter heading line
+        workers: Number of extraction processes, defaults to the CPU count
+        batch_size: Number of pages extracted per task
+        text_file: Optional path to also write the full extracted text to
+
+    Returns:
+        Number of chapters written
+    """
+    text_output: Optional[TextIO] = (
+        open(text_file, "w", encoding="utf-8") if text_file else None
+    )
+
+    def iter_lines() -> Iterator[str]:
+        for text in iter_page_texts(pdf_path, workers, batch_size):
+            if text_output:
+                text_output.write(text)
+                text_output.write("\n")
+            yield from text.splitlines()
+
+    count = 0
+    try:
+        with BufferedChapterWriter(reader_writer) as chapter_writer:
+            for chapter_title, content in split_chapters(iter_lines(), heading_pattern):
+                chapter_writer.write_chapter(
+                    book_title=book_title, chapter_title=chapter_title, content=content
+                )
+                count += 1
+    finally:
+        if text_output:
+            text_output.close()
+
+    logger.info(f"Imported {count} chapters from {pdf_path} into {book_title}")
+    return count
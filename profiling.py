@@ -0,0 +1,290 @@
+"""
+Lightweight timing spans for the pipeline stages, and the --profile mode.
+
+Code marks its stages with span("fetch") blocks or the @timed("write")
+decorator. Spans cost one flag check until profiling is enabled, after which
+every span records its duration under its stage name, from any thread.
+summary() then gives count, total, mean and p95 per stage, showing whether a
+run spends its time on the network, parsing, translating, disk or rendering.
+
+For hot-path analysis, start_profiler() additionally records either a
+cProfile dump of the main thread, or stack samples of all threads written as
+collapsed stacks, the input format of flame graph tools such as speedscope.
+Spans of work done on process pools (e.g. parallel EPUB rendering) are
+recorded in the workers and sent back to the parent with snapshot() and
+merge(); the profilers only see the parent process.
+"""
+import sys
+import time
+import cProfile
+import logging
+import threading
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from functools import wraps
+from typing import Callable, Dict, Iterator, List, Sequence
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+STAGE_FETCH = "fetch"
+STAGE_PARSE = "parse"
+STAGE_CLEAN = "clean"
+STAGE_READ = "read"
+STAGE_WRITE = "write"
+STAGE_TRANSLATE_CHUNK = "translate_chunk"
+STAGE_RENDER = "render"
+STAGE_COMPRESS = "compress"
+
+PROFILER_CPROFILE = "cprofile"
+PROFILER_SAMPLE = "sample"
+PROFILERS = (PROFILER_CPROFILE, PROFILER_SAMPLE)
+
+# Seconds between stack samples of the sampling profiler
+SAMPLE_INTERVAL = 0.005
+
+_enabled = False
+_lock = threading.Lock()
+_durations: Dict[str, List[float]] = defaultdict(list)
+
+
+def percentile(values: Sequence[float], pct: float) -> float:
+    """
+    Compute a percentile with linear interpolation between closest ranks.
+
+    Args:
+        values: Samples
+        pct: Percentile (0-100)
+
+    Returns:
+        The percentile, 0.0 for no samples
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100
+    lower = int(rank)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
+
+
+def enable() -> None:
+    """Start recording spans."""
+    global _enabled
+    _enabled = True
+
+
+def disable() -> None:
+    """Stop recording spans, keeping what was recorded."""
+    global _enabled
+    _enabled = False
+
+
+def is_enabled() -> bool:
+    """Return whether spans are being recorded."""
+    return _enabled
+
+
+def reset() -> None:
+    """Forget all recorded spans."""
+    with _lock:
+        _durations.clear()
+
+
+def record(stage: str, seconds: float) -> None:
+    """Record a duration for a stage measured elsewhere."""
+    if _enabled:
+        with _lock:
+            _durations[stage].append(seconds)
+
+
+def snapshot() -> Dict[str, List[float]]:
+    """
+    Copy the recorded spans, e.g. to send them from a worker process.
+
+    Returns:
+        Dictionary of stage -> durations (seconds)
+    """
+    with _lock:
+        return {stage: list(values) for stage, values in _durations.items() if values}
+
+
+def merge(durations: Dict[str, List[float]]) -> None:
+    """
+    Record the spans from snapshot() of another process in this process.
+
+    Args:
+        durations: Snapshot to add
+    """
+    for stage, values in durations.items():
+        for seconds in values:
+            record(stage, seconds)
+
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    """
+    Time the enclosed block as one occurrence of a stage.
+
+    Args:
+        stage: Stage name, e.g. STAGE_FETCH
+    """
+    if not _enabled:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage, time.perf_counter() - start)
+
+
+def timed(stage: str) -> Callable:
+    """
+    Decorator timing every call of a function as one occurrence of a stage.
+
+    Args:
+        stage: Stage name, e.g. STAGE_WRITE
+    """
+    def decorator(func: Callable) -> Callable:
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record(stage, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+def summary() -> Dict[str, Dict[str, float]]:
+    """
+    Summarize the recorded spans.
+
+    Returns:
+        Dictionary of stage -> count, total, mean and p95 (seconds)
+    """
+    with _lock:
+        durations = {stage: list(values) for stage, values in _durations.items()}
+    return {
+        stage: {
+            "count": len(values),
+            "total": sum(values),
+            "mean": sum(values) / len(values),
+            "p95": percentile(values, 95),
+        }
+        for stage, values in durations.items()
+        if values
+    }
+
+
+def report() -> List[str]:
+    """
+    Describe the recorded spans, slowest stage first.
+
+    Returns:
+        Report lines, a header followed by one line per stage
+    """
+    stages = sorted(summary().items(), key=lambda item: item[1]["total"], reverse=True)
+    lines = [f"{'stage':<16}{'count':>8}{'total s':>12}{'mean ms':>12}{'p95 ms':>12}"]
+    for stage, stats in stages:
+        lines.append(
+            f"{stage:<16}{stats['count']:>8}{stats['total']:>12.3f}"
+            f"{stats['mean'] * 1000:>12.2f}{stats['p95'] * 1000:>12.2f}"
+        )
+    return lines
+
+
+class StackSampler:
+    """
+    Sampling profiler recording the stacks of all threads at a fixed interval.
+
+    Unlike cProfile it sees every thread and adds little overhead, at the cost
+    of statistical rather than exact counts.
+    """
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL) -> None:
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self) -> None:
+        """Start sampling."""
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop sampling and wait for the sampler thread."""
+        self._stop.set()
+        self._thread.join()
+
+    def dump_stats(self, path: str) -> None:
+        """
+        Write the samples as collapsed stacks, one "frame;frame;frame count" line each.
+
+        Args:
+            path: Output file
+        """
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+
+    def _run(self) -> None:
+        own_id = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({code.co_filename}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                if thread_id not in names:
+                    names = {thread.ident: thread.name for thread in threading.enumerate()}
+                stack.append(names.get(thread_id, str(thread_id)))
+                self.samples[";".join(reversed(stack))] += 1
+
+
+def start_profiler(mode: str = PROFILER_CPROFILE):
+    """
+    Start a profiler for hot-path analysis.
+
+    Args:
+        mode: cprofile (exact, main thread only) or sample (all threads)
+
+    Returns:
+        The running profiler, to pass to stop_profiler()
+
+    Raises:
+        ValueError: If the mode is unknown
+    """
+    if mode == PROFILER_CPROFILE:
+        profiler = cProfile.Profile()
+        profiler.enable()
+        return profiler
+    if mode == PROFILER_SAMPLE:
+        profiler = StackSampler()
+        profiler.start()
+        return profiler
+    raise ValueError(f"Unknown profiler: {mode}, expected one of {', '.join(PROFILERS)}")
+
+
+def stop_profiler(profiler, path: str) -> None:
+    """
+    Stop a profiler started with start_profiler() and write its dump.
+
+    Args:
+        profiler: The running profiler
+        path: Output file, a pstats dump for cprofile or collapsed stacks for sample
+    """
+    if isinstance(profiler, cProfile.Profile):
+        profiler.disable()
+    else:
+        profiler.stop()
+    profiler.dump_stats(path)
+    logger.info(f"Profile written to {path}")
@@ -15,6 +15,7 @@ setup(
     long_description_content_type="text/markdown",
     url="https://github.com/yourusername/trawl_translate_novel",
     packages=find_packages(),
+    package_data={"cleaning_rules": ["*.txt"]},
     classifiers=[
         "Programming Language :: Python :: 3",
         "License :: OSI Approved :: MIT License",
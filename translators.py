@@ -1,12 +1,30 @@
-from typing import Tuple
+import time
+import zlib
+import threading
+import unicodedata
+from concurrent.futures import Future
+from typing import Dict, Optional, Tuple
 import logging
 from base import BaseTranslator
-from browsers.chatgpt_selenium import Handler
-from browsers.novelhi_selenium import NovelHiHandler
+from metrics import CACHE_HITS
+from profiling import STAGE_TRANSLATE_CHUNK, timed
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
+# Syllables used by FakeTranslator to transliterate Chinese characters
+FAKE_SYLLABLES = (
+    "an ba bei bing chen cheng chu da dao di dong fa feng gu guang hai han he hong hua huang "
+    "jian jin jing kai kong lan lei li lin long ma ming mo nan ning pei qi qian qing ren ri "
+    "shan shen shi shui tian ting wan wei wu xi xian xin xu yan yang yi yu yun zhan zhen zhi"
+).split()
+
+# Chinese punctuation and its English counterpart
+FAKE_PUNCTUATION = {
+    "，": ", ", "。": ". ", "！": "! ", "？": "? ", "：": ": ", "；": "; ",
+    "、": ", ", "“": '"', "”": '"', "‘": "'", "’": "'", "（": "(", "）": ")",
+}
+
 
 class ChatGPTTranslator(BaseTranslator):
     """
@@ -22,12 +40,16 @@ class ChatGPTTranslator(BaseTranslator):
             password: OpenAI account password
             chat_prompt: Initial prompt to send to ChatGPT
         """
+        # Imported here so only the translators driving a browser load Selenium
+        from browsers.chatgpt_selenium import Handler
+
         self.openai_handler = Handler(username, password)
         # Initialize the ChatGPT session with the prompt
         answer = self.openai_handler.interact(chat_prompt)
         logger.info(answer)
         logger.info("ChatGPT translator initialized")
 
+    @timed(STAGE_TRANSLATE_CHUNK)
     def translate_text(self, text: str) -> str:
         """
         Translate Chinese text to English using ChatGPT.
@@ -42,6 +64,10 @@ class ChatGPTTranslator(BaseTranslator):
             self._get_translate_prompt(text)
         )
         return english_text.strip()
+
+    def close(self) -> None:
+        """Hand the ChatGPT browser back to the pool."""
+        self.openai_handler.close()
         
     def translate_title_and_content(self, chinese_title: str, chinese_content: str) -> Tuple[str, str]:
         """
@@ -78,8 +104,12 @@ class NovelHiTranslator(BaseTranslator):
     
     def __init__(self) -> None:
         """Initialize the NovelHi translator."""
+        # Imported here so only the translators driving a browser load Selenium
+        from browsers.novelhi_selenium import NovelHiHandler
+
         self.novelhi_handler = NovelHiHandler()
 
+    @timed(STAGE_TRANSLATE_CHUNK)
     def translate_text(self, text: str) -> str:
         """
         Translate Chinese text to English using NovelHi.
@@ -91,3 +121,226 @@ class NovelHiTranslator(BaseTranslator):
             Translated English text
         """
         return self.novelhi_handler.translate_text(text)
+
+
+class SingleFlightTranslator(BaseTranslator):
+    """
+    Wraps another translator so that concurrent callers translating the same
+    normalized text share a single outbound request and its result.
+    """
+
+    def __init__(self, translator: BaseTranslator) -> None:
+        """
+        Initialize the single-flight wrapper.
+
+        Args:
+            translator: Translator performing the actual requests
+        """
+        self.translator = translator
+        self._lock = threading.Lock()
+        self._in_flight: Dict[str, Future] = {}
+
+        self.requests = 0
+        self.outbound_requests = 0
+        self.coalesced_requests = 0
+
+    def translate_text(self, text: str) -> str:
+        """
+        Translate text, joining an identical in-flight request if there is one.
+
+        Args:
+            text: Chinese text to translate
+
+        Returns:
+            Translated English text
+        """
+        key = self._normalize(text)
+        with self._lock:
+            self.requests += 1
+            future = self._in_flight.get(key)
+            is_leader = future is None
+            if is_leader:
+                future = Future()
+                self._in_flight[key] = future
+                self.outbound_requests += 1
+            else:
+                self.coalesced_requests += 1
+
+        if not is_leader:
+            logger.debug(f"Coalesced translation request ({len(text)} chars)")
+            CACHE_HITS.inc(cache="single_flight")
+            return future.result()
+
+        try:
+            result = self.translator.translate_text(text)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+
+    def stats(self) -> Dict[str, int]:
+        """Return request counters, including how many requests were saved."""
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "outbound_requests": self.outbound_requests,
+                "coalesced_requests": self.coalesced_requests,
+            }
+
+    def _normalize(self, text: str) -> str:
+        """
+        Normalize text so inputs differing only in Unicode representation
+        share a request. Whitespace is kept, since callers get back the
+        translation of the first request and may rely on its spacing.
+
+        Args:
+            text: Text to normalize
+
+        Returns:
+            Normalized text used as the coalescing key
+        """
+        return unicodedata.normalize("NFKC", text)
+
+
+class FakeTranslationError(Exception):
+    """Raised by FakeTranslator for an injected failure."""
+    pass
+
+
+class FakeTranslator(BaseTranslator):
+    """
+    Deterministic offline translator for load tests and benchmarks.
+
+    Chinese characters are pseudo-transliterated into syllables and Chinese
+    punctuation is mapped to English, so output is stable and about as long as
+    a real translation. Latency, a characters-per-second limit shared by all
+    callers, failures and truncated responses can be injected. Whether a
+    request fails or is truncated depends only on the seed, the text and how
+    many times that text was sent before, so runs are reproducible whatever
+    the thread scheduling.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        chars_per_second: Optional[float] = None,
+        failure_rate: float = 0.0,
+        truncation_rate: float = 0.0,
+        seed: int = 0,
+    ) -> None:
+        """
+        Initialize the fake translator.
+
+        Args:
+            latency: Seconds added to every request
+            chars_per_second: Throughput of the simulated backend, shared by
+                concurrent requests, or None for no limit
+            failure_rate: Fraction of requests raising FakeTranslationError
+            truncation_rate: Fraction of requests returning a truncated translation,
+                a quarter as long as the source text
+            seed: Seed deciding which requests fail or are truncated
+        """
+        self.latency = latency
+        self.chars_per_second = chars_per_second
+        self.failure_rate = failure_rate
+        self.truncation_rate = truncation_rate
+        self.seed = seed
+
+        self._lock = threading.Lock()
+        self._attempts: Dict[str, int] = {}
+        self._backend_free_at = 0.0
+
+        self.requests = 0
+        self.failures = 0
+        self.truncations = 0
+        self.chars = 0
+        self.wasted_chars = 0
+
+    @timed(STAGE_TRANSLATE_CHUNK)
+    def translate_text(self, text: str) -> str:
+        """
+        Translate text after the simulated delay.
+
+        Args:
+            text: Chinese text to translate
+
+        Returns:
+            Pseudo-English text
+
+        Raises:
+            FakeTranslationError: For an injected failure
+        """
+        with self._lock:
+            attempt = self._attempts.get(text, 0)
+            self._attempts[text] = attempt + 1
+            self.requests += 1
+            self.chars += len(text)
+
+            # Requests queue for the shared backend throughput
+            now = time.monotonic()
+            done_at = now
+            if self.chars_per_second:
+                done_at = max(now, self._backend_free_at) + len(text) / self.chars_per_second
+                self._backend_free_at = done_at
+
+        delay = done_at - time.monotonic() + self.latency
+        if delay > 0:
+            time.sleep(delay)
+
+        outcome = self._roll(text, attempt)
+        if outcome < self.failure_rate:
+            with self._lock:
+                self.failures += 1
+                self.wasted_chars += len(text)
+            raise FakeTranslationError(f"Injected failure for {len(text)} chars")
+
+        translated = self.transliterate(text)
+        if outcome < self.failure_rate + self.truncation_rate:
+            with self._lock:
+                self.truncations += 1
+                self.wasted_chars += len(text)
+            # Relative to the source, since transliteration makes text several
+            # times longer, so the truncation is below any sane output ratio
+            return translated[:len(text) // 4]
+        return translated
+
+    def stats(self) -> Dict[str, int]:
+        """Return request counters."""
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "failures": self.failures,
+                "truncations": self.truncations,
+                "chars": self.chars,
+                "wasted_chars": self.wasted_chars,
+            }
+
+    @staticmethod
+    def transliterate(text: str) -> str:
+        """
+        Pseudo-transliterate Chinese text, keeping line breaks.
+
+        Args:
+            text: Chinese text
+
+        Returns:
+            One syllable per Chinese character, other characters unchanged
+        """
+        words = []
+        for char in text:
+            if "\u4e00" <= char <= "\u9fff":
+                if words and not words[-1].endswith((" ", "\n", '"', "(")):
+                    words.append(" ")
+                words.append(FAKE_SYLLABLES[ord(char) % len(FAKE_SYLLABLES)])
+            else:
+                words.append(FAKE_PUNCTUATION.get(char, char))
+        return "".join(words)
+
+    def _roll(self, text: str, attempt: int) -> float:
+        """Deterministic number in [0, 1) for a request."""
+        key = f"{self.seed}:{attempt}:{text}".encode("utf-8")
+        return zlib.crc32(key) / 2 ** 32
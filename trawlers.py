@@ -1,20 +1,53 @@
 import os
 import re
+import time
 import logging
 from typing import Dict, Optional, Tuple
 import requests
 from base import BaseNovelTrawler
+from cleaning import ChapterCleaner
+from metrics import CHAPTERS_FETCHED, DOWNLOADED_BYTES, HTTP_REQUEST_SECONDS, HTTP_RESPONSES
+from profiling import STAGE_FETCH, STAGE_PARSE, span
 from bs4 import BeautifulSoup
 from pycnnum import cn2num
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
+
+def fetch(site: str, url: str) -> requests.Response:
+    """
+    GET a page or image, recording its latency, status code and size.
+
+    Args:
+        site: Site name used as the metrics label
+        url: URL to fetch
+
+    Returns:
+        The response
+    """
+    start = time.perf_counter()
+    try:
+        with span(STAGE_FETCH):
+            response = requests.get(url)
+    except requests.RequestException:
+        HTTP_RESPONSES.inc(site=site, status="error")
+        raise
+    finally:
+        HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start, site=site)
+    HTTP_RESPONSES.inc(site=site, status=response.status_code)
+    DOWNLOADED_BYTES.inc(len(response.content), site=site)
+    return response
+
+
 class UukanshuNovelTrawler(BaseNovelTrawler):
     NOVEL_URL = "https://uukanshu.cc"
+    SITE = "uukanshu"
 
-    def __init__(self) -> None:
+    def __init__(self, cleaner: Optional[ChapterCleaner] = None) -> None:
         self.chapter_titles = None
+        # Ads and watermarks are stripped before chapters are saved or translated
+        self.cleaner = cleaner or ChapterCleaner.for_site(self.SITE)
 
     def get_chapter_titles(self, book_id: str) -> Dict[str, str]:
         if self.chapter_titles:
@@ -94,16 +127,18 @@ class UukanshuNovelTrawler(BaseNovelTrawler):
 
         content_url = f"{self.NOVEL_URL}{chapter_subpath}"
         html = self._get_content(content_url)
-        soup = BeautifulSoup(html, "html.parser")
-        text_content = (
-            soup.find("p", class_="readcotent bbb font-normal").get_text().strip()
-        )
+        with span(STAGE_PARSE):
+            soup = BeautifulSoup(html, "html.parser")
+            text_content = (
+                soup.find("p", class_="readcotent bbb font-normal").get_text().strip()
+            )
+        text_content = self.cleaner.clean(chapter_title, text_content)
+        CHAPTERS_FETCHED.inc(site=self.SITE)
 
         return chapter_title, text_content
 
     def _get_content(self, url: str):
-        response = requests.get(url)
-        return response.content
+        return fetch(self.SITE, url).content
 
     def _get_english_chapter_number(self, chinese_numbers) -> str:
         english_numbers = cn2num(chinese_numbers)
@@ -164,9 +199,12 @@ class UukanshuNovelTrawler(BaseNovelTrawler):
 
 class NovelFullTrawler(BaseNovelTrawler):
     NOVEL_URL = "https://novelfull.com"
+    SITE = "novelfull"
 
-    def __init__(self) -> None:
+    def __init__(self, cleaner: Optional[ChapterCleaner] = None) -> None:
         self.chapter_titles = None
+        # Ads and watermarks are stripped before chapters are saved or translated
+        self.cleaner = cleaner or ChapterCleaner.for_site(self.SITE)
 
     def get_book_info(self, book_id: str) -> Dict:
         homepage = f"{self.NOVEL_URL}/{book_id}.html"
@@ -201,7 +239,7 @@ class NovelFullTrawler(BaseNovelTrawler):
         img_url = img_tag["src"]
         full_img_url = os.path.join(self.NOVEL_URL, img_url.lstrip("/"))
 
-        response = requests.get(full_img_url)
+        response = fetch(self.SITE, full_img_url)
         if response.status_code != 200:
             # raise ValueError("Unable to download cover image")
             return None
@@ -290,12 +328,15 @@ class NovelFullTrawler(BaseNovelTrawler):
         content_url = f"{self.NOVEL_URL}{chapter_subpath}"
 
         html = self._get_content(content_url)
-        soup = BeautifulSoup(html, "html.parser")
+        with span(STAGE_PARSE):
+            soup = BeautifulSoup(html, "html.parser")
 
-        content_div = soup.find("div", {"class": "chapter container"})
+            content_div = soup.find("div", {"class": "chapter container"})
 
-        chapter_content = self._get_text_with_line_breaks(content_div)
-        chapter_content = chapter_content.strip()
+            chapter_content = self._get_text_with_line_breaks(content_div)
+            chapter_content = chapter_content.strip()
+        chapter_content = self.cleaner.clean(chapter_title, chapter_content)
+        CHAPTERS_FETCHED.inc(site=self.SITE)
 
         return chapter_title, chapter_content
 
@@ -316,5 +357,4 @@ class NovelFullTrawler(BaseNovelTrawler):
         return soup.get_text().strip()
 
     def _get_content(self, url: str):
-        response = requests.get(url)
-        return response.content
+        return fetch(self.SITE, url).content
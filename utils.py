@@ -54,6 +54,49 @@ def split_content(content: str, num_chunks: int = 3) -> List[str]:
     
     return chunks
 
+def split_content_by_size(content: str, max_chunk_chars: int) -> List[str]:
+    """
+    Split content into chunks of at most max_chunk_chars, breaking on newlines.
+
+    Lines longer than max_chunk_chars are split at the size limit.
+
+    Args:
+        content: Text content to split
+        max_chunk_chars: Maximum number of characters per chunk
+
+    Returns:
+        List of content chunks
+    """
+    if not content:
+        return []
+    if max_chunk_chars <= 0:
+        raise ValueError("max_chunk_chars must be positive")
+
+    chunks = []
+    current = []
+    current_len = 0
+    for line in content.splitlines(keepends=True):
+        # Hard split lines that can never fit in a single chunk
+        while len(line) > max_chunk_chars:
+            if current:
+                chunks.append("".join(current))
+                current, current_len = [], 0
+            chunks.append(line[:max_chunk_chars])
+            line = line[max_chunk_chars:]
+
+        if current_len + len(line) > max_chunk_chars and current:
+            chunks.append("".join(current))
+            current, current_len = [], 0
+
+        if line:
+            current.append(line)
+            current_len += len(line)
+
+    if current:
+        chunks.append("".join(current))
+
+    return chunks
+
 def combine_content(chunks: List[str]) -> str:
     """
     Combine content chunks back into a single string.
@@ -137,6 +180,34 @@ def validate_chapter_range(
     ):
         raise ValueError(f"Chapter number {ending_chapter_num} not found in the book")
 
+def parse_chapter_range(chapter_range: str) -> range:
+    """
+    Parse a chapter range such as "5120-5130" or a single chapter "5120".
+
+    Args:
+        chapter_range: Range string
+
+    Returns:
+        Inclusive range of chapter numbers
+
+    Raises:
+        ValueError: If the range is malformed
+    """
+    parts = chapter_range.split("-")
+    try:
+        if len(parts) == 1:
+            start = end = int(parts[0])
+        elif len(parts) == 2:
+            start, end = int(parts[0]), int(parts[1])
+        else:
+            raise ValueError
+    except ValueError:
+        raise ValueError(f"Invalid chapter range: {chapter_range}")
+
+    if start > end:
+        raise ValueError(f"Invalid chapter range: {chapter_range}")
+    return range(start, end + 1)
+
 def format_filename(filename: str) -> str:
     """
     Format a string to be safe for use as a filename.
@@ -0,0 +1,308 @@
+"""
+Multi-volume EPUB export.
+
+Very long books are split into several EPUBs of consecutive chapters. Volumes
+only need chapter numbers to be planned, which come from the chapter filenames,
+and every volume reads just its own chapters, so volumes are built in parallel.
+"""
+import os
+import time
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+from covers import DEFAULT_MAX_SIZE, DEFAULT_QUALITY
+from export_cache import (
+    clear_export_hash,
+    compute_export_hash,
+    get_source_date,
+    is_export_current,
+    save_export_hash,
+)
+import metrics
+import profiling
+from metrics import CACHE_HITS, CHAPTERS_EXPORTED, EXPORTS, EXPORT_BYTES, EXPORT_SECONDS
+from packed_store import open_reader_writer
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Table of contents grouping modes, kept here so the CLI can offer them
+# without loading ebooklib
+TOC_GROUP_NONE = "none"
+TOC_GROUP_HUNDREDS = "hundreds"
+TOC_GROUP_VOLUME = "volume"
+TOC_GROUPS = (TOC_GROUP_NONE, TOC_GROUP_HUNDREDS, TOC_GROUP_VOLUME)
+
+
+class Volume(NamedTuple):
+    """A part of a book exported as its own EPUB."""
+    number: int
+    total: int
+    chapter_range: range
+    # Whether the range was requested explicitly, rather than split off by size
+    requested: bool = False
+
+    @property
+    def label(self) -> str:
+        """Human-readable chapter span, e.g. "Chapters 1-500"."""
+        return f"Chapters {self.chapter_range.start}-{self.chapter_range.stop - 1}"
+
+
+def plan_volumes(
+    chapter_numbers: Sequence[int],
+    volume_size: Optional[int] = None,
+    chapter_ranges: Optional[List[range]] = None,
+) -> List[Volume]:
+    """
+    Split a book's chapters into volumes.
+
+    With chapter_ranges alone, each range becomes one volume. With volume_size,
+    the selected chapters are split into volumes of that many chapters.
+
+    Args:
+        chapter_numbers: Chapter numbers present in the book
+        volume_size: Number of chapters per volume
+        chapter_ranges: Chapter ranges to export, defaults to the whole book
+
+    Returns:
+        Volumes in reading order, each covering the chapters present in it
+    """
+    if volume_size is not None and volume_size < 1:
+        raise ValueError("Volume size must be at least 1")
+
+    requested = bool(chapter_ranges) and volume_size is None
+    if requested:
+        spans = [
+            chapter_range for chapter_range in chapter_ranges
+            if any(num in chapter_range for num in chapter_numbers)
+        ]
+    else:
+        selected = sorted(
+            {
+                num for num in chapter_numbers
+                if not chapter_ranges or any(num in r for r in chapter_ranges)
+            }
+        )
+        size = volume_size or len(selected)
+        spans = [
+            range(selected[i], selected[min(i + size, len(selected)) - 1] + 1)
+            for i in range(0, len(selected), size)
+        ]
+
+    return [Volume(i + 1, len(spans), span, requested) for i, span in enumerate(spans)]
+
+
+def export_volume(
+    book_id: str,
+    volume: Optional[Volume],
+    order_key: str,
+    stream: bool = False,
+    compresslevel: int = 6,
+    workers: Optional[int] = None,
+    incremental: bool = False,
+    toc_group: str = TOC_GROUP_NONE,
+    reproducible: bool = False,
+    cover_max_size: Tuple[int, int] = DEFAULT_MAX_SIZE,
+    cover_quality: int = DEFAULT_QUALITY,
+) -> bool:
+    """
+    Export one volume of a book, or the whole book. Runs in a worker process.
+
+    Args:
+        book_id: The unique identifier for the book
+        volume: Volume to export, None for the whole book
+        order_key: Regex pattern to extract chapter numbers
+        stream: Whether to use the streaming exporter
+        compresslevel: Deflate level (0-9) used for archive entries
+        workers: Processes rendering chapters, for the non-streaming exporter
+        incremental: Whether to reuse unchanged chapters, for the streaming exporter
+        toc_group: How to group the table of contents
+        reproducible: Whether to build byte-identical output from identical inputs,
+            skipping the export when its inputs haven't changed
+        cover_max_size: Maximum (width, height) of the embedded cover
+        cover_quality: JPEG quality of the embedded cover
+
+    Returns:
+        bool: True if export was successful, False otherwise
+    """
+    # Imported here since the exporters import Volume from this module
+    from exporters_stream import EpubStreamExporter
+    from exporters_v2 import EpubExporterV2
+
+    text_reader = open_reader_writer(book_id)
+    _, book_info = text_reader.get_info_and_cover()
+    cover_image = text_reader.get_optimized_cover(cover_max_size, cover_quality)
+    chapter_range = volume.chapter_range if volume else None
+    stream = stream or incremental
+
+    modified = None
+    export_hash = None
+    if reproducible:
+        manifest = text_reader.get_source_manifest(order_key=order_key, chapter_range=chapter_range)
+        modified = get_source_date(manifest)
+        export_hash = compute_export_hash(
+            manifest,
+            cover_image,
+            book_info,
+            {
+                "exporter": "stream" if stream else "v2",
+                "compresslevel": compresslevel,
+                "toc_group": toc_group,
+                "volume": [volume.number, volume.total] if volume else None,
+                "order_key": order_key,
+            },
+        )
+
+    if stream:
+        exporter = EpubStreamExporter(
+            book_id,
+            compresslevel=compresslevel,
+            incremental=incremental,
+            volume=volume,
+            toc_group=toc_group,
+            modified=modified,
+        )
+    else:
+        exporter = EpubExporterV2(
+            book_id,
+            compresslevel=compresslevel,
+            workers=workers,
+            volume=volume,
+            toc_group=toc_group,
+            modified=modified,
+        )
+
+    if export_hash and is_export_current(exporter.output_file, export_hash):
+        logger.info(f"{exporter.output_file} is up to date, skipping export")
+        EXPORTS.inc(outcome="up_to_date")
+        CACHE_HITS.inc(cache="export")
+        return True
+    if not reproducible:
+        clear_export_hash(exporter.output_file)
+
+    if volume:
+        logger.info(f"Creating volume {volume.number}/{volume.total} ({volume.label})...")
+    else:
+        logger.info("Creating EPUB...")
+    start = time.perf_counter()
+    chapters = _count_chapters(
+        text_reader.iter_chapters(order_key=order_key, chapter_range=chapter_range)
+    )
+    exported = exporter.export_epub(
+        cover_page=cover_image,
+        book_info=book_info,
+        book_content=chapters if stream else dict(chapters),
+    )
+    EXPORT_SECONDS.observe(time.perf_counter() - start)
+    if not exported:
+        EXPORTS.inc(outcome="failed")
+        return False
+    EXPORTS.inc(outcome="written")
+    EXPORT_BYTES.inc(os.path.getsize(exporter.output_file))
+    if export_hash:
+        save_export_hash(exporter.output_file, export_hash)
+    return exported
+
+
+def _count_chapters(chapters: Iterable[Tuple[str, str]]) -> Iterator[Tuple[str, str]]:
+    """Pass chapters through, counting them in the export metrics."""
+    for chapter in chapters:
+        CHAPTERS_EXPORTED.inc()
+        yield chapter
+
+
+def _export_volume_in_worker(profile: bool, *args) -> Tuple[bool, Dict, Dict]:
+    """Run export_volume in a pool process, returning its metrics and spans for the parent."""
+    # Forked workers start with a copy of the parent's values
+    metrics.reset()
+    profiling.reset()
+    if profile:
+        profiling.enable()
+    return export_volume(*args), metrics.snapshot(), profiling.snapshot()
+
+
+def export_volumes(
+    book_id: str,
+    volumes: List[Volume],
+    order_key: str,
+    stream: bool = False,
+    compresslevel: int = 6,
+    workers: Optional[int] = None,
+    incremental: bool = False,
+    toc_group: str = TOC_GROUP_NONE,
+    reproducible: bool = False,
+    cover_max_size: Tuple[int, int] = DEFAULT_MAX_SIZE,
+    cover_quality: int = DEFAULT_QUALITY,
+) -> int:
+    """
+    Export several volumes in parallel.
+
+    Args:
+        book_id: The unique identifier for the book
+        volumes: Volumes to export
+        order_key: Regex pattern to extract chapter numbers
+        stream: Whether to use the streaming exporter
+        compresslevel: Deflate level (0-9) used for archive entries
+        workers: Total number of processes to use, defaults to the CPU count
+        incremental: Whether to reuse unchanged chapters, for the streaming exporter
+        toc_group: How to group each volume's table of contents
+        reproducible: Whether to build reproducible output, skipping unchanged volumes
+        cover_max_size: Maximum (width, height) of the embedded cover
+        cover_quality: JPEG quality of the embedded cover
+
+    Returns:
+        Number of volumes exported successfully
+    """
+    workers = workers or os.cpu_count() or 1
+    volume_workers = max(1, min(len(volumes), workers))
+    # Spread the remaining cores over the volumes' own chapter rendering
+    chapter_workers = max(1, workers // volume_workers)
+
+    if volume_workers == 1:
+        results = [
+            export_volume(
+                book_id,
+                volume,
+                order_key,
+                stream,
+                compresslevel,
+                chapter_workers,
+                incremental,
+                toc_group,
+                reproducible,
+                cover_max_size,
+                cover_quality,
+            )
+            for volume in volumes
+        ]
+    else:
+        with ProcessPoolExecutor(max_workers=volume_workers) as executor:
+            futures = [
+                executor.submit(
+                    _export_volume_in_worker,
+                    profiling.is_enabled(),
+                    book_id,
+                    volume,
+                    order_key,
+                    stream,
+                    compresslevel,
+                    chapter_workers,
+                    incremental,
+                    toc_group,
+                    reproducible,
+                    cover_max_size,
+                    cover_quality,
+                )
+                for volume in volumes
+            ]
+            results = []
+            for future in futures:
+                result, worker_metrics, worker_spans = future.result()
+                metrics.merge(worker_metrics)
+                profiling.merge(worker_spans)
+                results.append(result)
+
+    exported = sum(1 for result in results if result)
+    logger.info(f"Exported {exported}/{len(volumes)} volumes")
+    return exported